@@ -10,6 +10,12 @@ def get_data():
                     "name": "AIDA Widget Settings",
                     "label": _("AIDA Widget Settings"),
                     "description": _("Configure AIDA chat widget settings")
+                },
+                {
+                    "type": "doctype",
+                    "name": "AIDA Conversation Log",
+                    "label": _("AIDA Conversation Log"),
+                    "description": _("Chat turns recorded when conversation logging is enabled")
                 }
             ]
         }
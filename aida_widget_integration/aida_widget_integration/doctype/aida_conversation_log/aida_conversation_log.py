@@ -0,0 +1,13 @@
+# Copyright (c) 2024, op and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class AidaConversationLog(Document):
+    pass
+
+
+def on_doctype_update():
+    # Chat history pages walk a user's turns by creation
+    frappe.db.add_index("AIDA Conversation Log", ["user", "creation"])
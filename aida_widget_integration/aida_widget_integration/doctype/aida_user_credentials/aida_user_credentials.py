@@ -0,0 +1,11 @@
+# Copyright (c) 2024, op and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class AidaUserCredentials(Document):
+    def on_trash(self):
+        """Drop the AIDA session opened with these credentials"""
+        from aida_widget_integration import prewarm
+        prewarm.clear_user_session(self.user)
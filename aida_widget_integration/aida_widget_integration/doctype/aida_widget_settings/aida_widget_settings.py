@@ -3,6 +3,7 @@
 
 import frappe
 from frappe.model.document import Document
+from aida_widget_integration.settings import clear_settings_cache, get_settings as get_cached_settings
 
 class AidaWidgetSettings(Document):
     def validate(self):
@@ -18,11 +19,19 @@ class AidaWidgetSettings(Document):
         
         if self.max_retries and self.max_retries < 0:
             frappe.throw("Max retries cannot be negative")
+        
+        if self.http_pool_size is not None and self.http_pool_size < 1:
+            frappe.throw("HTTP pool size must be at least 1")
+        
+        if self.response_cache_enabled and (self.response_cache_ttl or 0) < 1:
+            frappe.throw("Cache TTL must be at least 1 second")
     
     def on_update(self):
         """Called after the document is updated"""
-        # Clear cache to ensure new settings are loaded
-        frappe.cache().delete_key("aida_widget_settings")
+        # Clear cache on every worker to ensure new settings are loaded. Cleared again once
+        # committed: a worker reading the old row before then would cache it as current.
+        clear_settings_cache()
+        frappe.db.after_commit.add(clear_settings_cache)
         
         # Log the settings update
         if self.debug_mode:
@@ -34,45 +43,21 @@ class AidaWidgetSettings(Document):
 @frappe.whitelist()
 def get_settings():
     """Get AIDA Widget Settings with caching"""
-    settings = frappe.cache().get_value("aida_widget_settings")
-    
-    if not settings:
-        try:
-            doc = frappe.get_single('AIDA Widget Settings')
-            settings = {
-                'widget_enabled': doc.widget_enabled,
-                'auto_open': doc.auto_open,
-                'api_server_url': doc.api_server_url,
-                'welcome_message': doc.welcome_message,
-                'widget_position': doc.widget_position,
-                'widget_theme': doc.widget_theme,
-                'show_user_avatar': doc.show_user_avatar,
-                'user_avatar_url': getattr(doc, 'user_avatar_url', ''),
-                'sound_notifications': getattr(doc, 'sound_notifications', False),
-                'connection_timeout': doc.connection_timeout,
-                'max_retries': doc.max_retries,
-                'debug_mode': doc.debug_mode,
-                'conversation_logging': getattr(doc, 'conversation_logging', True)
-            }
-            
-            # Cache for 5 minutes
-            frappe.cache().set_value("aida_widget_settings", settings, expires_in_sec=300)
-        except:
-            # Return defaults if settings don't exist
-            settings = {
-                'widget_enabled': True,
-                'auto_open': False,
-                'api_server_url': 'https://aida.mocxha.com',
-                'welcome_message': 'Hello! I\'m AIDA, your AI assistant. How can I help you today?',
-                'widget_position': 'Bottom Right',
-                'widget_theme': 'Default',
-                'show_user_avatar': True,
-                'user_avatar_url': '',
-                'sound_notifications': False,
-                'connection_timeout': 30,
-                'max_retries': 3,
-                'debug_mode': False,
-                'conversation_logging': True
-            }
+    settings = get_cached_settings()
     
-    return settings
\ No newline at end of file
+    return {
+        'widget_enabled': settings.widget_enabled,
+        'auto_open': settings.auto_open,
+        'api_server_url': settings.api_server_url,
+        'welcome_message': settings.welcome_message,
+        'widget_position': settings.widget_position,
+        'widget_theme': settings.widget_theme,
+        'show_user_avatar': settings.show_user_avatar,
+        'user_avatar_url': settings.user_avatar_url,
+        'sound_notifications': settings.sound_notifications,
+        'connection_timeout': settings.connection_timeout,
+        'max_retries': settings.max_retries,
+        'debug_mode': settings.debug_mode,
+        'conversation_logging': settings.conversation_logging,
+        'enable_streaming': settings.enable_streaming
+    }
@@ -1,19 +1,172 @@
 import frappe
 import requests
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from frappe import _
-from frappe.utils import cstr
+from frappe.utils import cint, cstr
+from werkzeug.wrappers import Response
+from aida_widget_integration import (
+    balancer, bulkhead, client, coalesce, codec, conversation_log, health, metrics, prewarm, rate_limit, response_cache, sessions,
+    streaming
+)
+from aida_widget_integration.circuit_breaker import CircuitOpenError
+from aida_widget_integration.settings import get_api_server_url, get_settings
+from aida_widget_integration.utils import get_site_context, run_in_site_context
+
+# Dedicated RQ queue for chat jobs, configured under "workers" in common_site_config.json
+CHAT_QUEUE = 'aida'
+CHAT_RESULT_EVENT = 'aida_chat_result'
+CHAT_RESULT_KEY = 'aida_chat_result:{}'
+CHAT_RESULT_TTL = 600
+
+# Credentials of a queued chat job, kept out of its kwargs, which RQ stores and shows in its dashboards
+CHAT_SECRETS_KEY = 'aida_chat_secrets:{}'
+CHAT_SECRETS_TTL = 300
+
+# Seconds a caller turned away by the bulkhead is told to wait
+BUSY_RETRY_AFTER = 5
+
+MAX_BATCH_SIZE = 50
+MAX_BATCH_CONCURRENCY = 16
 
 @frappe.whitelist(allow_guest=True)
-def chat_with_aida(message, session_id=None, user_hash=None, erp_credentials=None):
+def chat_with_aida(message, session_id=None, user_hash=None, erp_credentials=None, stream_id=None,
+                   idempotency_key=None, bypass_cache=False, session_token=None, passthrough=False):
     """
     API endpoint to communicate with AIDA chat server
     This acts as a bridge between the widget and the main AIDA API server
+
+    When streaming is enabled and the widget passes a ``stream_id``, partial
+    output is relayed to the widget over realtime while the answer is generated.
+    With background chat enabled the call is handed to a background job and
+    only a ``job_id`` is returned; the result follows on ``aida_chat_result``.
+    Repeated sends of one message (double clicks, retries) should carry the
+    same ``idempotency_key`` so they share a single upstream call. Pass
+    ``bypass_cache`` for questions that must be answered live. Messages over
+    the configured rate limits are rejected with a ``retry_after`` hint.
+    Widgets holding a ``session_token`` from ``initialize_session`` send it
+    instead of ``erp_credentials``; a lapsed token gets ``token_expired``.
+    With ``passthrough``, a fresh reply is sent to the caller as the bytes
+    the AIDA server returned, in Frappe's ``message`` envelope, instead of
+    being encoded again.
     """
+    rejected = rate_limit.check()
+    if rejected:
+        return rejected
+    
+    upstream_token = None
+    if session_token:
+        bound = sessions.check_token(session_token, session_id)
+        if not bound:
+            return {
+                'error': True,
+                'token_expired': True,
+                'message': 'Your AIDA session has expired. Please reconnect.'
+            }
+        # The credentials were exchanged when the session was opened
+        session_id = bound['session_id']
+        upstream_token = bound['upstream_token']
+        erp_credentials = None
+    
+    # Background results are delivered over realtime, which guests don't have
+    if frappe.session.user != 'Guest' and get_settings().background_chat:
+        return enqueue_chat(message, session_id, user_hash, erp_credentials, stream_id, idempotency_key,
+                            bypass_cache, upstream_token)
+    
+    passthrough = cint(passthrough)
+    result = _chat(message, session_id, user_hash, erp_credentials, stream_id, idempotency_key, bypass_cache,
+                   passthrough, upstream_token)
+    
+    raw = getattr(result, 'raw', None)
+    if passthrough and raw is not None:
+        return Response(codec.wrap_message(raw), mimetype='application/json')
+    return result
+
+def _chat(message, session_id=None, user_hash=None, erp_credentials=None, stream_id=None, idempotency_key=None,
+          bypass_cache=False, passthrough=False, upstream_token=None):
+    """
+    Send a chat message to the AIDA API server and return its reply
+
+    Answers are served from the response cache when it is enabled. Identical
+    requests in flight at the same time, on any worker, wait for the first
+    one's reply instead of making their own upstream call. ``upstream_token``
+    is the AIDA server's token for the session, only passed once the caller's
+    session token has been checked.
+    """
+    started_at = time.monotonic()
+    
+    # Without a session from the widget, use the one opened for the user at login
+    server_session = None
+    if not session_id and frappe.session.user != 'Guest':
+        server_session = prewarm.resolve_session(frappe.session.user)
+    if server_session:
+        session_id = server_session['session_id']
+        # Its token is checked like one the widget sends before the server's token goes with it
+        bound = sessions.check_token(server_session['session_token'], session_id)
+        upstream_token = bound['upstream_token'] if bound else None
+    
+    # Guests all share one user and bring their own ERP credentials, so their answers are never shared
+    use_cache = response_cache.is_enabled() and not cint(bypass_cache) and frappe.session.user != 'Guest'
+    if use_cache:
+        cache_key = response_cache.make_key(message, session_id)
+        cached = response_cache.get_cached_response(cache_key)
+        if cached:
+            cached.update({'session_id': session_id, 'cached': True})
+            conversation_log.log_turn(message, cached, session_id, user_hash, get_duration_ms(started_at))
+            return cached
+    
+    # Fail fast while the health probe finds the upstream down, instead of every user waiting for a timeout
+    if health.is_down():
+        return get_unavailable_error()
+    
+    user = frappe.session.user
+    if user == 'Guest':
+        user = f"Guest:{user_hash or ''}:{getattr(frappe.local, 'request_ip', None) or ''}"
+    
+    def send():
+        result = _send_chat(message, session_id, user_hash, erp_credentials, stream_id, passthrough, upstream_token)
+        # Logged by the request that made the call, not by duplicates that waited for it
+        conversation_log.log_turn(message, result, session_id, user_hash, get_duration_ms(started_at))
+        if server_session and result.get('session_id') and not result.get('error'):
+            # A session the server replaced has no token issued for it
+            session_token = server_session['session_token'] if result['session_id'] == session_id else None
+            prewarm.set_user_session(frappe.session.user, result['session_id'], session_token)
+        return result
+    
+    result = coalesce.run_once(
+        coalesce.make_key(user, session_id, message, idempotency_key),
+        send,
+        timeout=get_chat_job_timeout(),
+        idempotent=bool(idempotency_key)
+    )
+    
+    if use_cache and not result.get('error'):
+        response_cache.cache_response(cache_key, result)
+    
+    return result
+
+def get_duration_ms(started_at):
+    return int((time.monotonic() - started_at) * 1000)
+
+def get_busy_error():
+    return {
+        'error': True,
+        'busy': True,
+        'retry_after': BUSY_RETRY_AFTER,
+        'message': 'AIDA is busy right now. Please try again in a few seconds.'
+    }
+
+def get_unavailable_error():
+    return {
+        'error': True,
+        'unavailable': True,
+        'message': 'AIDA is currently unavailable. Please try again in a few minutes.'
+    }
+
+def _send_chat(message, session_id=None, user_hash=None, erp_credentials=None, stream_id=None, passthrough=False,
+               upstream_token=None):
     try:
-        # Default API server URL (can be configured)
-        api_server_url = frappe.db.get_single_value('AIDA Widget Settings', 'api_server_url') or 'https://aida.mocxha.com'
-        
         # Prepare payload for AIDA API - map 'message' to 'user_input' as expected by the server
         payload = {
             'user_input': message,  # The AIDA API server expects 'user_input', not 'message'
@@ -24,22 +177,50 @@ def chat_with_aida(message, session_id=None, user_hash=None, erp_credentials=Non
         if user_hash:
             payload['user_hash'] = user_hash
         
-        # Add ERP credentials if provided
-        if erp_credentials:
+        # Sessions the AIDA server issued a token for are authenticated by it, not by credentials
+        if upstream_token:
+            payload['session_token'] = upstream_token
+        elif erp_credentials:
             if isinstance(erp_credentials, str):
                 erp_credentials = json.loads(erp_credentials)
             payload['erp_credentials'] = erp_credentials
         
-        # Make request to AIDA API server
-        response = requests.post(
-            f"{api_server_url}/chat",
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=30
+        # Streaming needs a realtime room, which guests don't have
+        stream = bool(
+            stream_id
+            and frappe.session.user != 'Guest'
+            and get_settings().enable_streaming
         )
+        headers = {'Content-Type': 'application/json'}
+        if stream:
+            payload['stream'] = True
+            headers['Accept'] = 'text/event-stream, application/json'
+        
+        # Make request to AIDA API server; a conversation stays on the server holding its state.
+        # The slot is held until a streamed answer has been relayed in full, renewing its lease meanwhile.
+        with bulkhead.slot() as renew_slot:
+            response = balancer.post(
+                '/chat',
+                session_id=session_id,
+                json=payload,
+                headers=headers,
+                stream=stream
+            )
+            
+            if response.status_code == 200:
+                if stream and streaming.is_stream_response(response):
+                    result = streaming.relay_stream(response, stream_id, on_chunk=renew_slot)
+                elif passthrough:
+                    # Decoded only for the session and log bookkeeping; the bytes go back to the caller
+                    result = codec.loads_object(response.content)
+                else:
+                    result = response.json()
         
         if response.status_code == 200:
-            return response.json()
+            # A successful turn proves the session is alive
+            sessions.mark_active(result.get('session_id') or session_id)
+            balancer.pin(result.get('session_id') or session_id, response.aida_server)
+            return result
         else:
             frappe.log_error(
                 f"AIDA API Error: {response.status_code} - {response.text}",
@@ -50,6 +231,13 @@ def chat_with_aida(message, session_id=None, user_hash=None, erp_credentials=Non
                 'message': f'API server returned error: {response.status_code}'
             }
             
+    except CircuitOpenError:
+        return {
+            'error': True,
+            'message': 'AIDA API server is temporarily unavailable. Please try again shortly.'
+        }
+    except bulkhead.BulkheadFullError:
+        return get_busy_error()
     except requests.exceptions.ConnectionError:
         frappe.log_error(
             "Could not connect to AIDA API server",
@@ -78,45 +266,208 @@ def chat_with_aida(message, session_id=None, user_hash=None, erp_credentials=Non
             'message': 'An unexpected error occurred. Please try again.'
         }
 
+@frappe.whitelist(methods=['POST'])
+def chat_batch(items):
+    """
+    Send several chat messages to the AIDA API server in one request
+
+    ``items`` is a list (or JSON string) of ``{message, session_id, user_hash}``
+    dicts. Items are sent concurrently, at most ``batch_concurrency`` at a
+    time, and results come back in the same order; a failed item yields an
+    error dict in its slot without affecting the others. A batch that would
+    go over the rate limits is rejected as a whole.
+    """
+    if isinstance(items, str):
+        items = json.loads(items)
+    
+    if not isinstance(items, list) or not items:
+        frappe.throw(_('items must be a non-empty list'))
+    if len(items) > MAX_BATCH_SIZE:
+        frappe.throw(_('A batch can hold at most {0} items').format(MAX_BATCH_SIZE))
+    
+    # Each item counts as one message against the rate limits
+    rejected = rate_limit.check(cost=len(items))
+    if rejected:
+        return rejected
+    
+    concurrency = min(max(cint(get_settings().batch_concurrency), 1), MAX_BATCH_CONCURRENCY, len(items))
+    context = get_site_context()
+    
+    def run_item(item):
+        if not isinstance(item, dict) or not item.get('message'):
+            return {'error': True, 'message': 'Each item needs a message'}
+        try:
+            return run_in_site_context(
+                context, _chat,
+                item['message'],
+                session_id=item.get('session_id'),
+                user_hash=item.get('user_hash'),
+                idempotency_key=item.get('idempotency_key'),
+                bypass_cache=item.get('bypass_cache', False)
+            )
+        except Exception as e:
+            return {'error': True, 'message': f'Unexpected error: {str(e)}'}
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run_item, items))
+    
+    return {'results': results}
+
+def enqueue_chat(message, session_id=None, user_hash=None, erp_credentials=None, stream_id=None,
+                 idempotency_key=None, bypass_cache=False, upstream_token=None):
+    """
+    Run a chat turn in a background job so the web worker is released immediately
+
+    The credentials are handed over in Redis for a few minutes, under the
+    job ID, rather than as job arguments.
+    """
+    from frappe.utils.background_jobs import get_queues_timeout
+    
+    job_id = frappe.generate_hash(length=20)
+    queue = CHAT_QUEUE if CHAT_QUEUE in get_queues_timeout() else 'short'
+    
+    if erp_credentials or upstream_token:
+        frappe.cache().set_value(
+            CHAT_SECRETS_KEY.format(job_id),
+            {'erp_credentials': erp_credentials, 'upstream_token': upstream_token},
+            expires_in_sec=CHAT_SECRETS_TTL
+        )
+    
+    frappe.enqueue(
+        'aida_widget_integration.api.run_chat_job',
+        queue=queue,
+        timeout=get_chat_job_timeout(),
+        chat_id=job_id,
+        message=message,
+        session_id=session_id,
+        user_hash=user_hash,
+        stream_id=stream_id,
+        idempotency_key=idempotency_key,
+        bypass_cache=bypass_cache
+    )
+    
+    return {'queued': True, 'job_id': job_id}
+
+def get_chat_job_timeout():
+    """
+    Worst case duration of a chat turn, including retries, plus headroom
+    """
+    settings = get_settings()
+    attempts = max(cint(settings.max_retries), 0) + 1
+    return (cint(settings.connection_timeout) or client.DEFAULT_READ_TIMEOUT) * attempts + 60
+
+def run_chat_job(chat_id, message, session_id=None, user_hash=None, stream_id=None, idempotency_key=None,
+                 bypass_cache=False):
+    """
+    Background job: run a chat turn and push the result to the requesting user
+    """
+    cache = frappe.cache()
+    secrets = cache.get_value(CHAT_SECRETS_KEY.format(chat_id)) or {}
+    cache.delete_value(CHAT_SECRETS_KEY.format(chat_id))
+    
+    result = _chat(message, session_id, user_hash, secrets.get('erp_credentials'), stream_id, idempotency_key,
+                   bypass_cache, upstream_token=secrets.get('upstream_token'))
+    
+    # Kept briefly so the widget can still collect it if the realtime event is missed
+    cache.set_value(
+        CHAT_RESULT_KEY.format(chat_id),
+        {'user': frappe.session.user, 'result': result},
+        expires_in_sec=CHAT_RESULT_TTL
+    )
+    frappe.publish_realtime(
+        CHAT_RESULT_EVENT,
+        {'job_id': chat_id, 'result': result},
+        user=frappe.session.user
+    )
+
+@frappe.whitelist()
+def get_chat_result(job_id):
+    """
+    Get the result of a background chat job, or ``{'pending': True}`` while it runs
+    """
+    cached = frappe.cache().get_value(CHAT_RESULT_KEY.format(job_id))
+    if not cached or cached['user'] != frappe.session.user:
+        return {'pending': True, 'job_id': job_id}
+    
+    return cached['result']
+
+@frappe.whitelist()
+def get_chat_history(cursor=None):
+    """
+    Get a page of the current user's chat turns, newest first
+
+    Pass back ``next_cursor`` to fetch the page before it; it is empty on the oldest page.
+    """
+    if frappe.session.user == 'Guest':
+        return {'turns': [], 'next_cursor': None}
+
+    return conversation_log.get_history(frappe.session.user, cursor=cursor)
+
+@frappe.whitelist(methods=['POST'])
+def clear_chat_history():
+    """
+    Clear the current user's chat history in the widget
+    """
+    if frappe.session.user != 'Guest':
+        conversation_log.clear_history(frappe.session.user)
+
+    return {'success': True}
+
+@frappe.whitelist(methods=['POST'])
+def save_user_credentials(username=None, password=None, erpnext_url=None, user_hash=None):
+    """
+    Store the current user's Mocxha credentials, so their AIDA session is opened when they log in
+
+    The widget only calls this when the user ticks the option to store them.
+    """
+    if frappe.session.user == 'Guest':
+        frappe.throw(_('Log in to save AIDA credentials'), frappe.PermissionError)
+    
+    prewarm.save_credentials(frappe.session.user, username, password, erpnext_url, user_hash)
+    return {'success': True, 'message': 'Credentials saved'}
+
+@frappe.whitelist(methods=['POST'])
+def forget_user_credentials():
+    """
+    Delete the current user's stored Mocxha credentials and the AIDA session opened with them
+    """
+    if frappe.session.user != 'Guest':
+        prewarm.forget_credentials(frappe.session.user)
+    
+    return {'success': True, 'message': 'Credentials removed'}
+
+@frappe.whitelist(methods=['POST'])
+def reset_user_session():
+    """
+    Forget the AIDA session opened for the current user; the next message starts a new one
+    """
+    if frappe.session.user != 'Guest':
+        prewarm.clear_user_session(frappe.session.user)
+    
+    return {'success': True}
+
 @frappe.whitelist()
 def get_widget_settings():
     """
     Get widget configuration settings
     """
-    try:
-        settings = frappe.get_single('AIDA Widget Settings')
-        return {
-            'api_server_url': settings.api_server_url or 'http://localhost:5000',
-            'widget_enabled': settings.widget_enabled,
-            'auto_open': settings.auto_open,
-            'welcome_message': settings.welcome_message,
-            'position': getattr(settings, 'position', 'bottom-right'),
-            'theme': getattr(settings, 'theme', 'light'),
-            'show_user_avatar': getattr(settings, 'show_user_avatar', False),
-            'user_avatar_url': getattr(settings, 'user_avatar_url', ''),
-            'sound_notifications': getattr(settings, 'sound_notifications', False),
-            'conversation_logging': getattr(settings, 'conversation_logging', True),
-            'connection_timeout': getattr(settings, 'connection_timeout', 30),
-            'max_retries': getattr(settings, 'max_retries', 3),
-            'debug_mode': getattr(settings, 'debug_mode', False)
-        }
-    except:
-        # Return defaults if settings don't exist
-        return {
-            'api_server_url': 'https://aida.mocxha.com',
-            'widget_enabled': True,
-            'auto_open': False,
-            'welcome_message': 'Hello! I\'m AIDA, your AI assistant. How can I help you today?',
-            'position': 'bottom-right',
-            'theme': 'light',
-            'show_user_avatar': False,
-            'user_avatar_url': '',
-            'sound_notifications': False,
-            'conversation_logging': True,
-            'connection_timeout': 30,
-            'max_retries': 3,
-            'debug_mode': False
-        }
+    settings = get_settings()
+    return {
+        'api_server_url': settings.api_server_url or 'http://localhost:5000',
+        'widget_enabled': settings.widget_enabled,
+        'auto_open': settings.auto_open,
+        'welcome_message': settings.welcome_message,
+        'position': settings.get('position', 'bottom-right'),
+        'theme': settings.get('theme', 'light'),
+        'show_user_avatar': settings.show_user_avatar,
+        'user_avatar_url': settings.user_avatar_url,
+        'sound_notifications': settings.sound_notifications,
+        'conversation_logging': settings.conversation_logging,
+        'connection_timeout': settings.connection_timeout,
+        'max_retries': settings.max_retries,
+        'debug_mode': settings.debug_mode,
+        'enable_streaming': settings.enable_streaming
+    }
 
 @frappe.whitelist()
 def save_widget_settings(api_server_url=None, widget_enabled=None, auto_open=None, welcome_message=None):
@@ -166,12 +517,14 @@ def test_connection(api_server_url=None):
     try:
         # Use provided URL or get from settings
         if not api_server_url:
-            api_server_url = frappe.db.get_single_value('AIDA Widget Settings', 'api_server_url') or 'https://aida.mocxha.com'
+            api_server_url = get_api_server_url()
         
         # Test health endpoint
-        response = requests.get(
+        response = client.get(
             f"{api_server_url}/health",
-            timeout=10
+            timeout=10,
+            retries=0,
+            use_circuit_breaker=False
         )
         
         if response.status_code == 200:
@@ -221,10 +574,10 @@ def initialize_session(erpnext_url=None, username=None, password=None, user_hash
     """
     Initialize a session with the AIDA API server
     """
+    if health.is_down():
+        return get_unavailable_error()
+    
     try:
-        # Get API server URL from settings
-        api_server_url = frappe.db.get_single_value('AIDA Widget Settings', 'api_server_url') or 'https://aida.mocxha.com'
-        
         # Use current session info if not provided
         if not erpnext_url:
             erpnext_url = frappe.utils.get_url()
@@ -252,18 +605,24 @@ def initialize_session(erpnext_url=None, username=None, password=None, user_hash
             payload['user_hash'] = user_hash
         
         # Make request to AIDA API server
-        response = requests.post(
-            f"{api_server_url}/init_session",
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=30
-        )
+        with bulkhead.slot():
+            response = balancer.post(
+                '/init_session',
+                json=payload,
+                headers={'Content-Type': 'application/json'}
+            )
         
         if response.status_code == 200:
             result = response.json()
+            sessions.mark_active(result.get('session_id'))
+            balancer.pin(result.get('session_id'), response.aida_server)
+            # Chat turns carry this token instead of the credentials
+            session_token, expires_in = sessions.issue_token(result.get('session_id'), result.get('session_token'))
             return {
                 'success': True,
                 'session_id': result.get('session_id'),
+                'session_token': session_token,
+                'token_expires_in': expires_in,
                 'message': result.get('message', 'Session initialized successfully'),
                 'restored': result.get('restored', False)
             }
@@ -279,6 +638,13 @@ def initialize_session(erpnext_url=None, username=None, password=None, user_hash
                 'message': f'Session initialization failed. Please check your AIDA server configuration and ERPNext credentials.'
             }
             
+    except CircuitOpenError:
+        return {
+            'error': True,
+            'message': 'AIDA API server is temporarily unavailable. Please try again shortly.'
+        }
+    except bulkhead.BulkheadFullError:
+        return get_busy_error()
     except requests.exceptions.ConnectionError:
         frappe.log_error(
             "Could not connect to AIDA API server for session init",
@@ -313,28 +679,48 @@ def check_session_status(session_id):
     Check if a session is still active on the AIDA API server
     """
     try:
-        # Get API server URL from settings
-        api_server_url = frappe.db.get_single_value('AIDA Widget Settings', 'api_server_url') or 'http://localhost:5000'
+        # Answer from the session status cache when possible
+        cached = sessions.get_cached_status(session_id)
+        if cached:
+            return {
+                'active': cached['active'],
+                'last_access': cached['last_access'],
+                'message': 'Session status checked successfully',
+                'cached': True
+            }
         
-        # Make request to AIDA API server session status endpoint
-        response = requests.get(
-            f"{api_server_url}/session_status/{session_id}",
-            timeout=10
-        )
+        # Ask the server holding the session
+        with bulkhead.slot():
+            response = balancer.get(
+                f"/session_status/{session_id}",
+                session_id=session_id,
+                timeout=10
+            )
         
         if response.status_code == 200:
             result = response.json()
+            sessions.cache_status(session_id, result.get('active', False), result.get('last_access'))
             return {
                 'active': result.get('active', False),
                 'last_access': result.get('last_access'),
                 'message': 'Session status checked successfully'
             }
         else:
+            if response.status_code == 404:
+                # Unknown to the server, so it won't come back
+                sessions.cache_status(session_id, False)
             return {
                 'active': False,
                 'message': f'Session check failed with status: {response.status_code}'
             }
             
+    except CircuitOpenError:
+        return {
+            'error': True,
+            'message': 'AIDA API server is temporarily unavailable. Please try again shortly.'
+        }
+    except bulkhead.BulkheadFullError:
+        return get_busy_error()
     except requests.exceptions.ConnectionError:
         frappe.log_error(
             "Could not connect to AIDA API server for session status check",
@@ -372,4 +758,66 @@ def health_check():
         'status': 'ok',
         'timestamp': frappe.utils.now(),
         'user': frappe.session.user
-    }
\ No newline at end of file
+    }
+
+@frappe.whitelist(allow_guest=True)
+def get_upstream_health():
+    """
+    Get the AIDA API server health found by the last scheduled probe
+
+    Answered from Redis without contacting the server. Per-server state,
+    URLs and the last error are only included for System Managers.
+    """
+    state = health.get_health()
+    if 'System Manager' in frappe.get_roles():
+        return state
+    return health.get_public_state(state)
+
+@frappe.whitelist()
+def get_upstream_pool_stats():
+    """
+    Get in-flight calls, average latency and rotation state of every configured AIDA API server
+    """
+    frappe.only_for('System Manager')
+    return balancer.get_stats()
+
+@frappe.whitelist()
+def get_bulkhead_stats():
+    """
+    Get the limit of concurrent AIDA API calls, slots in use, and counts of calls that waited or were shed
+    """
+    frappe.only_for('System Manager')
+    return bulkhead.get_stats()
+
+@frappe.whitelist()
+def get_http_pool_stats():
+    """
+    Get keep-alive connection pool statistics of the worker serving this request
+    """
+    frappe.only_for('System Manager')
+    return client.get_pool_stats()
+
+@frappe.whitelist()
+def get_metrics():
+    """
+    Get upstream latency, status and error metrics of all workers in the Prometheus text format
+    """
+    frappe.only_for('System Manager')
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@frappe.whitelist()
+def get_response_cache_stats():
+    """
+    Get response cache size and the most frequently hit entries
+    """
+    frappe.only_for('System Manager')
+    return response_cache.get_stats()
+
+@frappe.whitelist(methods=['POST'])
+def clear_response_cache():
+    """
+    Drop every cached AIDA response
+    """
+    frappe.only_for('System Manager')
+    response_cache.clear()
+    return {'success': True, 'message': 'Response cache cleared'}
@@ -0,0 +1,53 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.map', '.svg', '.json')
+
+# Below this many bytes compression saves less than the extra request overhead
+MIN_SIZE = 256
+
+
+def get_dist_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public', 'dist')
+
+
+def precompress(dist_path=None):
+    """
+    Write ``.gz`` (and ``.br`` when brotli is installed) copies of the built assets
+
+    Copies that are already newer than their source are left alone. Returns the paths written.
+    """
+    dist_path = dist_path or get_dist_path()
+    written = []
+
+    for root, _dirs, files in os.walk(dist_path):
+        for filename in files:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            path = os.path.join(root, filename)
+            if os.path.getsize(path) < MIN_SIZE:
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            encoders = [('.gz', lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+            if brotli:
+                encoders.append(('.br', lambda content: brotli.compress(content, quality=11)))
+
+            for extension, compress in encoders:
+                target = path + extension
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+
+                with open(target, 'wb') as f:
+                    f.write(compress(data))
+                written.append(target)
+
+    return written
@@ -0,0 +1,195 @@
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+import requests
+from frappe.utils import cint
+
+from aida_widget_integration import circuit_breaker, client, health, sessions
+from aida_widget_integration.settings import get_api_server_urls, get_settings
+from aida_widget_integration.utils import hgetall
+
+# Redis hashes of in-flight calls and average latency (ms) by upstream, shared by all workers
+INFLIGHT_KEY = 'aida_upstream_inflight'
+LATENCY_KEY = 'aida_upstream_latency'
+
+# Lets counts left behind by a killed worker drain once traffic stops
+INFLIGHT_TTL = 600
+
+SESSION_NODE_KEY = 'aida_session_node:{}'
+
+# Weight of the newest sample in the latency average
+EWMA_ALPHA = 0.3
+
+# Latency assumed for a server without samples yet, so new servers get traffic
+DEFAULT_LATENCY_MS = 100
+
+EWMA_SCRIPT = """
+local sample = tonumber(ARGV[2])
+local current = redis.call('hget', KEYS[1], ARGV[1])
+if current then
+    sample = tonumber(ARGV[3]) * sample + (1 - tonumber(ARGV[3])) * tonumber(current)
+end
+redis.call('hset', KEYS[1], ARGV[1], tostring(sample))
+return tostring(sample)
+"""
+
+
+def is_ejected(url):
+    """
+    Check whether a server is out of rotation: its circuit is open or the health probe finds it down
+    """
+    upstream = client.get_upstream(url)
+    return circuit_breaker.get_state(upstream)['state'] == 'open' or health.is_down(upstream)
+
+
+def choose(pool, session_id=None, exclude=()):
+    """
+    Pick the server of ``pool`` to send a request to
+
+    A session stays on the server it is pinned to while that server is in
+    rotation. Otherwise the server with the lowest in-flight calls times
+    average latency wins, ties broken at random.
+    """
+    candidates = [url for url in pool if url not in exclude]
+    if not candidates:
+        return None
+
+    # With every server ejected, still try one: it may have recovered since
+    candidates = [url for url in candidates if not is_ejected(url)] or candidates
+
+    if session_id:
+        pinned = get_pinned(session_id)
+        if pinned in candidates:
+            return pinned
+
+    if len(candidates) == 1:
+        return candidates[0]
+
+    cache = frappe.cache()
+    upstreams = [client.get_upstream(url) for url in candidates]
+    pipeline = cache.pipeline()
+    pipeline.hmget(cache.make_key(INFLIGHT_KEY), upstreams)
+    pipeline.hmget(cache.make_key(LATENCY_KEY), upstreams)
+    inflight, latency = pipeline.execute()
+
+    scores = [
+        (max(int(calls or 0), 0) + 1) * float(average or DEFAULT_LATENCY_MS)
+        for calls, average in zip(inflight, latency, strict=True)
+    ]
+    best = min(scores)
+    return random.choice([url for url, score in zip(candidates, scores, strict=True) if score == best])
+
+
+@contextmanager
+def track(url):
+    """
+    Count a call to ``url`` as in flight and feed its duration into the server's latency average
+    """
+    cache = frappe.cache()
+    upstream = client.get_upstream(url)
+    inflight_key = cache.make_key(INFLIGHT_KEY)
+
+    pipeline = cache.pipeline()
+    pipeline.hincrby(inflight_key, upstream, 1)
+    pipeline.expire(inflight_key, INFLIGHT_TTL)
+    pipeline.execute()
+
+    started_at = time.perf_counter()
+    failed_to_connect = False
+    try:
+        yield
+    except circuit_breaker.CircuitOpenError:
+        failed_to_connect = True
+        raise
+    except requests.exceptions.RequestException as e:
+        # A refused connect is fast and would make a dead server look quick
+        failed_to_connect = client.is_connect_error(e)
+        raise
+    finally:
+        cache.hincrby(inflight_key, upstream, -1)
+        if not failed_to_connect:
+            duration_ms = (time.perf_counter() - started_at) * 1000
+            cache.eval(EWMA_SCRIPT, 1, cache.make_key(LATENCY_KEY), upstream, duration_ms, EWMA_ALPHA)
+
+
+def request(method, path, session_id=None, **kwargs):
+    """
+    Send a request to the best AIDA API server of the pool
+
+    When a server can't be connected to or its circuit is open, the request
+    fails over to the next best one. Requests that may have reached a server
+    are never resent to another. The base URL of the server that answered is
+    set on the response as ``aida_server``.
+    """
+    pool = get_api_server_urls()
+    if len(pool) == 1:
+        response = client.request(method, f"{pool[0]}{path}", **kwargs)
+        response.aida_server = pool[0]
+        return response
+
+    tried = []
+    while True:
+        url = choose(pool, session_id, exclude=tried)
+        tried.append(url)
+        last = len(tried) == len(pool)
+
+        try:
+            with track(url):
+                response = client.request(method, f"{url}{path}", failover=not last, **kwargs)
+        except circuit_breaker.CircuitOpenError:
+            if last:
+                raise
+        except requests.exceptions.RequestException as e:
+            if last or not client.is_connect_error(e):
+                raise
+        else:
+            response.aida_server = url
+            return response
+
+
+def get(path, **kwargs):
+    return request('GET', path, **kwargs)
+
+
+def post(path, **kwargs):
+    return request('POST', path, **kwargs)
+
+
+def pin(session_id, url):
+    """
+    Keep ``session_id`` on the server at ``url``, which holds its conversation state
+    """
+    if not session_id or not url or len(get_api_server_urls()) < 2:
+        return
+
+    idle_timeout = cint(get_settings().session_idle_timeout) or sessions.DEFAULT_IDLE_TIMEOUT
+    frappe.cache().set_value(SESSION_NODE_KEY.format(session_id), url, expires_in_sec=idle_timeout)
+
+
+def get_pinned(session_id):
+    return frappe.cache().get_value(SESSION_NODE_KEY.format(session_id))
+
+
+def get_stats():
+    """
+    Get the in-flight calls, latency average and rotation state of every server in the pool
+    """
+    cache = frappe.cache()
+    inflight = hgetall(cache.make_key(INFLIGHT_KEY))
+    latency = hgetall(cache.make_key(LATENCY_KEY))
+
+    servers = []
+    for url in get_api_server_urls():
+        upstream = client.get_upstream(url)
+        average = latency.get(upstream)
+        servers.append({
+            'url': url,
+            'in_flight': max(int(inflight.get(upstream) or 0), 0),
+            'latency_ms': round(float(average), 1) if average else None,
+            'circuit': circuit_breaker.get_state(upstream)['state'],
+            'health': health.get_health(upstream)['status'],
+            'ejected': is_ejected(url)
+        })
+    return {'servers': servers}
@@ -0,0 +1,299 @@
+"""
+Load benchmark of the chat proxy path
+
+Drives the whitelisted API functions at a given concurrency against a
+local mock AIDA server, and compares their latency with calling the mock
+server directly to get the overhead the proxy adds. Run with:
+
+    bench --site <site> aida-benchmark --concurrency 16 --requests 500 --output bench.json
+"""
+
+import itertools
+import json
+import platform
+import threading
+import time
+
+import frappe
+import requests
+
+import aida_widget_integration
+from aida_widget_integration import api, codec, mock_aida_server
+from aida_widget_integration.settings import override_settings
+from aida_widget_integration.utils import get_site_context, run_in_site_context
+
+SCENARIOS = ('chat', 'init_session', 'session_status')
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Answer lengths, in words, the reply encoding paths are compared at
+ENCODING_ANSWER_WORDS = (40, 1000, 20000)
+
+
+def call_scenario(scenario, index):
+    """
+    Make one call of ``scenario`` through the proxy; every call uses fresh IDs so nothing is answered from cache
+    """
+    run_id = f"bench-{index}-{frappe.generate_hash(length=8)}"
+
+    if scenario == 'chat':
+        return api.chat_with_aida(
+            message=f"Benchmark message {run_id}",
+            session_id=run_id,
+            user_hash=run_id,
+            bypass_cache=True
+        )
+    if scenario == 'init_session':
+        return api.initialize_session(username='benchmark', password='benchmark', user_hash=run_id)
+    if scenario == 'session_status':
+        return api.check_session_status(run_id)
+
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+def call_upstream(session, base_url, scenario, index):
+    """
+    Make the upstream request behind one ``scenario`` call directly, as the baseline
+    """
+    run_id = f"bench-{index}"
+
+    if scenario == 'chat':
+        response = session.post(f"{base_url}/chat", json={'user_input': run_id, 'session_id': run_id})
+    elif scenario == 'init_session':
+        response = session.post(f"{base_url}/init_session", json={'username': 'benchmark', 'user_hash': run_id})
+    else:
+        response = session.get(f"{base_url}/session_status/{run_id}")
+
+    response.json()
+    return {}
+
+
+def drive(call, total, concurrency, run_thread=None):
+    """
+    Run ``call(index)`` ``total`` times from ``concurrency`` threads
+
+    ``run_thread(loop)``, if given, runs each thread's loop, e.g. inside a
+    Frappe context. Returns per-call latencies in seconds, the error count
+    and the wall time.
+    """
+    counter = itertools.count()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def loop():
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+
+            started_at = time.perf_counter()
+            try:
+                result = call(index)
+                failed = bool(result.get('error'))
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started_at
+
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    threads = [
+        threading.Thread(target=run_thread, args=(loop,)) if run_thread else threading.Thread(target=loop)
+        for _ in range(concurrency)
+    ]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return latencies, errors[0], time.perf_counter() - started_at
+
+
+def summarize(latencies):
+    """
+    Get nearest-rank latency percentiles, mean and max in milliseconds
+    """
+    if not latencies:
+        return {}
+
+    ordered = sorted(latencies)
+    summary = {
+        f"p{p}": round(ordered[max(0, -(-p * len(ordered) // 100) - 1)] * 1000, 2)
+        for p in PERCENTILES
+    }
+    summary['mean'] = round(sum(ordered) / len(ordered) * 1000, 2)
+    summary['max'] = round(ordered[-1] * 1000, 2)
+    return summary
+
+
+def run_scenario(context, base_url, scenario, total, concurrency, warmup):
+    """
+    Benchmark one scenario through the proxy, then the same upstream calls made directly
+    """
+    def proxy_call(index):
+        return call_scenario(scenario, index)
+
+    def in_site_context(loop):
+        # One Frappe context per thread for the whole run, as a gunicorn thread would have
+        run_in_site_context(context, loop)
+
+    local = threading.local()
+
+    def upstream_call(index):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return call_upstream(local.session, base_url, scenario, index)
+
+    # Warm up connection pools and caches before measuring
+    drive(proxy_call, warmup, concurrency, run_thread=in_site_context)
+    proxy_latencies, proxy_errors, proxy_wall = drive(proxy_call, total, concurrency, run_thread=in_site_context)
+
+    drive(upstream_call, warmup, concurrency)
+    upstream_latencies, upstream_errors, upstream_wall = drive(upstream_call, total, concurrency)
+
+    proxy = summarize(proxy_latencies)
+    upstream = summarize(upstream_latencies)
+
+    return {
+        'scenario': scenario,
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': proxy_errors,
+        'duration_s': round(proxy_wall, 3),
+        'throughput_rps': round(total / proxy_wall, 2) if proxy_wall else None,
+        'latency_ms': proxy,
+        'upstream': {
+            'errors': upstream_errors,
+            'throughput_rps': round(total / upstream_wall, 2) if upstream_wall else None,
+            'latency_ms': upstream
+        },
+        'overhead_ms': {key: round(proxy[key] - upstream[key], 2) for key in proxy}
+    }
+
+
+def run_encoding(answer_words=ENCODING_ANSWER_WORDS, iterations=200):
+    """
+    Time turning an AIDA reply into the HTTP response body, re-encoded versus passed through
+
+    ``reencode`` decodes the reply as ``response.json()`` does and encodes
+    the dict again the way Frappe renders a whitelisted method's return
+    value. ``passthrough`` decodes it with the fast codec for bookkeeping
+    and wraps the original bytes. Times are medians in microseconds.
+    """
+    def reencode(raw):
+        return json.dumps({'message': json.loads(raw)}, default=str, separators=(',', ':')).encode()
+
+    def passthrough(raw):
+        return codec.wrap_message(codec.loads_object(raw).raw)
+
+    results = []
+    for words in answer_words:
+        answer = f"Echo: benchmark {' '.join(['lorem'] * max(words - 2, 0))}".strip()
+        raw = json.dumps({'response': answer, 'session_id': frappe.generate_hash(length=32)}).encode()
+
+        timings = {}
+        for name, render in (('reencode', reencode), ('passthrough', passthrough)):
+            samples = []
+            for _ in range(iterations):
+                started_at = time.perf_counter()
+                render(raw)
+                samples.append(time.perf_counter() - started_at)
+            samples.sort()
+            timings[name] = round(samples[len(samples) // 2] * 1e6, 1)
+
+        results.append({
+            'answer_words': words,
+            'reply_bytes': len(raw),
+            'reencode_us': timings['reencode'],
+            'passthrough_us': timings['passthrough'],
+            'speedup': round(timings['reencode'] / timings['passthrough'], 1) if timings['passthrough'] else None
+        })
+
+    return {'codec': 'orjson' if codec.orjson else 'json', 'results': results}
+
+
+def run(concurrency=8, requests_per_scenario=200, warmup=20, upstream_latency_ms=50, scenarios=None, output=None):
+    """
+    Benchmark the proxy against a local mock AIDA server and return the report
+
+    The proxy is pointed at the mock server and conversation logging, the
+    response cache, background chat, rate limits and the upstream
+    concurrency limit are switched off for this process only; stored
+    settings are not touched. With ``output``, the report is
+    also written there as JSON for comparing releases.
+    """
+    scenarios = scenarios or SCENARIOS
+    if isinstance(scenarios, str):
+        scenarios = [scenario.strip() for scenario in scenarios.split(',')]
+
+    concurrency = max(int(concurrency), 1)
+    server = mock_aida_server.start_server(latency=float(upstream_latency_ms))
+    context = get_site_context()
+
+    try:
+        with override_settings(
+            api_server_url=server.url,
+            api_server_urls='',
+            conversation_logging=0,
+            response_cache_enabled=0,
+            background_chat=0,
+            enable_streaming=0,
+            rate_limit_enabled=0,
+            upstream_concurrency_limit=0
+        ):
+            results = [
+                run_scenario(context, server.url, scenario, int(requests_per_scenario), concurrency, int(warmup))
+                for scenario in scenarios
+            ]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    report = {
+        'app_version': aida_widget_integration.__version__,
+        'frappe_version': frappe.__version__,
+        'python_version': platform.python_version(),
+        'timestamp': frappe.utils.now(),
+        'upstream_latency_ms': float(upstream_latency_ms),
+        'results': results,
+        'encoding': run_encoding()
+    }
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+def format_report(report):
+    """
+    Format a benchmark report as a plain text table
+    """
+    lines = [
+        f"{'scenario':<16}{'rps':>10}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'overhead p50':>14}{'overhead p99':>14}"
+    ]
+    for result in report['results']:
+        latency = result['latency_ms']
+        overhead = result['overhead_ms']
+        lines.append(
+            f"{result['scenario']:<16}{result['throughput_rps']:>10}{result['errors']:>8}"
+            f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+            f"{overhead['p50']:>14}{overhead['p99']:>14}"
+        )
+    lines.append('Latencies in ms; overhead is proxy minus calling the mock server directly.')
+
+    encoding = report.get('encoding')
+    if encoding:
+        lines.append('')
+        lines.append(f"{'answer words':<16}{'reply bytes':>12}{'reencode':>12}{'passthrough':>14}{'speedup':>10}")
+        for result in encoding['results']:
+            lines.append(
+                f"{result['answer_words']:<16}{result['reply_bytes']:>12}{result['reencode_us']:>12}"
+                f"{result['passthrough_us']:>14}{result['speedup']:>10}"
+            )
+        lines.append(f"Reply encoding in µs per reply, median; passthrough decodes with {encoding['codec']}.")
+    return '\n'.join(lines)
@@ -0,0 +1,20 @@
+import frappe
+from frappe.utils import cint
+
+from aida_widget_integration import health, prewarm
+from aida_widget_integration.settings import get_settings
+
+
+def boot_session(bootinfo):
+    """
+    Add what the desk loader needs to draw the chat button to ``frappe.boot``
+    """
+    settings = get_settings()
+    bootinfo.aida_widget = frappe._dict(
+        enabled=cint(settings.widget_enabled),
+        auto_open=cint(settings.auto_open),
+        position=settings.widget_position,
+        upstream_status=health.get_health()['status'],
+        # The server opens the user's AIDA session, so the widget needn't
+        server_session=cint(prewarm.has_credentials(frappe.session.user))
+    )
@@ -0,0 +1,127 @@
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint
+
+from aida_widget_integration import client
+from aida_widget_integration.settings import get_settings
+from aida_widget_integration.utils import hgetall
+
+# Sorted set of held slots, scored by when each lease runs out
+SLOTS_KEY = 'aida_bulkhead_slots'
+STATS_KEY = 'aida_bulkhead_stats'
+
+# Waiting callers retry for a free slot this often, with some jitter (seconds)
+POLL_INTERVAL = 0.025
+
+# A held slot's lease is pushed back at most this often while a long call reports progress (seconds)
+RENEW_INTERVAL = 5
+
+# Drop slots whose lease ran out (left behind by a killed worker), then take one if any is free
+ACQUIRE_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+if redis.call('zcard', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('zadd', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('expire', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class BulkheadFullError(Exception):
+    """Raised when every upstream slot of the site stayed taken for the whole queue timeout"""
+
+
+def get_limit():
+    return max(cint(get_settings().upstream_concurrency_limit), 0)
+
+
+def get_lease():
+    """
+    Longest a slot can be held: a call with all its retries, plus headroom
+    """
+    settings = get_settings()
+    attempts = max(cint(settings.max_retries), 0) + 1
+    return (cint(settings.connection_timeout) or client.DEFAULT_READ_TIMEOUT) * attempts + 30
+
+
+@contextmanager
+def slot():
+    """
+    Hold one of the site's upstream call slots for the duration of the block
+
+    At most ``upstream_concurrency_limit`` upstream calls are in flight per
+    site, across all workers, so chat traffic can't tie up every worker. A
+    caller finding all slots taken waits up to ``upstream_queue_timeout``
+    milliseconds for one, then gets BulkheadFullError.
+
+    The block gets a function to call as a long call makes progress, such as
+    each chunk of a relayed stream; it renews the lease, so the slot isn't
+    reclaimed from a call that outlives it.
+    """
+    limit = get_limit()
+    if not limit:
+        yield lambda: None
+        return
+
+    cache = frappe.cache()
+    slots_key = cache.make_key(SLOTS_KEY)
+    stats_key = cache.make_key(STATS_KEY)
+    token = frappe.generate_hash(length=16)
+    lease = get_lease()
+    deadline = time.monotonic() + max(cint(get_settings().upstream_queue_timeout), 0) / 1000
+    queued = False
+
+    while True:
+        now = time.time()
+        if cache.eval(ACQUIRE_SCRIPT, 1, slots_key, now, limit, now + lease, token, lease):
+            break
+
+        if time.monotonic() >= deadline:
+            cache.hincrby(stats_key, 'shed', 1)
+            raise BulkheadFullError(f"All {limit} AIDA API slots are in use")
+
+        if not queued:
+            queued = True
+            cache.hincrby(stats_key, 'queued', 1)
+        time.sleep(POLL_INTERVAL * random.uniform(0.5, 1.5))
+
+    cache.hincrby(stats_key, 'acquired', 1)
+    renewed_at = time.monotonic()
+
+    def renew():
+        nonlocal renewed_at
+        if time.monotonic() - renewed_at < RENEW_INTERVAL:
+            return
+        renewed_at = time.monotonic()
+        # Only while still held: a slot already reclaimed must not be taken back over the limit
+        pipeline = cache.pipeline()
+        pipeline.zadd(slots_key, {token: time.time() + lease}, xx=True)
+        pipeline.expire(slots_key, lease)
+        pipeline.execute()
+
+    try:
+        yield renew
+    finally:
+        cache.zrem(slots_key, token)
+
+
+def get_stats():
+    """
+    Get the slot limit, slots in use now, and how many calls got a slot, had to wait or were shed
+    """
+    cache = frappe.cache()
+    slots_key = cache.make_key(SLOTS_KEY)
+    cache.zremrangebyscore(slots_key, '-inf', time.time())
+    counters = hgetall(cache.make_key(STATS_KEY))
+
+    return {
+        'limit': get_limit(),
+        'in_use': cache.zcard(slots_key),
+        'acquired': int(counters.get('acquired') or 0),
+        'queued': int(counters.get('queued') or 0),
+        'shed': int(counters.get('shed') or 0)
+    }
@@ -0,0 +1,89 @@
+import frappe
+
+# Consecutive upstream failures within FAILURE_WINDOW that open the circuit
+FAILURE_THRESHOLD = 5
+FAILURE_WINDOW = 60
+
+# How long an open circuit fails calls fast before letting a probe through
+OPEN_DURATION = 30
+
+FAILURES_KEY = 'aida_circuit_failures:{}'
+OPEN_KEY = 'aida_circuit_open:{}'
+PROBE_KEY = 'aida_circuit_probe:{}'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is known to be unhealthy"""
+
+    def __init__(self, upstream):
+        super().__init__(f"Circuit open for {upstream}")
+        self.upstream = upstream
+
+
+def _keys(upstream):
+    cache = frappe.cache()
+    return (
+        cache.make_key(FAILURES_KEY.format(upstream)),
+        cache.make_key(OPEN_KEY.format(upstream)),
+        cache.make_key(PROBE_KEY.format(upstream))
+    )
+
+
+def check(upstream):
+    """
+    Raise CircuitOpenError if calls to ``upstream`` should fail fast
+
+    The circuit state lives in Redis so every worker of the site shares it.
+    Once the open period lapses the circuit is half-open: a single caller
+    is let through as a probe and its outcome closes or re-opens it.
+    """
+    cache = frappe.cache()
+    failures_key, open_key, probe_key = _keys(upstream)
+    failures, is_open = cache.mget(failures_key, open_key)
+
+    if is_open:
+        raise CircuitOpenError(upstream)
+
+    if int(failures or 0) >= FAILURE_THRESHOLD:
+        if not cache.set(probe_key, 1, nx=True, ex=OPEN_DURATION):
+            raise CircuitOpenError(upstream)
+
+
+def record_success(upstream):
+    cache = frappe.cache()
+    failures_key, _open_key, probe_key = _keys(upstream)
+    cache.delete(failures_key, probe_key)
+
+
+def record_failure(upstream):
+    cache = frappe.cache()
+    failures_key, open_key, probe_key = _keys(upstream)
+
+    pipeline = cache.pipeline()
+    pipeline.incr(failures_key)
+    pipeline.expire(failures_key, FAILURE_WINDOW)
+    failures = pipeline.execute()[0]
+
+    if failures >= FAILURE_THRESHOLD:
+        pipeline = cache.pipeline()
+        pipeline.set(open_key, 1, ex=OPEN_DURATION)
+        pipeline.delete(probe_key)
+        pipeline.execute()
+
+
+def get_state(upstream):
+    """
+    Get the circuit state of ``upstream``: closed, open or half-open
+    """
+    cache = frappe.cache()
+    failures_key, open_key, _probe_key = _keys(upstream)
+    failures, is_open = cache.mget(failures_key, open_key)
+
+    if is_open:
+        state = 'open'
+    elif int(failures or 0) >= FAILURE_THRESHOLD:
+        state = 'half-open'
+    else:
+        state = 'closed'
+
+    return {'upstream': upstream, 'state': state, 'failures': int(failures or 0)}
@@ -0,0 +1,239 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import frappe
+import requests
+from frappe.utils import cint
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from aida_widget_integration import circuit_breaker, compression, metrics
+from aida_widget_integration.settings import get_settings
+
+# Connections kept alive per upstream host in each worker process
+DEFAULT_POOL_SIZE = 10
+
+# Read timeout falls back to this when connection_timeout is unset; connects give up sooner
+DEFAULT_READ_TIMEOUT = 30
+CONNECT_TIMEOUT = 5
+
+# Retry delays grow from BACKOFF_BASE up to BACKOFF_CAP seconds, with full jitter
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUSES = (502, 503, 504)
+
+# A 502 or 504 can come after the server did the work; a 503 says it didn't take the request
+UNPROCESSED_STATUSES = (503,)
+
+_session = None
+_session_pool_size = None
+_session_lock = threading.Lock()
+
+
+def get_pool_size():
+    """
+    Get the configured number of keep-alive connections per upstream host
+    """
+    pool_size = cint(get_settings().http_pool_size)
+    return pool_size if pool_size > 0 else DEFAULT_POOL_SIZE
+
+
+def get_session():
+    """
+    Get the pooled HTTP session of this worker process
+
+    The session is created lazily and shared by every upstream call made
+    from this worker, so TCP and TLS connections to the AIDA server are
+    reused across requests instead of being opened for each one. It is
+    rebuilt when the configured pool size changes.
+    """
+    global _session, _session_pool_size
+
+    pool_size = get_pool_size()
+    if _session is None or pool_size != _session_pool_size:
+        with _session_lock:
+            if _session is None or pool_size != _session_pool_size:
+                if _session is not None:
+                    _session.close()
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'Connection': 'keep-alive'})
+                _session_pool_size = pool_size
+                _session = session
+
+    return _session
+
+
+def reset_session():
+    """
+    Close the pooled session so the next call rebuilds it with current settings
+    """
+    global _session, _session_pool_size
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pool_size = None
+
+
+def get_timeouts(read_timeout=None):
+    """
+    Get the ``(connect, read)`` timeout pair for an upstream call
+
+    The read timeout defaults to the configured connection timeout; the
+    connect timeout is kept short so a dead server is noticed quickly.
+    """
+    read_timeout = read_timeout or cint(get_settings().connection_timeout) or DEFAULT_READ_TIMEOUT
+    return (min(CONNECT_TIMEOUT, read_timeout), read_timeout)
+
+
+def get_upstream(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_backoff(attempt):
+    """
+    Jittered exponential delay before retry number ``attempt``
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def is_connect_error(exc):
+    """
+    Check whether a request failed before reaching the server, so it is safe to resend
+    """
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError) and exc.args:
+        return isinstance(getattr(exc.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
+def request(method, url, timeout=None, retries=None, use_circuit_breaker=True, failover=False, **kwargs):
+    """
+    Make an HTTP request to the AIDA API server over the pooled session
+
+    Failed calls are retried up to ``max_retries`` times with jittered
+    exponential backoff. Requests that may already have reached the server
+    are only resent when the method is idempotent, or on a 503, which says
+    the server didn't take the request. Unless ``use_circuit_breaker`` is
+    off, as for health probes and benchmarks, every outcome feeds the
+    upstream's circuit breaker, and calls fail fast with CircuitOpenError
+    while it is open. Each attempt is recorded in the upstream metrics.
+    With ``failover``, a failed connect is raised at once instead of retried,
+    so the caller can move on to another server. Bodies are compressed as
+    negotiated with the upstream, see ``compression.prepare``.
+    """
+    upstream = get_upstream(url)
+    if retries is None:
+        retries = max(cint(get_settings().max_retries), 0)
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    kwargs['timeout'] = get_timeouts(timeout)
+    body_size = compression.prepare(upstream, kwargs)
+
+    attempt = 0
+    while True:
+        if use_circuit_breaker:
+            try:
+                circuit_breaker.check(upstream)
+            except circuit_breaker.CircuitOpenError as e:
+                metrics.record_exception(method, url, type(e).__name__)
+                raise
+
+        try:
+            with metrics.track(method, url) as call:
+                response = get_session().request(method, url, **kwargs)
+                call.status = response.status_code
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if use_circuit_breaker:
+                circuit_breaker.record_failure(upstream)
+            if attempt >= retries or not (idempotent or is_connect_error(e)) or (failover and is_connect_error(e)):
+                raise
+        else:
+            compression.remember(upstream, response)
+            compression.record(method, url, response, body_size, streamed=kwargs.get('stream', False))
+
+            if response.status_code == 415 and kwargs['headers'].get('Content-Encoding'):
+                # The server no longer takes the encoding; a 415 wasn't processed, so resend it as is
+                compression.forget(upstream)
+                compression.decompress_body(kwargs, body_size)
+                response.close()
+                continue
+
+            if response.status_code < 500:
+                if use_circuit_breaker:
+                    circuit_breaker.record_success(upstream)
+                return response
+
+            if use_circuit_breaker:
+                circuit_breaker.record_failure(upstream)
+            retry_statuses = RETRY_STATUSES if idempotent else UNPROCESSED_STATUSES
+            if attempt >= retries or response.status_code not in retry_statuses:
+                return response
+            response.close()
+
+        attempt += 1
+        time.sleep(get_backoff(attempt))
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def get_pool_stats():
+    """
+    Get connection reuse statistics for the pooled session of this worker
+
+    A request that went out over an already open connection counts as a
+    hit, a request that had to open a new connection counts as a miss.
+    """
+    stats = {
+        'pid': os.getpid(),
+        'pool_size': _session_pool_size,
+        'hosts': [],
+        'requests': 0,
+        'hits': 0,
+        'misses': 0,
+        'hit_ratio': None
+    }
+
+    if _session is None:
+        return stats
+
+    adapters = {id(adapter): adapter for adapter in _session.adapters.values()}
+    for adapter in adapters.values():
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+
+            requests_made = getattr(pool, 'num_requests', 0)
+            connections_opened = getattr(pool, 'num_connections', 0)
+            stats['hosts'].append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'requests': requests_made,
+                'hits': max(requests_made - connections_opened, 0),
+                'misses': connections_opened,
+                'idle_connections': pool.pool.qsize() if pool.pool else 0
+            })
+
+    stats['requests'] = sum(host['requests'] for host in stats['hosts'])
+    stats['hits'] = sum(host['hits'] for host in stats['hosts'])
+    stats['misses'] = sum(host['misses'] for host in stats['hosts'])
+    if stats['requests']:
+        stats['hit_ratio'] = round(stats['hits'] / stats['requests'], 4)
+
+    return stats
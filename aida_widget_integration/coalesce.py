@@ -0,0 +1,86 @@
+import hashlib
+import time
+
+import frappe
+
+from aida_widget_integration import codec
+
+LOCK_KEY = 'aida_inflight_lock:{}'
+RESULT_KEY = 'aida_inflight_result:{}'
+
+# Followers check for the leader's result this often
+POLL_INTERVAL = 0.1
+
+# How long a finished result is handed to late duplicates. Requests with an
+# idempotency key are retries of one send, so their result is kept longer.
+RESULT_TTL = 2
+IDEMPOTENT_RESULT_TTL = 60
+
+# Release the lock only if it still holds our token
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_message(message):
+    return ' '.join(str(message or '').split()).casefold()
+
+
+def make_key(user, session_id, message, idempotency_key=None):
+    """
+    Build the coalescing key of a chat request
+
+    The user is part of the key so identical questions from different
+    people are never merged.
+    """
+    parts = [user or '', session_id or '', normalize_message(message), idempotency_key or '']
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def run_once(key, fn, timeout, idempotent=False):
+    """
+    Run ``fn`` once for all concurrent callers sharing ``key``
+
+    The first caller takes a Redis lock and runs ``fn``; callers arriving
+    on any worker while it is in flight wait for its result instead of
+    starting their own. ``fn`` must return a JSON serializable dict. If the
+    leader disappears without a result, waiting callers run ``fn`` themselves.
+    """
+    cache = frappe.cache()
+    lock_key = cache.make_key(LOCK_KEY.format(key))
+    result_key = cache.make_key(RESULT_KEY.format(key))
+    deadline = time.monotonic() + timeout
+
+    while True:
+        result = _get_result(cache, result_key)
+        if result is not None:
+            return result
+
+        token = frappe.generate_hash(length=16)
+        if cache.set(lock_key, token, nx=True, ex=int(timeout) + 1):
+            try:
+                result = fn()
+                ttl = IDEMPOTENT_RESULT_TTL if idempotent and not result.get('error') else RESULT_TTL
+                cache.set(result_key, codec.dumps(result), ex=ttl)
+                return result
+            finally:
+                cache.eval(RELEASE_SCRIPT, 1, lock_key, token)
+
+        # Another request with the same key is in flight: wait for its result
+        # A raw GET: Frappe's exists() would prefix the already made key again
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            result = _get_result(cache, result_key)
+            if result is not None:
+                return result
+
+        if time.monotonic() >= deadline:
+            return fn()
+
+
+def _get_result(cache, result_key):
+    value = cache.get(result_key)
+    return codec.loads(value) if value is not None else None
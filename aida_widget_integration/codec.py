@@ -0,0 +1,50 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawObject(dict):
+    """A decoded JSON object that keeps the bytes it was decoded from in ``raw``"""
+
+    __slots__ = ('raw',)
+
+
+def loads(data):
+    """
+    Decode JSON text or bytes, with orjson when it is installed
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """
+    Encode ``obj`` as compact JSON text, with orjson when it is installed
+    """
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def loads_object(data):
+    """
+    Decode a JSON object, keeping ``data`` on the result so it can be sent on without encoding it again
+    """
+    result = loads(data)
+    if not isinstance(result, dict):
+        return result
+
+    result = RawObject(result)
+    result.raw = data if isinstance(data, bytes) else data.encode()
+    return result
+
+
+def wrap_message(raw):
+    """
+    Put raw JSON in the envelope Frappe gives the return value of a whitelisted method
+    """
+    return b'{"message":' + raw + b'}'
@@ -0,0 +1,45 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command('aida-compress-assets')
+def compress_assets():
+    """Write precompressed copies of the built AIDA widget assets"""
+    from aida_widget_integration.assets import get_dist_path, precompress
+
+    written = precompress()
+    click.echo(f"Wrote {len(written)} precompressed files in {get_dist_path()}")
+
+
+@click.command('aida-benchmark')
+@click.option('--concurrency', default=8, help='Parallel callers')
+@click.option('--requests', 'requests_per_scenario', default=200, help='Calls per scenario')
+@click.option('--warmup', default=20, help='Unmeasured calls per scenario before measuring')
+@click.option('--upstream-latency', default=50.0, help='Delay of the mock AIDA server in ms')
+@click.option('--scenarios', default='chat,init_session,session_status', help='Comma separated scenarios')
+@click.option('--output', help='Write the JSON report to this file')
+@pass_context
+def benchmark(context, concurrency, requests_per_scenario, warmup, upstream_latency, scenarios, output):
+    """Benchmark the chat proxy against a local mock AIDA server"""
+    import frappe
+
+    from aida_widget_integration.benchmark import format_report, run
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        frappe.set_user('Administrator')
+        report = run(
+            concurrency=concurrency,
+            requests_per_scenario=requests_per_scenario,
+            warmup=warmup,
+            upstream_latency_ms=upstream_latency,
+            scenarios=scenarios,
+            output=output
+        )
+        click.echo(format_report(report))
+    finally:
+        frappe.destroy()
+
+
+commands = [compress_assets, benchmark]
@@ -0,0 +1,134 @@
+import gzip
+import json
+
+from frappe.utils import cint
+from urllib3.util.request import ACCEPT_ENCODING
+
+from aida_widget_integration import metrics
+from aida_widget_integration.settings import get_settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Request body encodings this worker can write, most preferred first
+ENCODINGS = ('zstd', 'gzip') if zstandard else ('gzip',)
+
+# Below this many bytes compression saves less than it costs
+DEFAULT_THRESHOLD = 1024
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Request body encodings each upstream accepts, as listed in the Accept-Encoding of its responses (RFC 7694)
+_accepted = {}
+
+
+def is_enabled():
+    return bool(cint(get_settings().compress_upstream))
+
+
+def get_threshold():
+    threshold = get_settings().compression_threshold
+    return DEFAULT_THRESHOLD if threshold in (None, '') else max(cint(threshold), 0)
+
+
+def get_accept_encoding():
+    """
+    Get the response encodings to ask for: zstd when urllib3 can decode it, then gzip
+    """
+    decodable = ACCEPT_ENCODING.split(',')
+    return ', '.join(encoding for encoding in ('zstd', 'gzip') if encoding in decodable)
+
+
+def remember(upstream, response):
+    """
+    Note which request body encodings ``upstream`` accepts, from its response
+    """
+    header = response.headers.get('Accept-Encoding')
+    if isinstance(header, str):
+        _accepted[upstream] = {value.split(';')[0].strip().lower() for value in header.split(',')}
+
+
+def forget(upstream):
+    _accepted.pop(upstream, None)
+
+
+def choose_encoding(upstream):
+    accepted = _accepted.get(upstream, ())
+    return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
+
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def prepare(upstream, kwargs):
+    """
+    Negotiate compression for a request about to be made with ``kwargs``
+
+    Responses are asked for in zstd or gzip, except streamed ones, which are
+    relayed line by line as they arrive. A ``json`` payload of at least
+    ``compression_threshold`` bytes is sent compressed with the best
+    encoding the upstream accepts; servers that never said they accept one
+    get bodies as is. Returns the uncompressed body size when the body was
+    serialized here, else None.
+    """
+    headers = dict(kwargs.get('headers') or {})
+    kwargs['headers'] = headers
+    if not is_enabled():
+        headers['Accept-Encoding'] = 'identity'
+        return None
+
+    # A compressed stream would be held back until the compressor flushes a block
+    headers['Accept-Encoding'] = 'identity' if kwargs.get('stream') else get_accept_encoding()
+    encoding = choose_encoding(upstream)
+    if kwargs.get('json') is None or not encoding:
+        return None
+
+    data = json.dumps(kwargs.pop('json')).encode()
+    headers['Content-Type'] = 'application/json'
+    if len(data) >= get_threshold():
+        headers['Content-Encoding'] = encoding
+        kwargs['data'] = compress(data, encoding)
+    else:
+        kwargs['data'] = data
+    return len(data)
+
+
+def decompress_body(kwargs, size):
+    """
+    Put a request body compressed by ``prepare`` back as it was, for servers that turned it down
+    """
+    encoding = kwargs['headers'].pop('Content-Encoding', None)
+    if encoding == 'zstd':
+        kwargs['data'] = zstandard.ZstdDecompressor().decompress(kwargs['data'], max_output_size=size)
+    elif encoding:
+        kwargs['data'] = gzip.decompress(kwargs['data'])
+
+
+def record(method, url, response, request_size=None, streamed=False):
+    """
+    Record the request and response body sizes of a call, on the wire and uncompressed
+
+    Streamed responses aren't read yet, so only their request body counts.
+    """
+    sizes = []
+
+    body = getattr(response.request, 'body', None)
+    if isinstance(body, str):
+        body = body.encode()
+    if isinstance(body, bytes):
+        encoding = response.request.headers.get('Content-Encoding') or 'identity'
+        sizes.append(('request', encoding, request_size or len(body), len(body)))
+
+    if not streamed and isinstance(response.content, bytes):
+        encoding = response.headers.get('Content-Encoding') or 'identity'
+        wire = response.raw.tell() if hasattr(response.raw, 'tell') else len(response.content)
+        sizes.append(('response', encoding, len(response.content), wire or len(response.content)))
+
+    if sizes:
+        metrics.record_body_sizes(method, url, sizes)
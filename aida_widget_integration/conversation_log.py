@@ -0,0 +1,248 @@
+import base64
+import json
+
+import frappe
+from frappe.query_builder import Order
+from frappe.utils import get_datetime, now
+
+from aida_widget_integration.settings import get_settings
+
+LOG_DOCTYPE = 'AIDA Conversation Log'
+BUFFER_KEY = 'aida_conversation_log_buffer'
+
+# Each user's latest buffered turns, so a history page doesn't read the whole buffer
+USER_BUFFER_KEY = 'aida_conversation_log_buffer:{}'
+
+# A user's buffered turns are normally flushed within a minute; this only drops ones the buffer cap discarded
+USER_BUFFER_TTL = 3600
+
+# Rows written per multi-row INSERT when the buffer is flushed
+FLUSH_BATCH_SIZE = 500
+
+# Oldest buffered rows are dropped beyond this, should flushing stall
+MAX_BUFFER_SIZE = 100000
+
+# Chat turns per page of history
+HISTORY_PAGE_SIZE = 20
+
+# User default holding the time a user last cleared their history
+HISTORY_CLEARED_KEY = 'aida_history_cleared_at'
+
+FIELDS = (
+    'name', 'creation', 'modified', 'owner', 'modified_by',
+    'user', 'session_id', 'user_hash', 'timestamp', 'status', 'duration_ms', 'cached', 'message', 'response'
+)
+
+
+def log_turn(message, result, session_id=None, user_hash=None, duration_ms=None):
+    """
+    Buffer a chat turn for the conversation log
+
+    Only a Redis push happens here; rows reach the database in bulk when
+    the scheduler calls ``flush``, so logging adds no DB writes to the chat request.
+    """
+    if not get_settings().conversation_logging:
+        return
+
+    entry = {
+        'user': frappe.session.user,
+        'session_id': result.get('session_id') or session_id,
+        'user_hash': user_hash,
+        'timestamp': now(),
+        'status': 'Error' if result.get('error') else 'Success',
+        'duration_ms': duration_ms,
+        'cached': 1 if result.get('cached') else 0,
+        'message': message,
+        'response': result.get('response') or result.get('message')
+    }
+
+    value = json.dumps(entry, default=str)
+    cache = frappe.cache()
+    buffer_key = cache.make_key(BUFFER_KEY)
+    user_buffer_key = cache.make_key(USER_BUFFER_KEY.format(entry['user']))
+    pipeline = cache.pipeline()
+    pipeline.rpush(buffer_key, value)
+    pipeline.ltrim(buffer_key, -MAX_BUFFER_SIZE, -1)
+    # Only a page worth is needed for the first page of history
+    pipeline.rpush(user_buffer_key, value)
+    pipeline.ltrim(user_buffer_key, -HISTORY_PAGE_SIZE, -1)
+    pipeline.expire(user_buffer_key, USER_BUFFER_TTL)
+    pipeline.execute()
+
+
+def get_buffered_entries(user=None):
+    """
+    Get conversation log rows that are still waiting in the buffer, oldest first
+
+    With ``user``, only that user's latest ``HISTORY_PAGE_SIZE`` rows are read.
+    """
+    cache = frappe.cache()
+    key = USER_BUFFER_KEY.format(user) if user else BUFFER_KEY
+    # Read raw, as the buffer is written: Frappe's lrange would prefix the key again
+    pipeline = cache.pipeline()
+    pipeline.lrange(cache.make_key(key), 0, -1)
+    return [json.loads(value) for value in pipeline.execute()[0]]
+
+
+def flush():
+    """
+    Move buffered conversation log rows into the database with multi-row inserts
+    """
+    cache = frappe.cache()
+    buffer_key = cache.make_key(BUFFER_KEY)
+    flushed = 0
+
+    while True:
+        # Take a batch off the head of the buffer atomically
+        pipeline = cache.pipeline()
+        pipeline.lrange(buffer_key, 0, FLUSH_BATCH_SIZE - 1)
+        pipeline.ltrim(buffer_key, FLUSH_BATCH_SIZE, -1)
+        batch = pipeline.execute()[0]
+        if not batch:
+            break
+
+        entries = [json.loads(value) for value in batch]
+        try:
+            frappe.db.bulk_insert(LOG_DOCTYPE, FIELDS, [_to_row(entry) for entry in entries])
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            # Put the batch back in front so nothing is lost, and retry on the next run.
+            # Pushed raw: Frappe's lpush takes one value and would prefix the key again.
+            pipeline = cache.pipeline()
+            pipeline.lpush(buffer_key, *reversed(batch))
+            pipeline.execute()
+            frappe.log_error(
+                f"Could not flush {len(batch)} AIDA conversation log rows",
+                "AIDA Conversation Log Error"
+            )
+            break
+
+        # Stored rows are read from the table from now on
+        pipeline = cache.pipeline()
+        for value, entry in zip(batch, entries, strict=True):
+            pipeline.lrem(cache.make_key(USER_BUFFER_KEY.format(entry['user'])), 1, value)
+        pipeline.execute()
+
+        flushed += len(batch)
+        if len(batch) < FLUSH_BATCH_SIZE:
+            break
+
+    return flushed
+
+
+def _to_row(entry):
+    return (
+        frappe.generate_hash(length=10),
+        entry['timestamp'],
+        entry['timestamp'],
+        entry['user'],
+        entry['user'],
+        entry['user'],
+        entry.get('session_id'),
+        entry.get('user_hash'),
+        entry['timestamp'],
+        entry['status'],
+        entry.get('duration_ms'),
+        entry.get('cached', 0),
+        entry.get('message'),
+        entry.get('response')
+    )
+
+
+def get_history(user, cursor=None):
+    """
+    Get one page of a user's chat turns, newest first
+
+    Pages are keyed on ``(creation, name)`` of the last row returned, so
+    fetching older pages stays cheap however long the history is. The first
+    page also includes turns still waiting in the write-behind buffer, ahead
+    of stored ones, and every page holds at most ``HISTORY_PAGE_SIZE`` turns.
+    """
+    log = frappe.qb.DocType(LOG_DOCTYPE)
+    query = (
+        frappe.qb.from_(log)
+        .select(log.name, log.creation, log.timestamp, log.session_id, log.status, log.message, log.response)
+        .where(log.user == user)
+        .orderby(log.creation, order=Order.desc)
+        .orderby(log.name, order=Order.desc)
+        .limit(HISTORY_PAGE_SIZE + 1)
+    )
+
+    cleared_at = frappe.defaults.get_user_default(HISTORY_CLEARED_KEY, user)
+    if cleared_at:
+        query = query.where(log.creation > get_datetime(cleared_at))
+
+    buffered = []
+    if cursor:
+        creation, name = decode_cursor(cursor)
+        query = query.where((log.creation < creation) | ((log.creation == creation) & (log.name < name)))
+    else:
+        buffered = [
+            entry for entry in reversed(get_buffered_entries(user))
+            if not cleared_at or get_datetime(entry['timestamp']) > get_datetime(cleared_at)
+        ]
+
+    rows = query.run(as_dict=True)
+
+    # A flush may have landed between reading the buffer and the table
+    stored = {(str(row.timestamp), row.message) for row in rows}
+    turns = [
+        {
+            'timestamp': entry['timestamp'],
+            'session_id': entry.get('session_id'),
+            'status': entry['status'],
+            'message': entry['message'],
+            'response': entry['response']
+        }
+        for entry in buffered
+        if (str(get_datetime(entry['timestamp'])), entry['message']) not in stored
+    ][:HISTORY_PAGE_SIZE]
+
+    # Stored rows fill the rest of the page
+    page_rows = HISTORY_PAGE_SIZE - len(turns)
+    has_more = len(rows) > page_rows
+    rows = rows[:page_rows]
+
+    if not has_more:
+        next_cursor = None
+    elif rows:
+        next_cursor = encode_cursor(rows[-1].creation, rows[-1].name)
+    else:
+        # Buffered turns filled the page, so the next one starts below the oldest of them
+        next_cursor = encode_cursor(get_datetime(turns[-1]['timestamp']), '')
+
+    turns.extend(
+        {
+            'timestamp': str(row.timestamp),
+            'session_id': row.session_id,
+            'status': row.status,
+            'message': row.message,
+            'response': row.response
+        }
+        for row in rows
+    )
+
+    return {
+        'turns': turns,
+        'next_cursor': next_cursor
+    }
+
+
+def clear_history(user):
+    """
+    Hide a user's chat turns up to now from their history; the log itself is kept
+    """
+    frappe.defaults.set_user_default(HISTORY_CLEARED_KEY, now(), user)
+
+
+def encode_cursor(creation, name):
+    return base64.urlsafe_b64encode(f"{creation}|{name}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        creation, name = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return get_datetime(creation), name
+    except Exception:
+        frappe.throw(frappe._('Invalid history cursor'))
@@ -0,0 +1,145 @@
+import time
+
+import frappe
+import requests
+from frappe.utils import now
+
+from aida_widget_integration import client
+from aida_widget_integration.settings import get_api_server_url, get_api_server_urls
+
+HEALTH_KEY = 'aida_upstream_health:{}'
+HEALTH_EVENT = 'aida_upstream_health'
+
+# Probes run every minute; state older than this means the scheduler stopped, so it is ignored
+HEALTH_TTL = 180
+
+PROBE_TIMEOUT = 5
+
+# A probe slower than this reports the upstream as degraded rather than up
+DEGRADED_LATENCY_MS = 2000
+
+# Fields shown to users who aren't System Managers
+PUBLIC_FIELDS = ('status', 'latency_ms', 'checked_at', 'since')
+
+
+def probe(url=None):
+    """
+    Call the upstream ``/health`` endpoint once and store the outcome
+
+    The state is kept in Redis for every worker to read.
+    """
+    url = url or get_api_server_url()
+    upstream = client.get_upstream(url)
+    previous = get_health(upstream)
+
+    error = None
+    started_at = time.monotonic()
+    try:
+        response = client.get(f"{url}/health", timeout=PROBE_TIMEOUT, retries=0, use_circuit_breaker=False)
+        if response.status_code != 200:
+            error = f"Health check returned status code {response.status_code}"
+    except requests.exceptions.RequestException as e:
+        error = f"{type(e).__name__}: {e}"
+    latency_ms = int((time.monotonic() - started_at) * 1000)
+
+    if error:
+        status = 'down'
+    elif latency_ms >= DEGRADED_LATENCY_MS:
+        status = 'degraded'
+    else:
+        status = 'up'
+
+    checked_at = now()
+    state = {
+        'upstream': upstream,
+        'status': status,
+        'latency_ms': None if error else latency_ms,
+        'checked_at': checked_at,
+        'since': previous['since'] if previous['status'] == status else checked_at,
+        'last_error': error or previous.get('last_error'),
+        'last_error_at': checked_at if error else previous.get('last_error_at')
+    }
+    frappe.cache().set_value(HEALTH_KEY.format(upstream), state, expires_in_sec=HEALTH_TTL)
+
+    if error and previous['status'] != 'down':
+        frappe.log_error(f"AIDA API server {upstream} is down: {error}", "AIDA Upstream Health")
+
+    return state
+
+
+def probe_all():
+    """
+    Probe every configured AIDA API server
+
+    A realtime event is broadcast when the overall status changes, so open
+    widgets update at once.
+    """
+    previous = get_health()
+    states = [probe(url) for url in get_api_server_urls()]
+    current = get_health()
+
+    if current['status'] != previous['status']:
+        frappe.publish_realtime(HEALTH_EVENT, get_public_state(current))
+
+    return states
+
+
+def get_health(upstream=None):
+    """
+    Get the last probed health of an upstream; ``status`` is ``unknown`` until a fresh probe ran
+
+    Without ``upstream`` the health of the whole server pool is returned: down
+    only when every server is, degraded when some are down or slow.
+    """
+    if not upstream:
+        urls = get_api_server_urls()
+        if len(urls) > 1:
+            return get_pool_health(urls)
+        upstream = client.get_upstream(urls[0])
+
+    state = frappe.cache().get_value(HEALTH_KEY.format(upstream))
+    if not state:
+        return {
+            'upstream': upstream,
+            'status': 'unknown',
+            'latency_ms': None,
+            'checked_at': None,
+            'since': None
+        }
+    return state
+
+
+def get_pool_health(urls):
+    servers = [get_health(client.get_upstream(url)) for url in urls]
+    known = [state for state in servers if state['status'] != 'unknown']
+    latencies = [state['latency_ms'] for state in known if state['latency_ms'] is not None]
+
+    if not known:
+        status = 'unknown'
+    elif len(known) == len(servers) and all(state['status'] == 'down' for state in known):
+        status = 'down'
+    elif all(state['status'] == 'up' for state in known):
+        status = 'up'
+    else:
+        status = 'degraded'
+
+    return {
+        'status': status,
+        'latency_ms': min(latencies) if latencies else None,
+        'checked_at': max((state['checked_at'] for state in known), default=None),
+        'since': None,
+        'servers': servers
+    }
+
+
+def is_down(upstream=None):
+    """
+    Check whether the last probe found the upstream, or without one every server, down
+
+    An unknown state counts as up.
+    """
+    return get_health(upstream)['status'] == 'down'
+
+
+def get_public_state(state):
+    return {field: state.get(field) for field in PUBLIC_FIELDS}
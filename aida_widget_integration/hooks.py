@@ -25,8 +25,10 @@ app_license = "mit"
 # ------------------
 
 # include js, css files in header of desk.html
-app_include_css = "/assets/aida_widget_integration/css/aida_chat_widget.css"
-app_include_js = "/assets/aida_widget_integration/js/aida_chat_widget.js"
+# Only the loader ships with every desk page; it pulls in the widget on first use
+# Bundles are built by `bench build` into public/dist with content-hashed names
+app_include_css = "aida_chat_loader.bundle.css"
+app_include_js = "aida_chat_loader.bundle.js"
 
 # include js, css files in header of web template
 # web_include_css = "/assets/aida_widget_integration/css/aida_widget_integration.css"
@@ -82,6 +84,18 @@ app_include_js = "/assets/aida_widget_integration/js/aida_chat_widget.js"
 # 	"filters": "aida_widget_integration.utils.jinja_filters"
 # }
 
+# Boot
+# ----
+
+# Tells the desk loader whether to draw the chat button without a request
+boot_session = "aida_widget_integration.boot.boot_session"
+
+# Sessions
+# --------
+
+# Opens the AIDA session of users with stored credentials as they log in
+on_session_creation = "aida_widget_integration.prewarm.on_session_creation"
+
 # Installation
 # ------------
 
@@ -143,6 +157,15 @@ before_uninstall = "aida_widget_integration.install.before_uninstall"
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"aida_widget_integration.tasks.flush_conversation_logs",
+			"aida_widget_integration.tasks.probe_upstream_health"
+		]
+	}
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"aida_widget_integration.tasks.all"
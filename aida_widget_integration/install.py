@@ -1,5 +1,6 @@
 import frappe
 from frappe import _
+from aida_widget_integration.settings import clear_settings_cache
 
 def after_install():
     """Called after the app is installed"""
@@ -48,7 +49,7 @@ def before_uninstall():
     """Called before the app is uninstalled"""
     try:
         # Clean up any cached data
-        frappe.cache().delete_key("aida_widget_settings")
+        clear_settings_cache()
         print("AIDA Widget cache cleared.")
     except Exception as e:
         print(f"Error during cleanup: {str(e)}")
@@ -0,0 +1,153 @@
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import frappe
+
+from aida_widget_integration.utils import hgetall
+
+# One Redis hash per site holds every series, keyed by its exposition-format name
+METRICS_KEY = 'aida_metrics'
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+DURATION = 'aida_upstream_request_duration_seconds'
+REQUESTS = 'aida_upstream_requests_total'
+EXCEPTIONS = 'aida_upstream_exceptions_total'
+IN_FLIGHT = 'aida_upstream_in_flight_requests'
+BODY_BYTES = 'aida_upstream_body_bytes_total'
+UNCOMPRESSED_BYTES = 'aida_upstream_body_uncompressed_bytes_total'
+
+FAMILIES = (
+    (DURATION, 'histogram', 'Time until the AIDA API server responded, per attempt'),
+    (REQUESTS, 'counter', 'Responses from the AIDA API server by status code'),
+    (EXCEPTIONS, 'counter', 'AIDA API calls that raised instead of returning a response'),
+    (IN_FLIGHT, 'gauge', 'AIDA API calls currently waiting for a response'),
+    (BODY_BYTES, 'counter', 'Request and response body bytes exchanged with the AIDA API server, as sent'),
+    (UNCOMPRESSED_BYTES, 'counter', 'Request and response body bytes exchanged with the AIDA API server, before compression')
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def get_endpoint(url):
+    """
+    Get the metrics label of an upstream URL: its first path segment, so IDs don't become labels
+    """
+    segment = urlsplit(url).path.strip('/').split('/')[0]
+    return f"/{segment}"
+
+
+def _series(name, **labels):
+    rendered = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return f"{name}{{{rendered}}}"
+
+
+@contextmanager
+def track(method, url):
+    """
+    Record latency, outcome and in-flight count of one upstream call
+
+    Used as ``with metrics.track(method, url) as call:``, setting
+    ``call.status`` to the response status code. An exception leaving the
+    block is counted and re-raised. For streamed responses the latency is
+    the time until the headers arrived.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(METRICS_KEY)
+    endpoint = get_endpoint(url)
+    labels = {'endpoint': endpoint, 'method': method.upper()}
+    call = frappe._dict(status=None)
+
+    cache.hincrby(key, _series(IN_FLIGHT, endpoint=endpoint), 1)
+    started_at = time.perf_counter()
+    exception = None
+
+    try:
+        yield call
+    except BaseException as e:
+        exception = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started_at
+
+        # Everything is written in one round trip
+        pipeline = cache.pipeline()
+        pipeline.hincrby(key, _series(IN_FLIGHT, endpoint=endpoint), -1)
+        if exception:
+            pipeline.hincrby(key, _series(EXCEPTIONS, **labels, exception=exception), 1)
+        else:
+            pipeline.hincrby(key, _series(REQUESTS, **labels, status=call.status), 1)
+
+        for bound in LATENCY_BUCKETS:
+            if duration <= bound:
+                pipeline.hincrby(key, _series(f"{DURATION}_bucket", **labels, le=bound), 1)
+        pipeline.hincrby(key, _series(f"{DURATION}_bucket", **labels, le='+Inf'), 1)
+        pipeline.hincrbyfloat(key, _series(f"{DURATION}_sum", **labels), duration)
+        pipeline.hincrby(key, _series(f"{DURATION}_count", **labels), 1)
+        pipeline.execute()
+
+
+def record_exception(method, url, exception):
+    """
+    Count an upstream call that failed before it was made, e.g. rejected by the circuit breaker
+    """
+    cache = frappe.cache()
+    series = _series(EXCEPTIONS, endpoint=get_endpoint(url), method=method.upper(), exception=exception)
+    cache.hincrby(cache.make_key(METRICS_KEY), series, 1)
+
+
+def record_body_sizes(method, url, sizes):
+    """
+    Count the body bytes of one upstream call, given as ``(direction, encoding, uncompressed, sent)`` tuples
+    """
+    cache = frappe.cache()
+    key = cache.make_key(METRICS_KEY)
+    labels = {'endpoint': get_endpoint(url), 'method': method.upper()}
+
+    pipeline = cache.pipeline()
+    for direction, encoding, uncompressed, sent in sizes:
+        pipeline.hincrby(key, _series(BODY_BYTES, **labels, direction=direction, encoding=encoding), sent)
+        pipeline.hincrby(key, _series(UNCOMPRESSED_BYTES, **labels, direction=direction, encoding=encoding), uncompressed)
+    pipeline.execute()
+
+
+def _sort_key(series):
+    # Keep each histogram's buckets together and in ascending order
+    name, _, labels = series.partition('{')
+    le = None
+    rest = []
+    for label in labels.rstrip('}').split(','):
+        if label.startswith('le='):
+            le = label[4:-1]
+        else:
+            rest.append(label)
+    bound = float('inf') if le == '+Inf' else float(le) if le else -1
+    return (','.join(rest), name, bound)
+
+
+def render():
+    """
+    Render every series of this site in the Prometheus text exposition format
+    """
+    values = hgetall(frappe.cache().make_key(METRICS_KEY))
+
+    lines = []
+    for name, metric_type, description in FAMILIES:
+        family = sorted(
+            (series for series in values if series.partition('{')[0] in (name, f"{name}_bucket", f"{name}_sum", f"{name}_count")),
+            key=_sort_key
+        )
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(f"{series} {values[series]}" for series in family)
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    frappe.cache().delete(frappe.cache().make_key(METRICS_KEY))
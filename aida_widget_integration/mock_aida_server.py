@@ -0,0 +1,418 @@
+"""
+Local stand-in for the AIDA API server
+
+Implements the endpoints the widget proxies to (``/chat``, ``/init_session``,
+``/session_status/<id>`` and ``/health``) with configurable latency,
+failures and streaming, so slow or flaky upstream behaviour can be
+reproduced offline. Run it standalone with:
+
+    python -m aida_widget_integration.mock_aida_server --port 5000 --latency lognormal:300:0.6 --error-rate 0.05
+
+and point the AIDA API Server URL setting at ``http://127.0.0.1:5000``.
+
+Latency specs are in milliseconds: ``50`` (fixed), ``uniform:20:200``,
+``normal:100:30``, ``lognormal:<median>:<sigma>`` or ``exponential:<mean>``.
+"""
+
+import argparse
+import gzip
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ENDPOINTS = ('/chat', '/init_session', '/session_status', '/health')
+
+FAULTS = ('error', 'timeout', 'drop')
+
+# Body encodings understood in both directions when compression is on
+ENCODINGS = ('zstd', 'gzip') if zstandard else ('gzip',)
+
+# JSON replies shorter than this are sent uncompressed
+COMPRESS_MIN_SIZE = 256
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a function drawing a delay in seconds from ``rng``
+    """
+    if callable(spec):
+        return spec
+    if spec is None or spec == '':
+        return lambda rng: 0.0
+
+    name, _, args = str(spec).partition(':')
+    try:
+        if not args:
+            fixed = float(name) / 1000
+            return lambda rng: fixed
+
+        values = [float(value) for value in args.split(':')]
+        if name == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high) / 1000
+        if name == 'normal':
+            mean, stddev = values
+            return lambda rng: max(rng.gauss(mean, stddev), 0) / 1000
+        if name == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+        if name == 'exponential':
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) / 1000
+    except ValueError:
+        pass
+
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class MockAidaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == '/health':
+            if not self.begin('/health'):
+                return
+            return self.reply(200, {'status': 'ok', 'sessions': len(self.server.sessions)})
+
+        if self.path == '/__mock__/stats':
+            return self.reply(200, self.server.get_stats())
+
+        if self.path.startswith('/session_status/'):
+            session_id = self.path.rsplit('/', 1)[-1]
+            if not self.begin('/session_status'):
+                return
+
+            last_access = self.server.sessions.get(session_id)
+            if last_access is None and self.server.strict_sessions:
+                return self.reply(404, {'error': 'Session not found'})
+
+            return self.reply(200, {
+                'session_id': session_id,
+                'active': True,
+                'last_access': (last_access or datetime.now(timezone.utc)).isoformat()
+            })
+
+        self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        payload = self.read_json()
+        if payload is None:
+            return self.reply(415, {'error': 'Unsupported Content-Encoding'})
+
+        if self.path == '/chat':
+            if not self.begin('/chat'):
+                return
+
+            session_id = payload.get('session_id') or uuid.uuid4().hex
+            self.server.touch_session(session_id)
+            response = self.server.make_answer(payload.get('user_input', ''))
+
+            if self.wants_stream(payload):
+                return self.stream(response, session_id)
+            return self.reply(200, {'response': response, 'session_id': session_id})
+
+        if self.path == '/init_session':
+            if not self.begin('/init_session'):
+                return
+
+            session_id = uuid.uuid4().hex
+            self.server.touch_session(session_id)
+            return self.reply(200, {
+                'session_id': session_id,
+                'session_token': uuid.uuid4().hex,
+                'message': 'Session initialized successfully',
+                'restored': False
+            })
+
+        self.reply(404, {'error': 'Not found'})
+
+    def begin(self, endpoint):
+        """
+        Count the call, wait out its latency and apply any fault; False when the reply was already handled
+        """
+        server = self.server
+        server.count(endpoint)
+        fault = server.next_fault(endpoint)
+
+        if fault == 'drop':
+            # Close without answering, as a crashed upstream would
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return False
+
+        if fault == 'timeout':
+            time.sleep(server.hang)
+            self.reply(504, {'error': 'Upstream timed out'})
+            return False
+
+        time.sleep(server.draw_latency(endpoint))
+
+        if fault == 'error':
+            self.reply(server.error_status, {'error': 'Injected failure'})
+            return False
+
+        return True
+
+    def wants_stream(self, payload):
+        if self.server.streaming == 'never':
+            return False
+        if self.server.streaming == 'always':
+            return True
+        return bool(payload.get('stream')) or 'text/event-stream' in (self.headers.get('Accept') or '')
+
+    def stream(self, response, session_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        words = response.split(' ')
+        for i, word in enumerate(words):
+            delta = word if i == 0 else f" {word}"
+            self.write_chunk(f"data: {json.dumps({'delta': delta})}\n\n")
+            time.sleep(self.server.token_delay)
+
+        self.write_chunk(f"data: {json.dumps({'session_id': session_id, 'done': True})}\n\n")
+        self.write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def read_json(self):
+        """
+        Read the JSON request body, or None when it is compressed in an encoding not accepted
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        encoding = (self.headers.get('Content-Encoding') or 'identity').lower()
+        self.server.count_encoding(encoding)
+        if encoding != 'identity':
+            if not self.server.compression or encoding not in ENCODINGS:
+                return None
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(body) if encoding == 'zstd' else gzip.decompress(body)
+
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            return {}
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        encoding = self.choose_encoding() if len(data) >= COMPRESS_MIN_SIZE else None
+        if encoding == 'zstd':
+            data = zstandard.ZstdCompressor().compress(data)
+        elif encoding == 'gzip':
+            data = gzip.compress(data)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if self.server.compression:
+            # Tells clients which encodings request bodies may use (RFC 7694)
+            self.send_header('Accept-Encoding', ', '.join(ENCODINGS))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def choose_encoding(self):
+        if not self.server.compression:
+            return None
+        accepted = {value.split(';')[0].strip().lower() for value in (self.headers.get('Accept-Encoding') or '').split(',')}
+        return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
+
+
+class MockAidaServer(ThreadingHTTPServer):
+    """
+    Mock AIDA API server
+
+    ``latency`` is a spec or a dict of specs by endpoint, with ``'default'``
+    for the rest. ``error_rate``, ``timeout_rate`` and ``drop_rate`` are the
+    probabilities of answering ``error_status``, hanging ``hang`` seconds
+    before a 504, or closing the connection without an answer. Faults can
+    also be queued with ``inject`` for deterministic tests. ``streaming``
+    is ``'auto'`` (stream when the client asks), ``'always'`` or ``'never'``.
+    With ``compression`` the server advertises gzip (and zstd when
+    zstandard is installed) for request bodies and compresses JSON replies
+    for clients asking for it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0, error_rate=0.0, error_status=500, timeout_rate=0.0, hang=60.0,
+                 drop_rate=0.0, streaming='auto', token_delay=0.02, answer_words=40, strict_sessions=False,
+                 compression=True, seed=None, verbose=False):
+        super().__init__(address, MockAidaHandler)
+        latency = latency if isinstance(latency, dict) else {'default': latency}
+        self.latency = {endpoint: parse_latency(spec) for endpoint, spec in latency.items()}
+        self.latency.setdefault('default', parse_latency(0))
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.drop_rate = drop_rate
+        self.streaming = streaming
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.strict_sessions = strict_sessions
+        self.compression = compression
+        self.verbose = verbose
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.calls = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.request_encodings = {}
+        self.faults = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw_latency(self, endpoint):
+        draw = self.latency.get(endpoint, self.latency['default'])
+        with self.lock:
+            return draw(self.rng)
+
+    def inject(self, endpoint, fault, count=1):
+        """
+        Make the next ``count`` calls to ``endpoint`` fail with ``fault``: error, timeout or drop
+        """
+        if fault not in FAULTS:
+            raise ValueError(f"Unknown fault {fault}")
+        with self.lock:
+            self.faults.setdefault(endpoint, []).extend([fault] * count)
+
+    def next_fault(self, endpoint):
+        with self.lock:
+            queued = self.faults.get(endpoint)
+            if queued:
+                return queued.pop(0)
+
+            roll = self.rng.random()
+            for fault, rate in (('drop', self.drop_rate), ('timeout', self.timeout_rate), ('error', self.error_rate)):
+                if roll < rate:
+                    return fault
+                roll -= rate
+        return None
+
+    def count(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def count_encoding(self, encoding):
+        with self.lock:
+            self.request_encodings[encoding] = self.request_encodings.get(encoding, 0) + 1
+
+    def touch_session(self, session_id):
+        with self.lock:
+            self.sessions[session_id] = datetime.now(timezone.utc)
+
+    def make_answer(self, user_input):
+        filler = ' '.join(['lorem'] * max(self.answer_words - 2, 0))
+        return f"Echo: {user_input} {filler}".strip()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'sessions': len(self.sessions),
+                'request_encodings': dict(self.request_encodings)
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = {endpoint: 0 for endpoint in ENDPOINTS}
+            self.request_encodings = {}
+            self.faults = {}
+
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """
+    Start a mock AIDA server on a background thread
+
+    ``port=0`` picks a free port; read it back from ``server.url``. Options
+    are those of MockAidaServer. Call ``server.shutdown()`` to stop it.
+    """
+    server = MockAidaServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run a mock AIDA API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', default='0', help='Latency spec in ms for every endpoint')
+    for endpoint in ('chat', 'init_session', 'session_status'):
+        parser.add_argument(f"--{endpoint.replace('_', '-')}-latency", help=f"Latency spec in ms for /{endpoint}")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an error response')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Probability of hanging before a 504')
+    parser.add_argument('--hang', type=float, default=60.0, help='Seconds a timed out call hangs')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Probability of closing without an answer')
+    parser.add_argument('--streaming', choices=('auto', 'always', 'never'), default='auto')
+    parser.add_argument('--token-delay', type=float, default=20.0, help='Milliseconds between streamed words')
+    parser.add_argument('--answer-words', type=int, default=40)
+    parser.add_argument('--strict-sessions', action='store_true', help='Answer 404 for unknown session IDs')
+    parser.add_argument('--no-compression', action='store_true', help='Neither accept nor send compressed bodies')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible latency and faults')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    options = parser.parse_args(args)
+
+    latency = {'default': options.latency}
+    for endpoint in ('chat', 'init_session', 'session_status'):
+        spec = getattr(options, f"{endpoint}_latency")
+        if spec:
+            latency[f"/{endpoint}"] = spec
+
+    server = MockAidaServer(
+        (options.host, options.port),
+        latency=latency,
+        error_rate=options.error_rate,
+        error_status=options.error_status,
+        timeout_rate=options.timeout_rate,
+        hang=options.hang,
+        drop_rate=options.drop_rate,
+        streaming=options.streaming,
+        token_delay=options.token_delay / 1000,
+        answer_words=options.answer_words,
+        strict_sessions=options.strict_sessions,
+        compression=not options.no_compression,
+        seed=options.seed,
+        verbose=options.verbose
+    )
+    print(f"Mock AIDA server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
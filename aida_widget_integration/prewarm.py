@@ -0,0 +1,171 @@
+import frappe
+from frappe.utils import cint, get_url
+
+from aida_widget_integration import coalesce, sessions
+from aida_widget_integration.settings import get_settings
+
+CREDENTIALS_DOCTYPE = 'AIDA User Credentials'
+
+# AIDA session opened for a user on the server, used when the widget sends none
+USER_SESSION_KEY = 'aida_user_session:{}'
+
+# Coalescing key of a user's warm-up, apart from the hashed keys of chat messages
+WARM_KEY = 'aida_prewarm:{}'
+
+WARM_TIMEOUT = 60
+
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def get_user_hash(user, site_url=None):
+    """
+    Get the hash the widget derives from the site URL and user, which the AIDA server restores sessions by
+
+    The widget hashes the origin it runs on, which differs from ``get_url()``
+    behind a proxy or with ``host_name`` set, so the hash it sends is stored
+    with the credentials and this is only a fallback.
+    """
+    # Same 32-bit string hash as generateUserHash in the widget
+    value = 0
+    for char in f"{site_url or get_url()}:{user}":
+        value = (((value << 5) - value + ord(char)) + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+    value = abs(value)
+    digits = ''
+    while True:
+        value, digit = divmod(value, 36)
+        digits = BASE36[digit] + digits
+        if not value:
+            return digits
+
+
+def has_credentials(user):
+    return bool(user and user != 'Guest' and frappe.db.exists(CREDENTIALS_DOCTYPE, user))
+
+
+def get_user_session(user):
+    """
+    Get the AIDA session opened for ``user`` as a ``{session_id, session_token}`` dict, or None
+    """
+    return frappe.cache().get_value(USER_SESSION_KEY.format(user))
+
+
+def set_user_session(user, session_id, session_token=None):
+    """
+    Remember ``session_id`` as the user's AIDA session until the AIDA server would expire it
+
+    ``session_token`` is the token ``initialize_session`` issued for the
+    session, which chat turns in it are checked against.
+    """
+    idle_timeout = cint(get_settings().session_idle_timeout) or sessions.DEFAULT_IDLE_TIMEOUT
+    frappe.cache().set_value(
+        USER_SESSION_KEY.format(user),
+        {'session_id': session_id, 'session_token': session_token},
+        expires_in_sec=idle_timeout
+    )
+
+
+def clear_user_session(user):
+    frappe.cache().delete_value(USER_SESSION_KEY.format(user))
+
+
+def on_session_creation(login_manager):
+    """
+    Open the AIDA session of a user with stored credentials in the background as they log in
+
+    By the time they send their first message the session is ready, so it
+    goes straight to ``/chat`` instead of waiting on session setup first.
+    """
+    user = login_manager.user
+    if not has_credentials(user):
+        return
+
+    frappe.enqueue(
+        'aida_widget_integration.prewarm.warm_session',
+        queue='short',
+        enqueue_after_commit=True,
+        user=user
+    )
+
+
+def warm_session(user):
+    """
+    Make sure ``user`` has a live AIDA session, keeping the cached one if still active
+
+    Returns the session as ``get_user_session`` does, or None if no session
+    could be opened. Runs once at a time per user; concurrent callers get the
+    same session.
+    """
+    def warm():
+        from aida_widget_integration import api
+
+        user_session = get_user_session(user)
+        if user_session and api.check_session_status(user_session['session_id']).get('active'):
+            set_user_session(user, user_session['session_id'], user_session['session_token'])
+            return user_session
+
+        if not has_credentials(user):
+            return {'session_id': None}
+
+        credentials = frappe.get_doc(CREDENTIALS_DOCTYPE, user)
+        result = api.initialize_session(
+            erpnext_url=credentials.erpnext_url or None,
+            username=credentials.username or user,
+            password=credentials.get_password('password', raise_exception=False),
+            user_hash=credentials.user_hash or get_user_hash(user)
+        )
+        if not result.get('success'):
+            return {'session_id': None}
+
+        set_user_session(user, result['session_id'], result['session_token'])
+        return {'session_id': result['session_id'], 'session_token': result['session_token']}
+
+    user_session = coalesce.run_once(WARM_KEY.format(user), warm, timeout=WARM_TIMEOUT)
+    return user_session if user_session['session_id'] else None
+
+
+def resolve_session(user):
+    """
+    Get the session to chat in for a user whose widget sent none: the pre-warmed one, or one opened now
+
+    Returns it as ``get_user_session`` does, or None.
+    """
+    if user == 'Guest':
+        return None
+    return get_user_session(user) or (warm_session(user) if has_credentials(user) else None)
+
+
+def save_credentials(user, username=None, password=None, erpnext_url=None, user_hash=None):
+    """
+    Store a user's Mocxha credentials and open their AIDA session with them
+    """
+    if frappe.db.exists(CREDENTIALS_DOCTYPE, user):
+        doc = frappe.get_doc(CREDENTIALS_DOCTYPE, user)
+    else:
+        doc = frappe.new_doc(CREDENTIALS_DOCTYPE)
+        doc.user = user
+
+    doc.username = username or user
+    doc.erpnext_url = erpnext_url
+    if user_hash:
+        doc.user_hash = user_hash
+    if password:
+        doc.password = password
+    doc.save(ignore_permissions=True)
+
+    # A session opened with the old credentials shouldn't outlive them
+    clear_user_session(user)
+    frappe.enqueue(
+        'aida_widget_integration.prewarm.warm_session',
+        queue='short',
+        enqueue_after_commit=True,
+        user=user
+    )
+
+
+def forget_credentials(user):
+    """
+    Delete a user's stored Mocxha credentials; deleting them also drops their AIDA session
+    """
+    if frappe.db.exists(CREDENTIALS_DOCTYPE, user):
+        frappe.delete_doc(CREDENTIALS_DOCTYPE, user, ignore_permissions=True)
@@ -0,0 +1,47 @@
+/**
+ * AIDA Chat Loader
+ * Shows the floating button; the widget loads on first use or when idle
+ */
+
+(() => {
+    // Bundle names resolve to the hashed build output
+    const ASSETS = ['aida_chat_widget.bundle.js', 'aida_chat_widget.bundle.css'];
+
+    const start = () => {
+        const config = frappe.boot && frappe.boot.aida_widget;
+        if (!config || !config.enabled || document.getElementById('aida-floating-btn')) return;
+
+        const btn = document.createElement('div');
+        btn.id = 'aida-floating-btn';
+        btn.className = 'aida-position-' + (config.position || 'Bottom Right').toLowerCase().replace(' ', '-');
+        btn.innerHTML = '<svg width="24" height="24" viewBox="0 0 24 24" fill="white"><path d="M12 2C6.48 2 2 6.48 2 12c0 1.54.36 2.99 1.01 4.28L2 22l5.72-1.01C9.01 21.64 10.46 22 12 22c5.52 0 10-4.48 10-10S17.52 2 12 2z" fill="none" stroke="white" stroke-width="2"/><circle cx="8" cy="12" r="1.2"/><circle cx="12" cy="12" r="1.2"/><circle cx="16" cy="12" r="1.2"/></svg>';
+
+        let loading = null;
+        const load = () => {
+            // The widget binds its own handlers to the button
+            loading = loading || new Promise(resolve => frappe.require(ASSETS, resolve))
+                .then(() => window.aidaChatWidget.ready)
+                .then(() => btn.removeEventListener('click', open));
+            return loading;
+        };
+        const open = () => load().then(() => window.aidaChatWidget.openWidget());
+
+        btn.addEventListener('click', open);
+        btn.addEventListener('pointerenter', load, { once: true });
+        document.body.appendChild(btn);
+
+        if (config.auto_open) {
+            load();
+        } else if (window.requestIdleCallback) {
+            requestIdleCallback(load, { timeout: 10000 });
+        } else {
+            setTimeout(load, 3000);
+        }
+    };
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', start);
+    } else {
+        start();
+    }
+})();
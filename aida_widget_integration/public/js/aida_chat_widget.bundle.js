@@ -3,16 +3,249 @@
  * Floating chat widget that connects to AIDA API server
  */
 
+// Messages kept in localStorage when history is not stored on the server
+const AIDA_LOCAL_HISTORY_LIMIT = 100;
+
+// Load the previous history page when scrolled this close to the top (px)
+const AIDA_HISTORY_SCROLL_THRESHOLD = 80;
+
+// Height assumed for messages that have not been rendered yet (px)
+const AIDA_ESTIMATED_MESSAGE_HEIGHT = 80;
+
+// Messages rendered beyond each edge of the viewport
+const AIDA_OVERSCAN = 6;
+
+// Within this distance of the bottom the list follows new content (px)
+const AIDA_STICK_THRESHOLD = 40;
+
+// How often an open widget re-reads the cached upstream health (ms)
+const AIDA_HEALTH_POLL_INTERVAL = 60000;
+
+/**
+ * Windowed message list
+ * Only messages near the viewport are in the DOM; the rest are stood in for
+ * by padding sized from measured (or estimated) heights. One ResizeObserver
+ * tracks message heights and keeps the list pinned to the bottom.
+ */
+class AidaMessageList {
+    constructor(container, createElement) {
+        this.container = container;
+        this.createElement = createElement;
+        this.messages = [];
+        this.heights = new WeakMap();
+        this.elements = new Map();
+        this.elementMessages = new WeakMap();
+        this.animated = new WeakSet();
+        this.start = 0;
+        this.end = 0;
+        this.firstVisible = 0;
+        this.stickToBottom = true;
+        this.frame = null;
+
+        this.list = document.createElement('div');
+        this.list.className = 'aida-message-list';
+        // Typing indicator and streaming reply live below the list
+        this.footer = document.createElement('div');
+        this.footer.className = 'aida-message-footer';
+        this.container.append(this.list, this.footer);
+
+        // Scroll position is managed here; smooth scrolling would fight it
+        this.container.style.scrollBehavior = 'auto';
+        this.container.style.overflowAnchor = 'none';
+
+        this.resizeObserver = new ResizeObserver(entries => this.onResize(entries));
+        this.resizeObserver.observe(this.container);
+        this.resizeObserver.observe(this.footer);
+
+        this.container.addEventListener('scroll', () => this.onScroll(), { passive: true });
+    }
+
+    append(message, element = null) {
+        this.messages.push(message);
+        if (element) {
+            this.adopt(message, element);
+        } else {
+            this.animated.add(message);
+        }
+        this.schedule();
+    }
+
+    prepend(messages) {
+        if (!messages.length) return;
+
+        this.messages = messages.concat(this.messages);
+        this.start += messages.length;
+        this.end += messages.length;
+        this.firstVisible += messages.length;
+
+        // Keep what is on screen in place while older messages are added above
+        if (!this.stickToBottom) {
+            this.update();
+            this.container.scrollTop += this.offsetOf(messages.length);
+        }
+        this.schedule();
+    }
+
+    clear() {
+        this.elements.forEach(element => this.release(element));
+        this.elements.clear();
+        this.messages = [];
+        this.start = this.end = this.firstVisible = 0;
+        this.stickToBottom = true;
+        this.schedule();
+    }
+
+    scrollToBottom() {
+        this.stickToBottom = true;
+        this.schedule();
+    }
+
+    schedule() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.update();
+            if (this.stickToBottom) {
+                this.container.scrollTop = this.container.scrollHeight;
+            }
+        });
+    }
+
+    getGap() {
+        return parseFloat(getComputedStyle(this.list).rowGap) || 0;
+    }
+
+    heightOf(message) {
+        return this.heights.get(message) || AIDA_ESTIMATED_MESSAGE_HEIGHT;
+    }
+
+    offsetOf(index) {
+        const gap = this.getGap();
+        let offset = 0;
+        for (let i = 0; i < index; i++) {
+            offset += this.heightOf(this.messages[i]) + gap;
+        }
+        return offset;
+    }
+
+    update() {
+        const gap = this.getGap();
+        const count = this.messages.length;
+        const offsets = new Array(count + 1);
+        offsets[0] = 0;
+        for (let i = 0; i < count; i++) {
+            offsets[i + 1] = offsets[i] + this.heightOf(this.messages[i]) + gap;
+        }
+
+        const viewportHeight = this.container.clientHeight;
+        const viewTop = this.stickToBottom
+            ? Math.max(0, offsets[count] - viewportHeight)
+            : this.container.scrollTop - this.list.offsetTop;
+        const viewBottom = viewTop + viewportHeight;
+
+        let first = 0;
+        while (first < count && offsets[first + 1] <= viewTop) first++;
+        let last = first;
+        while (last < count && offsets[last] < viewBottom) last++;
+
+        this.firstVisible = first;
+        this.start = Math.max(0, first - AIDA_OVERSCAN);
+        this.end = Math.min(count, last + AIDA_OVERSCAN);
+
+        // Drop elements that left the window
+        const keep = new Set(this.messages.slice(this.start, this.end));
+        this.elements.forEach((element, message) => {
+            if (!keep.has(message)) {
+                this.release(element);
+                this.elements.delete(message);
+            }
+        });
+
+        // Insert or reorder the window, moving only what is out of place
+        let previous = null;
+        for (let i = this.start; i < this.end; i++) {
+            const message = this.messages[i];
+            let element = this.elements.get(message);
+            if (!element) {
+                element = this.createElement(message);
+                if (!this.animated.has(message)) {
+                    element.classList.add('aida-message-restored');
+                }
+                this.animated.delete(message);
+                this.adopt(message, element);
+            }
+            const expected = previous ? previous.nextSibling : this.list.firstChild;
+            if (expected !== element) {
+                this.list.insertBefore(element, expected);
+            }
+            previous = element;
+        }
+
+        this.list.style.paddingTop = `${offsets[this.start]}px`;
+        this.list.style.paddingBottom = `${offsets[count] - offsets[this.end]}px`;
+    }
+
+    adopt(message, element) {
+        this.elements.set(message, element);
+        this.elementMessages.set(element, message);
+        this.resizeObserver.observe(element);
+    }
+
+    release(element) {
+        this.resizeObserver.unobserve(element);
+        element.remove();
+    }
+
+    onResize(entries) {
+        let shift = 0;
+        entries.forEach(entry => {
+            const message = this.elementMessages.get(entry.target);
+            if (!message || !entry.target.isConnected) return;
+
+            const height = entry.target.offsetHeight;
+            const previous = this.heightOf(message);
+            if (height === previous) return;
+            this.heights.set(message, height);
+
+            // Messages above the viewport changing size would shift what is being read
+            if (this.messages.indexOf(message) < this.firstVisible) {
+                shift += height - previous;
+            }
+        });
+
+        if (shift && !this.stickToBottom) {
+            this.container.scrollTop += shift;
+        }
+        this.schedule();
+    }
+
+    onScroll() {
+        const container = this.container;
+        this.stickToBottom = container.scrollHeight - container.scrollTop - container.clientHeight < AIDA_STICK_THRESHOLD;
+        this.schedule();
+    }
+}
+
 class AidaChatWidget {
     constructor() {
         this.isOpen = false;
         this.sessionId = null;
+        this.sessionToken = null;
         this.userHash = null;
         this.chatHistory = [];
+        this.historyLoaded = false;
+        this.historyCursor = null;
+        this.loadingHistory = false;
         this.settings = this.loadSettings();
         this.widgetSettings = null;
+        this.streamingMessage = null;
+        this.streamHandler = null;
+        this.pendingChatJobs = new Map();
+        this.chatResults = new Map();
+        this.pendingSends = new Map();
+        this.healthPoll = null;
         
-        this.init();
+        this.ready = this.init();
     }
 
     async init() {
@@ -23,8 +256,10 @@ class AidaChatWidget {
         if (this.widgetSettings && this.widgetSettings.widget_enabled) {
             this.createWidget();
             this.bindEvents();
+            this.listenForChatResults();
+            this.listenForUpstreamHealth();
             this.generateUserHash();
-            this.loadChatHistory();
+            this.showUpstreamHealth({ status: frappe.boot?.aida_widget?.upstream_status });
             
             // Auto-open if configured
             if (this.widgetSettings.auto_open) {
@@ -98,31 +333,108 @@ class AidaChatWidget {
         localStorage.setItem('aida_widget_settings', JSON.stringify(this.settings));
     }
 
-    loadChatHistory() {
-        const saved = localStorage.getItem(`aida_chat_history_${this.userHash}`);
-        if (saved) {
-            this.chatHistory = JSON.parse(saved);
-            this.renderChatHistory();
+    useServerHistory() {
+        // Logged chat turns are the history; guests and unlogged sites keep a local copy
+        return Boolean(this.widgetSettings.conversation_logging) && frappe.session.user !== 'Guest';
+    }
+
+    async loadChatHistory() {
+        this.historyLoaded = true;
+        let messages = [];
+
+        if (this.useServerHistory()) {
+            try {
+                const page = await this.fetchHistoryPage();
+                messages = this.turnsToMessages(page.turns);
+                this.historyCursor = page.next_cursor;
+            } catch (error) {
+                console.warn('Failed to load chat history:', error);
+            }
+        } else {
+            const saved = localStorage.getItem(`aida_chat_history_${this.userHash}`);
+            if (saved) {
+                messages = JSON.parse(saved).slice(-AIDA_LOCAL_HISTORY_LIMIT);
+            }
+        }
+
+        if (messages.length) {
+            // Messages sent while the page was loading stay below it
+            this.chatHistory = messages.concat(this.chatHistory);
+            this.messageList.prepend(messages.filter(msg => msg.type !== 'error'));
+            this.messageList.scrollToBottom();
+        } else if (this.chatHistory.length === 0 && this.widgetSettings.welcome_message) {
+            this.addMessage('assistant', this.widgetSettings.welcome_message);
+        }
+    }
+
+    async loadOlderHistory() {
+        if (!this.historyCursor || this.loadingHistory) return;
+        this.loadingHistory = true;
+
+        try {
+            const page = await this.fetchHistoryPage(this.historyCursor);
+            const messages = this.turnsToMessages(page.turns);
+            this.historyCursor = page.next_cursor;
+            this.chatHistory = messages.concat(this.chatHistory);
+            this.messageList.prepend(messages.filter(msg => msg.type !== 'error'));
+        } catch (error) {
+            console.warn('Failed to load older chat history:', error);
+        } finally {
+            this.loadingHistory = false;
         }
     }
 
+    fetchHistoryPage(cursor = null) {
+        return new Promise((resolve, reject) => {
+            frappe.call({
+                method: 'aida_widget_integration.api.get_chat_history',
+                args: { cursor: cursor },
+                callback: (r) => resolve(r.message || { turns: [], next_cursor: null }),
+                error: reject
+            });
+        });
+    }
+
+    turnsToMessages(turns) {
+        // Turns arrive newest first; the widget shows them oldest first
+        const messages = [];
+        turns.slice().reverse().forEach(turn => {
+            const timestamp = frappe.datetime.str_to_obj(turn.timestamp).toISOString();
+            messages.push({ type: 'user', content: turn.message, timestamp: timestamp });
+            if (turn.status === 'Success' && turn.response) {
+                messages.push({ type: 'assistant', content: turn.response, timestamp: timestamp });
+            }
+        });
+        return messages;
+    }
+
     saveChatHistory() {
-        localStorage.setItem(`aida_chat_history_${this.userHash}`, JSON.stringify(this.chatHistory));
+        // Server-side history is written by the conversation log
+        if (this.useServerHistory()) return;
+
+        localStorage.setItem(
+            `aida_chat_history_${this.userHash}`,
+            JSON.stringify(this.chatHistory.slice(-AIDA_LOCAL_HISTORY_LIMIT))
+        );
     }
 
     createWidget() {
-        // Create floating button
-        this.floatingBtn = document.createElement('div');
-        this.floatingBtn.id = 'aida-floating-btn';
-        this.floatingBtn.className = this.getPositionClass();
-        this.floatingBtn.innerHTML = `
-            <svg width="24" height="24" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2ZM12 20C10.74 20 9.54 19.75 8.46 19.3L6 20L6.7 17.54C6.25 16.46 6 15.26 6 14C6 8.48 8.48 6 12 6C15.52 6 18 8.48 18 12C18 15.52 15.52 18 12 18Z" fill="white"/>
-                <circle cx="9" cy="12" r="1" fill="white"/>
-                <circle cx="12" cy="12" r="1" fill="white"/>
-                <circle cx="15" cy="12" r="1" fill="white"/>
-            </svg>
-        `;
+        // Create floating button, or take over the one drawn by the loader
+        this.floatingBtn = document.getElementById('aida-floating-btn');
+        if (!this.floatingBtn) {
+            this.floatingBtn = document.createElement('div');
+            this.floatingBtn.id = 'aida-floating-btn';
+            this.floatingBtn.className = this.getPositionClass();
+            this.floatingBtn.innerHTML = `
+                <svg width="24" height="24" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+                    <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2ZM12 20C10.74 20 9.54 19.75 8.46 19.3L6 20L6.7 17.54C6.25 16.46 6 15.26 6 14C6 8.48 8.48 6 12 6C15.52 6 18 8.48 18 12C18 15.52 15.52 18 12 18Z" fill="white"/>
+                    <circle cx="9" cy="12" r="1" fill="white"/>
+                    <circle cx="12" cy="12" r="1" fill="white"/>
+                    <circle cx="15" cy="12" r="1" fill="white"/>
+                </svg>
+            `;
+            document.body.appendChild(this.floatingBtn);
+        }
 
         // Create widget container
         this.widget = document.createElement('div');
@@ -154,6 +466,9 @@ class AidaChatWidget {
             </div>
             <div class="aida-widget-content">
                 <div id="aida-chat-container" class="aida-chat-container">
+                    <div id="aida-upstream-banner" class="aida-upstream-banner" style="display: none;">
+                        AIDA is currently unavailable. Messages can't be answered until it is back.
+                    </div>
                     <div id="aida-chat-messages" class="aida-chat-messages"></div>
                     <div class="aida-chat-input-container">
                         <div class="aida-input-wrapper">
@@ -180,6 +495,13 @@ class AidaChatWidget {
                         <label for="aida-password">Password:</label>
                         <input type="password" id="aida-password" value="${this.settings.password}">
                     </div>
+                    ${frappe.session.user !== 'Guest' ? `
+                    <div class="aida-form-group">
+                        <label class="aida-checkbox-label">
+                            <input type="checkbox" id="aida-remember-credentials" ${this.hasServerSession() ? 'checked' : ''}>
+                            Store my credentials on this site, so AIDA connects when I log in
+                        </label>
+                    </div>` : ''}
                     <div class="aida-form-group">
                         <label for="aida-api-url">API Server URL:</label>
                         <input type="text" id="aida-api-url" value="${this.widgetSettings.api_server_url}" readonly>
@@ -201,15 +523,79 @@ class AidaChatWidget {
         `;
 
         // Append to body
-        document.body.appendChild(this.floatingBtn);
         document.body.appendChild(this.widget);
-        
-        // Add welcome message if chat history is empty
-        if (this.chatHistory.length === 0 && this.widgetSettings.welcome_message) {
-            setTimeout(() => {
-                this.addMessage('assistant', this.widgetSettings.welcome_message);
-            }, 500);
+
+        this.avatarTemplates = this.createAvatarTemplates();
+        this.messageList = new AidaMessageList(
+            document.getElementById('aida-chat-messages'),
+            msg => this.createMessageElement(msg.type, msg.content, new Date(msg.timestamp))
+        );
+    }
+
+    createAvatarTemplates() {
+        // Parsed once; every message clones these instead of re-parsing SVG markup
+        const avatars = {
+            user: `
+                <div class="aida-message-avatar">
+                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+                        <path d="M12 12C14.21 12 16 10.21 16 8C16 5.79 14.21 4 12 4C9.79 4 8 5.79 8 8C8 10.21 9.79 12 12 12ZM12 14C9.33 14 4 15.34 4 18V20H20V18C20 15.34 14.67 14 12 14Z" fill="currentColor"/>
+                    </svg>
+                </div>`,
+            assistant: `
+                <div class="aida-message-avatar">
+                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+                        <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2Z" fill="#4F46E5"/>
+                        <circle cx="9" cy="12" r="1" fill="white"/>
+                        <circle cx="12" cy="12" r="1" fill="white"/>
+                        <circle cx="15" cy="12" r="1" fill="white"/>
+                    </svg>
+                </div>`,
+            error: `
+                <div class="aida-message-avatar aida-error-avatar">
+                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+                        <path d="M12 2C6.48 2 2 6.48 2 12C2 17.52 6.48 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2ZM13 17H11V15H13V17ZM13 13H11V7H13V13Z" fill="#EF4444"/>
+                    </svg>
+                </div>`
+        };
+
+        const templates = {};
+        Object.keys(avatars).forEach(type => {
+            templates[type] = document.createElement('template');
+            templates[type].innerHTML = avatars[type].trim();
+        });
+        return templates;
+    }
+
+    cloneAvatar(type) {
+        return this.avatarTemplates[type].content.firstElementChild.cloneNode(true);
+    }
+
+    createMessageElement(type, content, timestamp) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `aida-message aida-message-${type}`;
+
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'aida-message-content';
+
+        const textDiv = document.createElement('div');
+        textDiv.className = type === 'error' ? 'aida-message-text aida-error-text' : 'aida-message-text';
+        if (type === 'assistant') {
+            textDiv.innerHTML = this.formatMessage(content);
+        } else {
+            textDiv.textContent = content;
+        }
+
+        const timeDiv = document.createElement('div');
+        timeDiv.className = 'aida-message-time';
+        timeDiv.textContent = timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+
+        contentDiv.append(textDiv, timeDiv);
+        if (type === 'user') {
+            messageDiv.append(contentDiv, this.cloneAvatar(type));
+        } else {
+            messageDiv.append(this.cloneAvatar(type), contentDiv);
         }
+        return messageDiv;
     }
 
     getPositionClass() {
@@ -251,6 +637,14 @@ class AidaChatWidget {
 
         // Auto-resize textarea
         input.addEventListener('input', () => this.autoResizeTextarea(input));
+
+        // Fetch older history when scrolled to the top
+        const messagesContainer = document.getElementById('aida-chat-messages');
+        messagesContainer.addEventListener('scroll', () => {
+            if (messagesContainer.scrollTop < AIDA_HISTORY_SCROLL_THRESHOLD) {
+                this.loadOlderHistory();
+            }
+        }, { passive: true });
         
         // Mobile keyboard handling removed to prevent positioning issues
 
@@ -293,6 +687,14 @@ class AidaChatWidget {
         this.isOpen = true;
         this.widget.classList.add('aida-widget-open');
         this.floatingBtn.style.display = 'none';
+
+        // History is fetched on first open, not on every page load
+        if (!this.historyLoaded) {
+            this.loadChatHistory();
+        }
+
+        this.refreshUpstreamHealth();
+        this.healthPoll = setInterval(() => this.refreshUpstreamHealth(), AIDA_HEALTH_POLL_INTERVAL);
         
         // Focus on input
         setTimeout(() => {
@@ -304,6 +706,8 @@ class AidaChatWidget {
         this.isOpen = false;
         this.widget.classList.remove('aida-widget-open');
         this.floatingBtn.style.display = 'flex';
+        clearInterval(this.healthPoll);
+        this.healthPoll = null;
         
         // Hide settings if open
         document.getElementById('aida-settings-panel').style.display = 'none';
@@ -338,8 +742,9 @@ class AidaChatWidget {
         
         if (!message) return;
 
-        // Check if credentials are configured
-        if (!this.settings.username || !this.settings.password || !this.settings.erpUrl) {
+        // Check if credentials are configured, here or on the server
+        const serverSession = this.hasServerSession();
+        if (!serverSession && (!this.settings.username || !this.settings.password || !this.settings.erpUrl)) {
             this.addMessage('error', 'Please configure your Mocxha settings to use AIDA. Click the settings icon to get started.');
             return;
         }
@@ -353,20 +758,76 @@ class AidaChatWidget {
         this.showTypingIndicator();
 
         try {
-            // Initialize session if not already done
-            if (!this.sessionId) {
+            // Initialize session if not already done; the server opens it for users with stored credentials
+            if (!this.sessionId && !serverSession) {
                 await this.initializeSession();
             }
             
-            const response = await this.callAidaAPI(message);
+            let response;
+            try {
+                response = await this.callAidaAPI(message, this.getIdempotencyKey(message));
+            } catch (error) {
+                if (!error.tokenExpired) throw error;
+
+                // The session token lapsed: open a new session and send once more
+                this.forgetSession();
+                await this.initializeSession();
+                response = await this.callAidaAPI(message, this.getIdempotencyKey(message));
+            }
             this.hideTypingIndicator();
-            this.addMessage('assistant', response);
+            if (this.streamingMessage) {
+                this.finishStreamingMessage(response);
+            } else {
+                this.addMessage('assistant', response);
+            }
         } catch (error) {
             this.hideTypingIndicator();
-            this.addMessage('error', 'Sorry, I encountered an error. Please try again.');
+            this.discardStreamingMessage();
+            if (error.unavailable) {
+                this.showUpstreamHealth({ status: 'down' });
+                this.addMessage('error', error.message);
+            } else if (error.retryAfter) {
+                // Rate limited or busy: the server's message says when to try again
+                this.addMessage('error', error.message);
+            } else {
+                this.addMessage('error', 'Sorry, I encountered an error. Please try again.');
+            }
             console.error('AIDA API Error:', error);
+        } finally {
+            this.pendingSends.delete(message);
         }
     }
+
+    hasServerSession() {
+        return Boolean(frappe.boot?.aida_widget?.server_session);
+    }
+
+    resetServerSession() {
+        if (!this.hasServerSession()) return;
+
+        frappe.call({
+            method: 'aida_widget_integration.api.reset_user_session',
+            type: 'POST'
+        });
+    }
+
+    forgetSession() {
+        this.sessionId = null;
+        this.sessionToken = null;
+
+        if (this.userHash) {
+            localStorage.removeItem(`aida_session_id_${this.userHash}`);
+            localStorage.removeItem(`aida_session_token_${this.userHash}`);
+        }
+    }
+
+    getIdempotencyKey(message) {
+        // Repeated sends of a message still in flight share its key, so the server makes one upstream call
+        if (!this.pendingSends.has(message)) {
+            this.pendingSends.set(message, `${this.userHash}-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`);
+        }
+        return this.pendingSends.get(message);
+    }
     
     async initializeSession() {
         if (!this.settings.username || !this.settings.password) {
@@ -375,17 +836,19 @@ class AidaChatWidget {
         
         // Try to restore existing session first
         const savedSessionId = localStorage.getItem(`aida_session_id_${this.userHash}`);
-        if (savedSessionId) {
+        const savedSessionToken = localStorage.getItem(`aida_session_token_${this.userHash}`);
+        if (savedSessionId && savedSessionToken) {
             try {
                 const isValid = await this.checkSessionStatus(savedSessionId);
                 if (isValid) {
                     this.sessionId = savedSessionId;
+                    this.sessionToken = savedSessionToken;
                     console.log('Session restored:', this.sessionId);
                     return;
                 }
             } catch (error) {
                 console.log('Failed to restore session, creating new one:', error);
-                localStorage.removeItem(`aida_session_id_${this.userHash}`);
+                this.forgetSession();
             }
         }
         
@@ -404,7 +867,10 @@ class AidaChatWidget {
                         if (r.message && !r.message.error) {
                             resolve(r.message);
                         } else {
-                            reject(new Error(r.message?.message || 'Session initialization failed'));
+                            const error = new Error(r.message?.message || 'Session initialization failed');
+                            error.unavailable = Boolean(r.message?.unavailable);
+                            error.retryAfter = r.message?.retry_after || null;
+                            reject(error);
                         }
                     },
                     error: reject
@@ -412,8 +878,11 @@ class AidaChatWidget {
             });
             
             this.sessionId = response.session_id;
+            // Chat turns send this token instead of the credentials
+            this.sessionToken = response.session_token;
             // Save session ID for future restoration
             localStorage.setItem(`aida_session_id_${this.userHash}`, this.sessionId);
+            localStorage.setItem(`aida_session_token_${this.userHash}`, this.sessionToken);
             console.log('New session initialized:', this.sessionId);
         } catch (error) {
             console.error('Session initialization failed:', error);
@@ -447,133 +916,260 @@ class AidaChatWidget {
         }
     }
 
-    async callAidaAPI(message) {
+    async callAidaAPI(message, idempotencyKey = null) {
         const payload = {
             message: message,
+            idempotency_key: idempotencyKey,
             session_id: this.sessionId,
             user_hash: this.userHash,
-            erp_credentials: JSON.stringify({
+            // The server forwards the AIDA reply as it came instead of decoding and encoding it again
+            passthrough: 1
+        };
+
+        if (this.sessionToken) {
+            payload.session_token = this.sessionToken;
+        } else if (!this.hasServerSession()) {
+            payload.erp_credentials = JSON.stringify({
                 url: this.settings.erpUrl,
                 username: this.settings.username,
                 password: this.settings.password
-            })
-        };
+            });
+        }
 
-        // Use Frappe's API call method
-        return new Promise((resolve, reject) => {
-            frappe.call({
-                method: 'aida_widget_integration.api.chat_with_aida',
-                args: payload,
-                callback: (response) => {
-                    if (response.message) {
-                        if (response.message.error) {
-                            reject(new Error(response.message.message || 'API Error'));
+        // Ask the server to relay partial output over realtime while the answer is generated
+        if (this.widgetSettings.enable_streaming && frappe.realtime) {
+            payload.stream_id = `${this.userHash}-${Date.now().toString(36)}`;
+            this.listenForStream(payload.stream_id);
+        }
+
+        try {
+            // Use Frappe's API call method
+            const result = await new Promise((resolve, reject) => {
+                frappe.call({
+                    method: 'aida_widget_integration.api.chat_with_aida',
+                    args: payload,
+                    callback: (response) => {
+                        if (response.message) {
+                            resolve(response.message);
                         } else {
-                            // Update session ID if provided
-                            if (response.message.session_id) {
-                                this.sessionId = response.message.session_id;
-                            }
-                            resolve(response.message.response || response.message.message || 'No response received');
+                            reject(new Error('No response received'));
                         }
-                    } else {
-                        reject(new Error('No response received'));
+                    },
+                    error: (error) => {
+                        reject(error);
                     }
-                },
-                error: (error) => {
-                    reject(error);
-                }
+                });
             });
+
+            // Background chat: the server only queued the request, the reply follows over realtime
+            const reply = result.queued ? await this.waitForChatResult(result.job_id) : result;
+
+            if (reply.error) {
+                const error = new Error(reply.message || 'API Error');
+                error.unavailable = Boolean(reply.unavailable);
+                error.retryAfter = reply.retry_after || null;
+                error.tokenExpired = Boolean(reply.token_expired);
+                throw error;
+            }
+
+            // Update session ID if provided
+            if (reply.session_id) {
+                this.sessionId = reply.session_id;
+            }
+            return reply.response || reply.message || 'No response received';
+        } finally {
+            this.stopListeningForStream();
+        }
+    }
+
+    listenForChatResults() {
+        if (!frappe.realtime) return;
+
+        frappe.realtime.on('aida_chat_result', (data) => {
+            if (!data || !data.job_id) return;
+
+            const finish = this.pendingChatJobs.get(data.job_id);
+            if (finish) {
+                finish(data.result);
+            } else {
+                // The event can beat the enqueue response; keep it briefly for waitForChatResult
+                this.chatResults.set(data.job_id, data.result);
+                setTimeout(() => this.chatResults.delete(data.job_id), 60000);
+            }
         });
     }
 
-    addMessage(type, content) {
-        const messagesContainer = document.getElementById('aida-chat-messages');
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `aida-message aida-message-${type}`;
-        
-        const timestamp = new Date().toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-        
-        if (type === 'user') {
-            messageDiv.innerHTML = `
-                <div class="aida-message-content">
-                    <div class="aida-message-text">${this.escapeHtml(content)}</div>
-                    <div class="aida-message-time">${timestamp}</div>
-                </div>
-                <div class="aida-message-avatar">
-                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M12 12C14.21 12 16 10.21 16 8C16 5.79 14.21 4 12 4C9.79 4 8 5.79 8 8C8 10.21 9.79 12 12 12ZM12 14C9.33 14 4 15.34 4 18V20H20V18C20 15.34 14.67 14 12 14Z" fill="currentColor"/>
-                    </svg>
-                </div>
-            `;
-        } else if (type === 'assistant') {
-            messageDiv.innerHTML = `
-                <div class="aida-message-avatar">
-                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2Z" fill="#4F46E5"/>
-                        <circle cx="9" cy="12" r="1" fill="white"/>
-                        <circle cx="12" cy="12" r="1" fill="white"/>
-                        <circle cx="15" cy="12" r="1" fill="white"/>
-                    </svg>
-                </div>
-                <div class="aida-message-content">
-                    <div class="aida-message-text">${this.formatMessage(content)}</div>
-                    <div class="aida-message-time">${timestamp}</div>
-                </div>
-            `;
-        } else if (type === 'error') {
-            messageDiv.innerHTML = `
-                <div class="aida-message-avatar aida-error-avatar">
-                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M12 2C6.48 2 2 6.48 2 12C2 17.52 6.48 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2ZM13 17H11V15H13V17ZM13 13H11V7H13V13Z" fill="#EF4444"/>
-                    </svg>
-                </div>
-                <div class="aida-message-content">
-                    <div class="aida-message-text aida-error-text">${this.escapeHtml(content)}</div>
-                    <div class="aida-message-time">${timestamp}</div>
-                </div>
-            `;
+    listenForUpstreamHealth() {
+        if (!frappe.realtime) return;
+
+        // Broadcast by the health probe whenever the upstream status changes
+        frappe.realtime.on('aida_upstream_health', (data) => this.showUpstreamHealth(data));
+    }
+
+    refreshUpstreamHealth() {
+        // Served from the server's cached probe result; never waits on the AIDA server itself
+        frappe.call({
+            method: 'aida_widget_integration.api.get_upstream_health',
+            callback: (r) => {
+                if (r.message) {
+                    this.showUpstreamHealth(r.message);
+                }
+            }
+        });
+    }
+
+    showUpstreamHealth(health) {
+        this.upstreamStatus = health?.status || 'unknown';
+        const banner = document.getElementById('aida-upstream-banner');
+        if (banner) {
+            banner.style.display = this.upstreamStatus === 'down' ? 'block' : 'none';
         }
+    }
 
-        messagesContainer.appendChild(messageDiv);
-        
-        // Enhanced auto-scroll with forced scrolling
-        this.forceScrollToBottom();
+    waitForChatResult(jobId) {
+        if (this.chatResults.has(jobId)) {
+            const result = this.chatResults.get(jobId);
+            this.chatResults.delete(jobId);
+            return Promise.resolve(result);
+        }
 
-        // Save to history
-        this.chatHistory.push({
+        return new Promise((resolve, reject) => {
+            const timeoutMs = ((this.widgetSettings.connection_timeout || 30) + 60) * 1000;
+            const startedAt = Date.now();
+            let poll = null;
+
+            const finish = (result) => {
+                clearInterval(poll);
+                this.pendingChatJobs.delete(jobId);
+                resolve(result);
+            };
+            this.pendingChatJobs.set(jobId, finish);
+
+            // Poll as a fallback in case the realtime event is missed
+            poll = setInterval(() => {
+                if (Date.now() - startedAt > timeoutMs) {
+                    clearInterval(poll);
+                    this.pendingChatJobs.delete(jobId);
+                    reject(new Error('Timed out waiting for AIDA response'));
+                    return;
+                }
+
+                frappe.call({
+                    method: 'aida_widget_integration.api.get_chat_result',
+                    args: { job_id: jobId },
+                    callback: (r) => {
+                        if (r.message && !r.message.pending && this.pendingChatJobs.has(jobId)) {
+                            finish(r.message);
+                        }
+                    }
+                });
+            }, 5000);
+        });
+    }
+
+    listenForStream(streamId) {
+        this.stopListeningForStream();
+        this.streamHandler = (data) => {
+            if (data && data.stream_id === streamId && data.delta) {
+                this.appendStreamDelta(data.delta);
+            }
+        };
+        frappe.realtime.on('aida_chat_stream', this.streamHandler);
+    }
+
+    stopListeningForStream() {
+        if (this.streamHandler) {
+            frappe.realtime.off('aida_chat_stream', this.streamHandler);
+            this.streamHandler = null;
+        }
+    }
+
+    appendStreamDelta(delta) {
+        if (!this.streamingMessage) {
+            // First token: swap the typing indicator for a live assistant message
+            this.hideTypingIndicator();
+            const messageDiv = this.createMessageElement('assistant', '', new Date());
+            this.messageList.footer.appendChild(messageDiv);
+            this.streamingMessage = {
+                element: messageDiv,
+                textElement: messageDiv.querySelector('.aida-message-text'),
+                content: '',
+                renderScheduled: false
+            };
+        }
+
+        const streaming = this.streamingMessage;
+        streaming.content += delta;
+
+        // Re-render at most once per frame however fast tokens arrive
+        if (!streaming.renderScheduled) {
+            streaming.renderScheduled = true;
+            requestAnimationFrame(() => {
+                streaming.renderScheduled = false;
+                if (this.streamingMessage !== streaming) return;
+                streaming.textElement.innerHTML = this.formatMessage(streaming.content);
+            });
+        }
+    }
+
+    finishStreamingMessage(content) {
+        const streaming = this.streamingMessage;
+        this.streamingMessage = null;
+
+        streaming.textElement.innerHTML = this.formatMessage(content);
+
+        const message = {
+            type: 'assistant',
+            content: content,
+            timestamp: new Date().toISOString()
+        };
+        this.chatHistory.push(message);
+        this.saveChatHistory();
+
+        // The rendered element moves into the list as is
+        this.messageList.append(message, streaming.element);
+    }
+
+    discardStreamingMessage() {
+        if (this.streamingMessage) {
+            this.streamingMessage.element.remove();
+            this.streamingMessage = null;
+        }
+    }
+
+    addMessage(type, content) {
+        const message = {
             type: type,
             content: content,
             timestamp: new Date().toISOString()
-        });
+        };
+
+        this.messageList.append(message);
+        this.messageList.scrollToBottom();
+
+        // Save to history
+        this.chatHistory.push(message);
         this.saveChatHistory();
     }
 
     showTypingIndicator() {
-        const messagesContainer = document.getElementById('aida-chat-messages');
         const typingDiv = document.createElement('div');
         typingDiv.id = 'aida-typing-indicator';
         typingDiv.className = 'aida-message aida-message-assistant';
-        typingDiv.innerHTML = `
-            <div class="aida-message-avatar">
-                <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                    <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2Z" fill="#4F46E5"/>
-                    <circle cx="9" cy="12" r="1" fill="white"/>
-                    <circle cx="12" cy="12" r="1" fill="white"/>
-                    <circle cx="15" cy="12" r="1" fill="white"/>
-                </svg>
-            </div>
-            <div class="aida-message-content">
-                <div class="aida-typing-dots">
-                    <span></span>
-                    <span></span>
-                    <span></span>
-                </div>
+
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'aida-message-content';
+        contentDiv.innerHTML = `
+            <div class="aida-typing-dots">
+                <span></span>
+                <span></span>
+                <span></span>
             </div>
         `;
-        messagesContainer.appendChild(typingDiv);
-        
-        // Enhanced auto-scroll with forced scrolling
-        this.forceScrollToBottom();
+
+        typingDiv.append(this.cloneAvatar('assistant'), contentDiv);
+        this.messageList.footer.appendChild(typingDiv);
+        this.messageList.scrollToBottom();
     }
 
     hideTypingIndicator() {
@@ -583,93 +1179,6 @@ class AidaChatWidget {
         }
     }
 
-    forceScrollToBottom() {
-        const messagesContainer = document.getElementById('aida-chat-messages');
-        if (!messagesContainer) return;
-        
-        // Force container to be scrollable
-        messagesContainer.style.overflowY = 'auto';
-        messagesContainer.style.scrollBehavior = 'auto'; // Disable smooth for immediate effect
-        
-        // Multiple scroll attempts with increasing delays
-        const scrollToBottom = () => {
-            messagesContainer.scrollTop = messagesContainer.scrollHeight;
-        };
-        
-        // Immediate scroll
-        scrollToBottom();
-        
-        // Use requestAnimationFrame for better timing
-        requestAnimationFrame(() => {
-            scrollToBottom();
-            
-            // Additional delayed attempts
-            setTimeout(scrollToBottom, 10);
-            setTimeout(scrollToBottom, 50);
-            setTimeout(scrollToBottom, 100);
-            
-            // Re-enable smooth scrolling after forced scroll
-            setTimeout(() => {
-                messagesContainer.style.scrollBehavior = 'smooth';
-            }, 150);
-        });
-    }
-
-    renderChatHistory() {
-        const messagesContainer = document.getElementById('aida-chat-messages');
-        messagesContainer.innerHTML = '';
-        
-        this.chatHistory.forEach(msg => {
-            if (msg.type !== 'error') {
-                this.addMessageToDOM(msg.type, msg.content, new Date(msg.timestamp));
-            }
-        });
-        
-        // Scroll to bottom after rendering history
-        setTimeout(() => {
-            this.forceScrollToBottom();
-        }, 100);
-    }
-
-    addMessageToDOM(type, content, timestamp) {
-        const messagesContainer = document.getElementById('aida-chat-messages');
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `aida-message aida-message-${type}`;
-        
-        const timeString = timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-        
-        if (type === 'user') {
-            messageDiv.innerHTML = `
-                <div class="aida-message-content">
-                    <div class="aida-message-text">${this.escapeHtml(content)}</div>
-                    <div class="aida-message-time">${timeString}</div>
-                </div>
-                <div class="aida-message-avatar">
-                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M12 12C14.21 12 16 10.21 16 8C16 5.79 14.21 4 12 4C9.79 4 8 5.79 8 8C8 10.21 9.79 12 12 12ZM12 14C9.33 14 4 15.34 4 18V20H20V18C20 15.34 14.67 14 12 14Z" fill="currentColor"/>
-                    </svg>
-                </div>
-            `;
-        } else {
-            messageDiv.innerHTML = `
-                <div class="aida-message-avatar">
-                    <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M12 2C6.48 2 2 6.48 2 12C2 13.54 2.36 14.99 3.01 16.28L2 22L7.72 20.99C9.01 21.64 10.46 22 12 22C17.52 22 22 17.52 22 12C22 6.48 17.52 2 12 2Z" fill="#4F46E5"/>
-                        <circle cx="9" cy="12" r="1" fill="white"/>
-                        <circle cx="12" cy="12" r="1" fill="white"/>
-                        <circle cx="15" cy="12" r="1" fill="white"/>
-                    </svg>
-                </div>
-                <div class="aida-message-content">
-                    <div class="aida-message-text">${this.formatMessage(content)}</div>
-                    <div class="aida-message-time">${timeString}</div>
-                </div>
-            `;
-        }
-
-        messagesContainer.appendChild(messageDiv);
-    }
-
     formatMessage(content) {
         // Enhanced formatting that preserves HTML buttons while adding markdown support
         let formatted = content;
@@ -773,6 +1282,37 @@ class AidaChatWidget {
         this.settings.username = document.getElementById('aida-username').value;
         this.settings.password = document.getElementById('aida-password').value;
         this.saveSettings();
+
+        // Stored on the server only when the user asks for it, so the AIDA session can be opened at login
+        const remember = document.getElementById('aida-remember-credentials');
+        if (remember && remember.checked && this.settings.password) {
+            frappe.call({
+                method: 'aida_widget_integration.api.save_user_credentials',
+                type: 'POST',
+                args: {
+                    username: this.settings.username,
+                    password: this.settings.password,
+                    erpnext_url: this.settings.erpUrl,
+                    // Sessions opened at login must use the hash this widget sends with chats
+                    user_hash: this.userHash
+                },
+                callback: (r) => {
+                    if (r.message && r.message.success && frappe.boot.aida_widget) {
+                        frappe.boot.aida_widget.server_session = 1;
+                    }
+                }
+            });
+        } else if (remember && !remember.checked && this.hasServerSession()) {
+            frappe.call({
+                method: 'aida_widget_integration.api.forget_user_credentials',
+                type: 'POST',
+                callback: (r) => {
+                    if (r.message && r.message.success) {
+                        frappe.boot.aida_widget.server_session = 0;
+                    }
+                }
+            });
+        }
         
         // Show success message
         frappe.show_alert({
@@ -785,9 +1325,13 @@ class AidaChatWidget {
         frappe.confirm(
             'Are you sure you want to clear all chat history?',
             () => {
+                if (this.useServerHistory()) {
+                    frappe.call({ method: 'aida_widget_integration.api.clear_chat_history' });
+                }
                 this.chatHistory = [];
+                this.historyCursor = null;
                 this.saveChatHistory();
-                document.getElementById('aida-chat-messages').innerHTML = '';
+                this.messageList.clear();
                 
                 frappe.show_alert({
                     message: 'Chat history cleared!',
@@ -801,13 +1345,9 @@ class AidaChatWidget {
         frappe.confirm(
             'Are you sure you want to disconnect the current session? This will create a new session when you send your next message.',
             () => {
-                // Clear current session ID
-                this.sessionId = null;
-                
-                // Remove saved session from localStorage
-                if (this.userHash) {
-                    localStorage.removeItem(`aida_session_id_${this.userHash}`);
-                }
+                // Clear current session ID and token, here and in localStorage
+                this.forgetSession();
+                this.resetServerSession();
                 
                 frappe.show_alert({
                     message: 'Session disconnected! A new session will be created when you send your next message.',
@@ -819,58 +1359,6 @@ class AidaChatWidget {
         );
     }
     
-    async testConnection() {
-        const statusDiv = document.getElementById('aida-connection-status');
-        const testBtn = document.getElementById('aida-test-connection');
-        
-        // Show loading state
-        testBtn.disabled = true;
-        testBtn.textContent = 'Testing...';
-        statusDiv.innerHTML = '<span class="aida-status-loading">Testing connection...</span>';
-        
-        try {
-            const response = await new Promise((resolve, reject) => {
-                 frappe.call({
-                     method: 'aida_widget_integration.api.test_connection',
-                     args: {
-                         api_server_url: this.widgetSettings.api_server_url
-                     },
-                    callback: (r) => {
-                        if (r.message) {
-                            resolve(r.message);
-                        } else {
-                            reject(new Error('No response received'));
-                        }
-                    },
-                    error: reject
-                });
-            });
-            
-            if (response.success) {
-                statusDiv.innerHTML = '<span class="aida-status-success">✓ Connection successful</span>';
-            } else {
-                statusDiv.innerHTML = `<span class="aida-status-error">✗ Connection failed: ${response.message}</span>`;
-            }
-        } catch (error) {
-            statusDiv.innerHTML = `<span class="aida-status-error">✗ Connection failed: ${error.message}</span>`;
-        } finally {
-            testBtn.disabled = false;
-            testBtn.textContent = 'Test Connection';
-        }
-    }
-
-    disconnectSession() {
-        // Remove sessionId from memory and localStorage
-        this.sessionId = null;
-        if (this.userHash) {
-            localStorage.removeItem(`aida_session_id_${this.userHash}`);
-        }
-        frappe.show_alert({
-            message: 'Disconnected from backend. A new session will be created on next message.',
-            indicator: 'orange'
-        });
-    }
-    
     async connectSession() {
         const statusDiv = document.getElementById('aida-session-status');
         const connectBtn = document.getElementById('aida-connect-session');
@@ -930,13 +1418,9 @@ class AidaChatWidget {
         statusDiv.innerHTML = '<span class="aida-status-loading">Disconnecting session...</span>';
         
         try {
-            // Clear current session ID
-            this.sessionId = null;
-            
-            // Remove saved session from localStorage
-            if (this.userHash) {
-                localStorage.removeItem(`aida_session_id_${this.userHash}`);
-            }
+            // Clear current session ID and token, here and in localStorage
+            this.forgetSession();
+            this.resetServerSession();
             
             statusDiv.innerHTML = '<span class="aida-status-info">Disconnected</span>';
             
@@ -959,6 +1443,46 @@ class AidaChatWidget {
             disconnectBtn.textContent = 'Disconnect';
         }
     }
+    
+    async testConnection() {
+        const statusDiv = document.getElementById('aida-connection-status');
+        const testBtn = document.getElementById('aida-test-connection');
+        
+        // Show loading state
+        testBtn.disabled = true;
+        testBtn.textContent = 'Testing...';
+        statusDiv.innerHTML = '<span class="aida-status-loading">Testing connection...</span>';
+        
+        try {
+            const response = await new Promise((resolve, reject) => {
+                 frappe.call({
+                     method: 'aida_widget_integration.api.test_connection',
+                     args: {
+                         api_server_url: this.widgetSettings.api_server_url
+                     },
+                    callback: (r) => {
+                        if (r.message) {
+                            resolve(r.message);
+                        } else {
+                            reject(new Error('No response received'));
+                        }
+                    },
+                    error: reject
+                });
+            });
+            
+            if (response.success) {
+                statusDiv.innerHTML = '<span class="aida-status-success">✓ Connection successful</span>';
+            } else {
+                statusDiv.innerHTML = `<span class="aida-status-error">✗ Connection failed: ${response.message}</span>`;
+            }
+        } catch (error) {
+            statusDiv.innerHTML = `<span class="aida-status-error">✗ Connection failed: ${error.message}</span>`;
+        } finally {
+            testBtn.disabled = false;
+            testBtn.textContent = 'Test Connection';
+        }
+    }
 }
 
 // Initialize widget when DOM is ready
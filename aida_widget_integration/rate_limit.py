@@ -0,0 +1,99 @@
+import math
+import time
+
+import frappe
+from frappe.utils import cint
+
+from aida_widget_integration.settings import get_settings
+
+BUCKET_KEY = 'aida_rate_limit:{}'
+
+# Take ``cost`` tokens from every bucket, or from none if any is short.
+# KEYS are the buckets; ARGV is now, cost, then a refill rate (tokens per
+# second) and capacity per bucket. Returns the seconds to wait, 0 if allowed.
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local tokens = {}
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + 2 * i])
+    local capacity = tonumber(ARGV[2 + 2 * i])
+    local bucket = redis.call('hmget', key, 'tokens', 'updated')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(capacity, available + elapsed * rate)
+    tokens[i] = available
+
+    local needed = math.min(cost, capacity)
+    if available < needed then
+        wait = math.max(wait, (needed - available) / rate)
+    end
+end
+
+if wait > 0 then
+    return tostring(wait)
+end
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + 2 * i])
+    local capacity = tonumber(ARGV[2 + 2 * i])
+    redis.call('hset', key, 'tokens', tostring(tokens[i] - math.min(cost, capacity)), 'updated', tostring(now))
+    redis.call('expire', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+
+def get_buckets():
+    """
+    Get ``(key, messages per minute)`` of every bucket a chat request from the current user draws on
+
+    Signed in users are limited per user, guests per IP address, and the
+    site as a whole has a limit of its own. A limit of 0 means unlimited.
+    """
+    settings = get_settings()
+    user = frappe.session.user
+
+    if user == 'Guest':
+        ip = getattr(frappe.local, 'request_ip', None) or 'unknown'
+        buckets = [(f"ip:{ip}", cint(settings.guest_rate_limit))]
+    else:
+        buckets = [(f"user:{user}", cint(settings.user_rate_limit))]
+    buckets.append(('site', cint(settings.site_rate_limit)))
+
+    return [(BUCKET_KEY.format(name), limit) for name, limit in buckets if limit > 0]
+
+
+def check(cost=1):
+    """
+    Take ``cost`` messages from the current user's rate limits
+
+    Returns None when allowed, or an error dict with ``retry_after`` in
+    seconds when over a limit. Buckets refill continuously and each holds a
+    minute's worth of messages, which is also the largest burst allowed.
+    """
+    if not get_settings().rate_limit_enabled:
+        return None
+
+    buckets = get_buckets()
+    if not buckets:
+        return None
+
+    cache = frappe.cache()
+    args = [time.time(), cost]
+    for _, limit in buckets:
+        args.extend([limit / 60, limit])
+
+    wait = float(cache.eval(TAKE_SCRIPT, len(buckets), *[cache.make_key(key) for key, _ in buckets], *args))
+    if not wait:
+        return None
+
+    retry_after = max(math.ceil(wait), 1)
+    return {
+        'error': True,
+        'rate_limited': True,
+        'retry_after': retry_after,
+        'message': f'Too many messages. Please wait {retry_after} seconds and try again.'
+    }
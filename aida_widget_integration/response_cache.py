@@ -0,0 +1,161 @@
+import hashlib
+import time
+
+import frappe
+from frappe.utils import cint
+
+from aida_widget_integration import codec
+from aida_widget_integration.coalesce import normalize_message
+from aida_widget_integration.settings import get_settings
+from aida_widget_integration.utils import hgetall
+
+ENTRY_KEY = 'aida_response_cache:entry:'
+LRU_KEY = 'aida_response_cache:lru'
+SIZES_KEY = 'aida_response_cache:sizes'
+HITS_KEY = 'aida_response_cache:hits'
+BYTES_KEY = 'aida_response_cache:bytes'
+
+# Store an entry, then evict least recently used entries until both caps hold
+SET_SCRIPT = """
+local old_size = redis.call('hget', KEYS[2], ARGV[1])
+if old_size then
+    redis.call('decrby', KEYS[4], old_size)
+end
+redis.call('set', KEYS[5], ARGV[2], 'EX', ARGV[3])
+redis.call('zadd', KEYS[1], ARGV[4], ARGV[1])
+redis.call('hset', KEYS[2], ARGV[1], string.len(ARGV[2]))
+local total = redis.call('incrby', KEYS[4], string.len(ARGV[2]))
+local evicted = 0
+while redis.call('zcard', KEYS[1]) > tonumber(ARGV[5]) or total > tonumber(ARGV[6]) do
+    local oldest = redis.call('zpopmin', KEYS[1])
+    if #oldest == 0 then
+        break
+    end
+    local size = redis.call('hget', KEYS[2], oldest[1])
+    if size then
+        total = redis.call('decrby', KEYS[4], size)
+    end
+    redis.call('hdel', KEYS[2], oldest[1])
+    redis.call('hdel', KEYS[3], oldest[1])
+    redis.call('del', ARGV[7] .. oldest[1])
+    evicted = evicted + 1
+end
+return evicted
+"""
+
+# Forget the bookkeeping of an entry whose value expired
+REMOVE_SCRIPT = """
+local size = redis.call('hget', KEYS[2], ARGV[1])
+if size then
+    redis.call('decrby', KEYS[4], size)
+end
+redis.call('zrem', KEYS[1], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[3], ARGV[1])
+return size
+"""
+
+
+def is_enabled():
+    return bool(get_settings().response_cache_enabled)
+
+
+def get_scope():
+    """
+    Get the audience a cached answer may be shared with: the user, or everyone with the same roles
+    """
+    if get_settings().response_cache_scope != 'Role':
+        return f"user:{frappe.session.user}"
+
+    roles = sorted(frappe.get_roles())
+    return 'roles:' + hashlib.sha256('\0'.join(roles).encode()).hexdigest()
+
+
+def make_key(message, session_id=None, scope=None):
+    """
+    Build the cache key of a question asked in ``session_id``
+
+    The session is part of the key, as a follow-up like "and last month?"
+    means something else in another conversation.
+    """
+    scope = scope or get_scope()
+    return hashlib.sha256(f"{scope}\0{session_id or ''}\0{normalize_message(message)}".encode()).hexdigest()
+
+
+def _keys(cache, key):
+    return [
+        cache.make_key(LRU_KEY),
+        cache.make_key(SIZES_KEY),
+        cache.make_key(HITS_KEY),
+        cache.make_key(BYTES_KEY),
+        cache.make_key(ENTRY_KEY + key)
+    ]
+
+
+def get_cached_response(key):
+    """
+    Get a cached response, counting the hit and marking it recently used
+    """
+    cache = frappe.cache()
+    keys = _keys(cache, key)
+    value = cache.get(keys[4])
+
+    if value is None:
+        cache.eval(REMOVE_SCRIPT, 4, *keys[:4], key)
+        return None
+
+    pipeline = cache.pipeline()
+    pipeline.zadd(keys[0], {key: time.time()})
+    pipeline.hincrby(keys[2], key, 1)
+    pipeline.execute()
+
+    return codec.loads(value)
+
+
+def cache_response(key, response):
+    """
+    Cache a response under the configured TTL, evicting least recently used entries over the caps
+    """
+    settings = get_settings()
+    cache = frappe.cache()
+    keys = _keys(cache, key)
+
+    # Cached answers are served across sessions
+    response = {k: v for k, v in response.items() if k not in ('session_id', 'streamed')}
+
+    return cache.eval(
+        SET_SCRIPT, 5, *keys,
+        key,
+        codec.dumps(response),
+        cint(settings.response_cache_ttl) or 3600,
+        time.time(),
+        cint(settings.response_cache_max_entries) or 1000,
+        (cint(settings.response_cache_max_memory) or 32) * 1024 * 1024,
+        cache.make_key(ENTRY_KEY)
+    )
+
+
+def get_stats(limit=20):
+    cache = frappe.cache()
+    hits = hgetall(cache.make_key(HITS_KEY))
+    top = sorted(((int(count), member) for member, count in hits.items()), reverse=True)[:limit]
+
+    return {
+        'entries': cache.zcard(cache.make_key(LRU_KEY)),
+        'bytes': int(cache.get(cache.make_key(BYTES_KEY)) or 0),
+        'hits': sum(int(count) for count in hits.values()),
+        'top_entries': [{'key': member, 'hits': count} for count, member in top]
+    }
+
+
+def clear():
+    cache = frappe.cache()
+    members = cache.zrange(cache.make_key(LRU_KEY), 0, -1)
+    entry_keys = [cache.make_key(ENTRY_KEY + member.decode()) for member in members]
+    cache.delete(
+        cache.make_key(LRU_KEY),
+        cache.make_key(SIZES_KEY),
+        cache.make_key(HITS_KEY),
+        cache.make_key(BYTES_KEY),
+        *entry_keys
+    )
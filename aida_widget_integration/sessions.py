@@ -0,0 +1,152 @@
+import datetime
+import time
+
+import frappe
+from frappe.utils import cint
+
+from aida_widget_integration.settings import get_settings
+
+STATUS_KEY = 'aida_session_status:{}'
+
+# Session tokens handed to the widget, with the user and AIDA session they are bound to
+TOKEN_KEY = 'aida_session_token:{}'
+
+# Active sessions are re-checked upstream at least this often
+MAX_ACTIVE_TTL = 300
+MIN_ACTIVE_TTL = 15
+
+# Dead sessions stay dead, so a negative answer can be kept longer
+INACTIVE_TTL = 900
+
+DEFAULT_IDLE_TIMEOUT = 3600
+
+
+def get_cached_status(session_id):
+    """
+    Get the cached validity of an AIDA session, or None if it must be checked upstream
+    """
+    if not session_id:
+        return None
+    return frappe.cache().get_value(STATUS_KEY.format(session_id))
+
+
+def cache_status(session_id, active, last_access=None):
+    """
+    Cache the validity of an AIDA session
+
+    Active sessions are cached until shortly before the AIDA server would
+    expire them for inactivity, counted from ``last_access``. Inactive
+    sessions are cached as such so repeated checks don't reach the upstream.
+    """
+    if not session_id:
+        return
+
+    if active:
+        ttl = get_active_ttl(last_access)
+    else:
+        ttl = INACTIVE_TTL
+
+    frappe.cache().set_value(
+        STATUS_KEY.format(session_id),
+        {'active': bool(active), 'last_access': last_access},
+        expires_in_sec=ttl
+    )
+
+
+def mark_active(session_id):
+    """
+    Record that a session was just used successfully
+    """
+    cache_status(session_id, True, time.time())
+
+
+def invalidate(session_id):
+    if session_id:
+        frappe.cache().delete_value(STATUS_KEY.format(session_id))
+
+
+def get_active_ttl(last_access):
+    idle_timeout = cint(get_settings().session_idle_timeout) or DEFAULT_IDLE_TIMEOUT
+    idle_for = seconds_since(last_access)
+
+    if idle_for is None:
+        return MIN_ACTIVE_TTL
+
+    remaining = idle_timeout - idle_for
+    return int(max(MIN_ACTIVE_TTL, min(remaining, MAX_ACTIVE_TTL)))
+
+
+def seconds_since(last_access):
+    """
+    Seconds elapsed since an upstream ``last_access`` value
+
+    Accepts epoch seconds or an ISO 8601 timestamp (naive values are taken as
+    UTC). Returns None if the value can't be understood.
+    """
+    if last_access is None or last_access == '':
+        return None
+
+    if isinstance(last_access, (int, float)):
+        timestamp = float(last_access)
+    else:
+        try:
+            timestamp = float(last_access)
+        except (TypeError, ValueError):
+            try:
+                parsed = datetime.datetime.fromisoformat(str(last_access).replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+            timestamp = parsed.timestamp()
+
+    return max(time.time() - timestamp, 0)
+
+
+def get_token_ttl():
+    """
+    Tokens lapse after the same idle time as the AIDA session they are bound to
+    """
+    return cint(get_settings().session_idle_timeout) or DEFAULT_IDLE_TIMEOUT
+
+
+def issue_token(session_id, upstream_token=None):
+    """
+    Issue a token for an AIDA session, bound to the current user
+
+    A token the AIDA server issued for the session, if any, is kept with it,
+    so it is only sent on for callers holding the token. Returns the token
+    and its lifetime in seconds.
+    """
+    token = frappe.generate_hash(length=32)
+    ttl = get_token_ttl()
+    frappe.cache().set_value(
+        TOKEN_KEY.format(token),
+        {'session_id': session_id, 'user': frappe.session.user, 'upstream_token': upstream_token},
+        expires_in_sec=ttl
+    )
+    return token, ttl
+
+
+def check_token(token, session_id=None):
+    """
+    Get what a token is bound to, or None if it lapsed or isn't the caller's
+
+    Returns a dict with the ``session_id`` and the AIDA server's
+    ``upstream_token`` for it. Each use extends the token's lifetime, as
+    activity extends the session's.
+    """
+    if not token:
+        return None
+
+    cache = frappe.cache()
+    bound = cache.get_value(TOKEN_KEY.format(token))
+    if (
+        not bound
+        or bound['user'] != frappe.session.user
+        or (session_id and session_id != bound['session_id'])
+    ):
+        return None
+
+    cache.expire(cache.make_key(TOKEN_KEY.format(token)), get_token_ttl())
+    return bound
@@ -0,0 +1,161 @@
+import re
+import time
+from contextlib import contextmanager
+
+import frappe
+
+SETTINGS_DOCTYPE = 'AIDA Widget Settings'
+
+# Redis tier shared by all workers of a site
+CACHE_KEY = 'aida_widget_settings'
+CACHE_TTL = 300
+
+# Bumped on every settings update so each worker drops its local copy
+VERSION_KEY = 'aida_widget_settings_version'
+
+# How often a worker checks the shared version before trusting its local copy
+LOCAL_CHECK_INTERVAL = 1
+LOCAL_MAX_AGE = CACHE_TTL
+
+DEFAULT_API_SERVER_URL = 'https://aida.mocxha.com'
+
+DEFAULTS = {
+    'widget_enabled': True,
+    'auto_open': False,
+    'api_server_url': DEFAULT_API_SERVER_URL,
+    'api_server_urls': '',
+    'welcome_message': 'Hello! I\'m AIDA, your AI assistant. How can I help you today?',
+    'widget_position': 'Bottom Right',
+    'widget_theme': 'Default',
+    'show_user_avatar': True,
+    'user_avatar_url': '',
+    'sound_notifications': False,
+    'connection_timeout': 30,
+    'max_retries': 3,
+    'http_pool_size': 10,
+    'upstream_concurrency_limit': 0,
+    'upstream_queue_timeout': 1000,
+    'compress_upstream': True,
+    'compression_threshold': 1024,
+    'session_idle_timeout': 3600,
+    'debug_mode': False,
+    'conversation_logging': True,
+    'enable_streaming': False,
+    'background_chat': False,
+    'batch_concurrency': 4,
+    'response_cache_enabled': False,
+    'response_cache_scope': 'User',
+    'response_cache_ttl': 3600,
+    'response_cache_max_entries': 1000,
+    'response_cache_max_memory': 32,
+    'rate_limit_enabled': False,
+    'user_rate_limit': 20,
+    'guest_rate_limit': 5,
+    'site_rate_limit': 300
+}
+
+# Per-worker tier, keyed by site: {'settings', 'version', 'loaded_at', 'checked_at'}
+_local_cache = {}
+
+# Values layered over the stored settings in this process only, see override_settings
+_overrides = {}
+
+
+def get_settings():
+    """
+    Get AIDA Widget Settings from the per-worker cache, falling back to Redis and then the database
+
+    The local copy is trusted for ``LOCAL_CHECK_INTERVAL`` seconds, after which
+    the shared version counter in Redis is compared to pick up updates made
+    on any other worker. The hot chat path never touches the database.
+    """
+    site = getattr(frappe.local, 'site', None)
+    now = time.monotonic()
+    entry = _local_cache.get(site)
+
+    if entry and now - entry['loaded_at'] < LOCAL_MAX_AGE:
+        if now - entry['checked_at'] < LOCAL_CHECK_INTERVAL:
+            return frappe._dict(entry['settings'], **_overrides)
+
+        if get_version() == entry['version']:
+            entry['checked_at'] = now
+            return frappe._dict(entry['settings'], **_overrides)
+
+    version = get_version()
+    settings = frappe.cache().get_value(CACHE_KEY)
+    if not settings:
+        settings = load_settings()
+        frappe.cache().set_value(CACHE_KEY, settings, expires_in_sec=CACHE_TTL)
+
+    _local_cache[site] = {
+        'settings': settings,
+        'version': version,
+        'loaded_at': now,
+        'checked_at': now
+    }
+    return frappe._dict(settings, **_overrides)
+
+
+@contextmanager
+def override_settings(**values):
+    """
+    Override settings for this process only, without touching the stored settings
+
+    Used by tooling such as the benchmark to point the proxy at a local server.
+    """
+    previous = dict(_overrides)
+    _overrides.update(values)
+    try:
+        yield
+    finally:
+        _overrides.clear()
+        _overrides.update(previous)
+
+
+def load_settings():
+    """
+    Read AIDA Widget Settings from the database, filling in defaults
+    """
+    try:
+        doc = frappe.get_single(SETTINGS_DOCTYPE)
+    except Exception:
+        # Return defaults if settings don't exist
+        return dict(DEFAULTS)
+
+    settings = {}
+    for fieldname, default in DEFAULTS.items():
+        value = getattr(doc, fieldname, None)
+        settings[fieldname] = default if value is None else value
+
+    return settings
+
+
+def get_version():
+    cache = frappe.cache()
+    return cache.get(cache.make_key(VERSION_KEY))
+
+
+def clear_settings_cache():
+    """
+    Invalidate cached settings on every worker of this site
+    """
+    cache = frappe.cache()
+    cache.delete_value(CACHE_KEY)
+    cache.incr(cache.make_key(VERSION_KEY))
+    _local_cache.pop(getattr(frappe.local, 'site', None), None)
+
+
+def get_api_server_url():
+    return get_settings().api_server_url or DEFAULT_API_SERVER_URL
+
+
+def get_api_server_urls():
+    """
+    Get the base URLs of every configured AIDA API server, the primary one first
+    """
+    urls = []
+    for url in [get_api_server_url(), *re.split(r'[\s,]+', get_settings().api_server_urls or '')]:
+        url = url.strip().rstrip('/')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
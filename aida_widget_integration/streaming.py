@@ -0,0 +1,141 @@
+import time
+
+import frappe
+
+from aida_widget_integration import codec
+
+# Realtime event the widget listens on for incremental chat output
+STREAM_EVENT = 'aida_chat_stream'
+
+# Buffered text is flushed to the widget at least this often
+FLUSH_INTERVAL = 0.05
+FLUSH_SIZE = 256
+
+
+def is_stream_response(response):
+    """
+    Check whether the upstream answered with a streamed body rather than plain JSON
+    """
+    content_type = response.headers.get('Content-Type', '')
+    return not content_type.startswith('application/json')
+
+
+def iter_text_chunks(response):
+    """
+    Yield text pieces of a streamed upstream response as they arrive
+
+    Server-sent events are unwrapped to their ``data`` payloads, any other
+    streamed body (chunked text, NDJSON) is passed through line by line.
+    """
+    content_type = response.headers.get('Content-Type', '')
+    is_sse = content_type.startswith('text/event-stream')
+    data_lines = []
+    first_line = True
+
+    for line in response.iter_lines(decode_unicode=True):
+        if not is_sse:
+            # iter_lines drops the line breaks, which are part of a plain text answer
+            chunk = line if first_line else f"\n{line}"
+            first_line = False
+            if chunk:
+                yield chunk
+            continue
+
+        if line == '':
+            # Blank line terminates an event
+            if data_lines:
+                yield '\n'.join(data_lines)
+                data_lines = []
+            continue
+
+        if line.startswith('data:'):
+            # Only the one space after the colon belongs to the field syntax
+            data_lines.append(line[6:] if line.startswith('data: ') else line[5:])
+
+    if data_lines:
+        yield '\n'.join(data_lines)
+
+
+def parse_chunk(chunk):
+    """
+    Split a streamed chunk into its text delta and any metadata it carries
+
+    Returns a ``(delta, metadata, done)`` tuple.
+    """
+    if chunk.strip() == '[DONE]':
+        return '', {}, True
+
+    try:
+        data = codec.loads(chunk)
+    except ValueError:
+        return chunk, {}, False
+
+    if not isinstance(data, dict):
+        return str(data), {}, False
+
+    delta = ''
+    for key in ('delta', 'token', 'content', 'text'):
+        if data.get(key):
+            delta = data[key]
+            break
+
+    metadata = {key: value for key, value in data.items() if key not in ('delta', 'token', 'content', 'text')}
+    return delta, metadata, bool(data.get('done'))
+
+
+def relay_stream(response, stream_id, user=None, on_chunk=None):
+    """
+    Relay a streamed upstream response to the widget over Frappe realtime
+
+    Text deltas are published on ``STREAM_EVENT`` as they arrive and the
+    assembled result is returned in the same shape as a non-streamed reply.
+    ``on_chunk`` is called for every chunk received, to show the call is alive.
+    """
+    user = user or frappe.session.user
+    parts = []
+    pending = []
+    metadata = {}
+    last_flush = 0
+
+    def flush(done=False):
+        nonlocal last_flush
+        if pending or done:
+            frappe.publish_realtime(
+                STREAM_EVENT,
+                {'stream_id': stream_id, 'delta': ''.join(pending), 'done': done},
+                user=user
+            )
+            pending.clear()
+        last_flush = time.monotonic()
+
+    try:
+        for chunk in iter_text_chunks(response):
+            if on_chunk:
+                on_chunk()
+            delta, chunk_metadata, done = parse_chunk(chunk)
+            metadata.update(chunk_metadata)
+
+            if delta:
+                parts.append(delta)
+                pending.append(delta)
+
+                # The first token goes out immediately, later ones are batched
+                if (len(parts) == 1
+                        or time.monotonic() - last_flush >= FLUSH_INTERVAL
+                        or sum(len(piece) for piece in pending) >= FLUSH_SIZE):
+                    flush()
+
+            if done:
+                break
+    finally:
+        # Stopping at the end marker leaves the body partly read; closing it frees the pooled connection
+        response.close()
+
+    flush(done=True)
+
+    # End of stream marker, not part of the answer
+    metadata.pop('done', None)
+    result = dict(metadata)
+    result['response'] = metadata.get('response') or ''.join(parts)
+    result['streamed'] = True
+    return result
@@ -0,0 +1,11 @@
+from aida_widget_integration import conversation_log, health
+
+
+def flush_conversation_logs():
+    """Write buffered conversation log rows to the database"""
+    conversation_log.flush()
+
+
+def probe_upstream_health():
+    """Check whether the AIDA API servers are up and cache the results"""
+    health.probe_all()
@@ -1,15 +1,27 @@
 import frappe
 import unittest
 import json
+import random
+import time
 from unittest.mock import patch, MagicMock
-from aida_widget_integration.api import chat_with_aida, get_widget_settings, save_widget_settings
+import requests
+from aida_widget_integration import (
+    assets, balancer, benchmark, boot, bulkhead, circuit_breaker, client, coalesce, codec, compression, conversation_log, health, metrics, mock_aida_server, prewarm, rate_limit, response_cache, sessions,
+    settings, streaming
+)
+from aida_widget_integration.circuit_breaker import CircuitOpenError
+from aida_widget_integration.api import (
+    chat_batch, chat_with_aida, check_session_status, get_widget_settings, initialize_session, run_chat_job,
+    save_widget_settings
+)
 
 class TestAidaWidget(unittest.TestCase):
     
     def setUp(self):
         """Set up test environment"""
         self.test_message = "Hello, AIDA!"
-        self.test_session_id = "test_session_123"
+        # Unique per test so coalesced results of one test don't answer the next
+        self.test_session_id = f"test_session_{frappe.generate_hash(length=8)}"
         self.test_user_hash = "test_hash_456"
         self.test_credentials = {
             "url": "https://test.mocxha.com",
@@ -17,8 +29,8 @@ class TestAidaWidget(unittest.TestCase):
             "password": "test_password"
         }
     
-    @patch('aida_widget_integration.api.requests.post')
-    def test_chat_with_aida_success(self, mock_post):
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_with_aida_success(self, mock_get_session):
         """Test successful chat with AIDA API"""
         # Mock successful API response
         mock_response = MagicMock()
@@ -27,6 +39,7 @@ class TestAidaWidget(unittest.TestCase):
             'response': 'Hello! How can I help you?',
             'session_id': 'new_session_789'
         }
+        mock_post = mock_get_session.return_value.request
         mock_post.return_value = mock_response
         
         # Test the function
@@ -45,13 +58,14 @@ class TestAidaWidget(unittest.TestCase):
         # Verify API call was made correctly
         mock_post.assert_called_once()
         call_args = mock_post.call_args
-        self.assertIn('/chat', call_args[0][0])
+        self.assertEqual(call_args[0][0], 'POST')
+        self.assertIn('/chat', call_args[0][1])
         
-    @patch('aida_widget_integration.api.requests.post')
-    def test_chat_with_aida_connection_error(self, mock_post):
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_with_aida_connection_error(self, mock_get_session):
         """Test connection error handling"""
         # Mock connection error
-        mock_post.side_effect = Exception("Connection refused")
+        mock_get_session.return_value.request.side_effect = Exception("Connection refused")
         
         # Test the function
         result = chat_with_aida(
@@ -65,14 +79,14 @@ class TestAidaWidget(unittest.TestCase):
         self.assertTrue(result.get('error'))
         self.assertIn('error', result.get('message', '').lower())
     
-    @patch('aida_widget_integration.api.requests.post')
-    def test_chat_with_aida_api_error(self, mock_post):
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_with_aida_api_error(self, mock_get_session):
         """Test API error response handling"""
         # Mock API error response
         mock_response = MagicMock()
         mock_response.status_code = 500
         mock_response.text = "Internal Server Error"
-        mock_post.return_value = mock_response
+        mock_get_session.return_value.request.return_value = mock_response
         
         # Test the function
         result = chat_with_aida(
@@ -86,6 +100,54 @@ class TestAidaWidget(unittest.TestCase):
         self.assertTrue(result.get('error'))
         self.assertIn('500', result.get('message', ''))
     
+    @patch('aida_widget_integration.api._chat')
+    @patch('frappe.enqueue')
+    @patch('aida_widget_integration.api.get_settings')
+    def test_chat_with_aida_background(self, mock_get_settings, mock_enqueue, mock_chat):
+        """Test that background chat enqueues the turn and returns a job ID"""
+        mock_get_settings.return_value = frappe._dict(background_chat=1, connection_timeout=30)
+        
+        with patch('frappe.session', frappe._dict(user='test@example.com')):
+            result = chat_with_aida(message=self.test_message, session_id=self.test_session_id,
+                                    erp_credentials=self.test_credentials)
+        
+        self.assertTrue(result['queued'])
+        mock_chat.assert_not_called()
+        mock_enqueue.assert_called_once()
+        self.assertEqual(mock_enqueue.call_args[0][0], 'aida_widget_integration.api.run_chat_job')
+        self.assertEqual(mock_enqueue.call_args[1]['chat_id'], result['job_id'])
+        
+        # The credentials reach the job through Redis, not its arguments
+        self.assertNotIn('erp_credentials', mock_enqueue.call_args[1])
+        mock_chat.return_value = {'response': 'Hi'}
+        with patch('frappe.session', frappe._dict(user='test@example.com')):
+            run_chat_job(**{key: value for key, value in mock_enqueue.call_args[1].items() if key not in ('queue', 'timeout')})
+        self.assertEqual(mock_chat.call_args.args[3], self.test_credentials)
+    
+    @patch('aida_widget_integration.api.run_in_site_context', side_effect=lambda context, fn, *args, **kwargs: fn(*args, **kwargs))
+    @patch('aida_widget_integration.api._chat')
+    def test_chat_batch_keeps_order_and_item_errors(self, mock_chat, mock_run_in_site_context):
+        """Test that batch results come back in order with per-item errors"""
+        def fake_chat(message, **kwargs):
+            if message == 'boom':
+                raise Exception('upstream exploded')
+            time.sleep(0.05 if message == 'first' else 0)
+            return {'response': f'echo {message}', 'session_id': kwargs['session_id']}
+        mock_chat.side_effect = fake_chat
+        
+        result = chat_batch(json.dumps([
+            {'message': 'first', 'session_id': 's1'},
+            {'message': 'boom', 'session_id': 's2'},
+            {'session_id': 's3'},
+            {'message': 'last', 'session_id': 's4'}
+        ]))
+        
+        results = result['results']
+        self.assertEqual(results[0], {'response': 'echo first', 'session_id': 's1'})
+        self.assertTrue(results[1]['error'])
+        self.assertTrue(results[2]['error'])
+        self.assertEqual(results[3]['response'], 'echo last')
+    
     def test_get_widget_settings_default(self):
         """Test getting default widget settings"""
         # Test when no settings exist
@@ -101,8 +163,11 @@ class TestAidaWidget(unittest.TestCase):
     @patch('frappe.get_single')
     def test_get_widget_settings_from_db(self, mock_get_single):
         """Test getting widget settings from database"""
-        # Mock settings document
-        mock_settings = MagicMock()
+        settings.clear_settings_cache()
+        self.addCleanup(settings.clear_settings_cache)
+        
+        # Mock settings document (a plain dict so the cached copy can be pickled)
+        mock_settings = frappe._dict()
         mock_settings.api_server_url = 'http://custom-server:8000'
         mock_settings.widget_enabled = True
         mock_settings.auto_open = False
@@ -119,6 +184,21 @@ class TestAidaWidget(unittest.TestCase):
         self.assertFalse(result['auto_open'])
         self.assertEqual(result['welcome_message'], 'Custom welcome message')
     
+    @patch('aida_widget_integration.prewarm.has_credentials', return_value=True)
+    @patch('aida_widget_integration.health.get_health', return_value={'status': 'up'})
+    @patch('aida_widget_integration.boot.get_settings')
+    def test_boot_session_configures_loader(self, mock_get_settings, mock_get_health, mock_has_credentials):
+        """Test that the desk loader gets what it needs to draw the button from boot info"""
+        mock_get_settings.return_value = frappe._dict(widget_enabled=1, auto_open=0, widget_position='Top Left')
+        bootinfo = frappe._dict()
+        
+        boot.boot_session(bootinfo)
+        
+        self.assertEqual(
+            bootinfo.aida_widget,
+            {'enabled': 1, 'auto_open': 0, 'position': 'Top Left', 'upstream_status': 'up', 'server_session': 1}
+        )
+    
     @patch('frappe.get_single')
     @patch('frappe.db.commit')
     def test_save_widget_settings(self, mock_commit, mock_get_single):
@@ -148,6 +228,936 @@ class TestAidaWidget(unittest.TestCase):
         mock_settings.save.assert_called_once()
         mock_commit.assert_called_once()
 
+class TestSettingsCache(unittest.TestCase):
+    
+    def setUp(self):
+        settings._local_cache.clear()
+        self.cache = MagicMock()
+        self.cache.get.return_value = b'1'
+        self.cache.get_value.return_value = dict(settings.DEFAULTS, api_server_url='http://cached:5000')
+        patcher = patch('frappe.cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(settings._local_cache.clear)
+    
+    @patch('aida_widget_integration.settings.load_settings')
+    def test_local_copy_served_without_redis(self, mock_load):
+        """Test that repeated reads are served from the worker's local copy"""
+        self.assertEqual(settings.get_api_server_url(), 'http://cached:5000')
+        self.assertEqual(settings.get_api_server_url(), 'http://cached:5000')
+        
+        self.cache.get_value.assert_called_once()
+        mock_load.assert_not_called()
+    
+    @patch('aida_widget_integration.settings.LOCAL_CHECK_INTERVAL', 0)
+    def test_version_bump_invalidates_local_copy(self):
+        """Test that a settings update on another worker is picked up"""
+        settings.get_settings()
+        self.cache.get.return_value = b'2'
+        self.cache.get_value.return_value = dict(settings.DEFAULTS, api_server_url='http://updated:5000')
+        
+        self.assertEqual(settings.get_api_server_url(), 'http://updated:5000')
+
+class TestSessionStatusCache(unittest.TestCase):
+    
+    @patch('aida_widget_integration.sessions.get_settings')
+    def test_active_ttl_follows_last_access(self, mock_get_settings):
+        """Test that active sessions are cached until they would idle out"""
+        mock_get_settings.return_value = frappe._dict(session_idle_timeout=600)
+        now = time.time()
+        
+        self.assertEqual(sessions.get_active_ttl(now), sessions.MAX_ACTIVE_TTL)
+        self.assertAlmostEqual(sessions.get_active_ttl(now - 500), 100, delta=2)
+        self.assertEqual(sessions.get_active_ttl(now - 3600), sessions.MIN_ACTIVE_TTL)
+        self.assertEqual(sessions.get_active_ttl('not a timestamp'), sessions.MIN_ACTIVE_TTL)
+    
+    @patch('aida_widget_integration.client.get_session')
+    @patch('aida_widget_integration.sessions.get_cached_status')
+    def test_cached_status_skips_upstream(self, mock_cached_status, mock_get_session):
+        """Test that a cached session status is answered without an upstream call"""
+        mock_cached_status.return_value = {'active': False, 'last_access': None}
+        
+        result = check_session_status(self.__class__.__name__)
+        
+        self.assertFalse(result['active'])
+        self.assertTrue(result['cached'])
+        mock_get_session.return_value.request.assert_not_called()
+
+class TestPooledClient(unittest.TestCase):
+    
+    def tearDown(self):
+        client.reset_session()
+    
+    @patch('aida_widget_integration.client.get_pool_size', return_value=4)
+    def test_session_is_shared(self, mock_pool_size):
+        """Test that every upstream call reuses the same pooled session"""
+        session = client.get_session()
+        
+        self.assertIs(client.get_session(), session)
+        adapter = session.get_adapter('https://aida.mocxha.com')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        
+        # A new pool size rebuilds the session
+        mock_pool_size.return_value = 8
+        self.assertIsNot(client.get_session(), session)
+    
+    @patch('aida_widget_integration.client.get_pool_size', return_value=4)
+    def test_pool_stats_hits_and_misses(self, mock_pool_size):
+        """Test that pool statistics count reused connections as hits"""
+        session = client.get_session()
+        adapter = session.get_adapter('https://aida.mocxha.com')
+        pool = adapter.poolmanager.connection_from_url('https://aida.mocxha.com')
+        pool.num_requests = 10
+        pool.num_connections = 2
+        
+        stats = client.get_pool_stats()
+        
+        self.assertEqual(stats['pool_size'], 4)
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(stats['hits'], 8)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hit_ratio'], 0.8)
+
+@patch('aida_widget_integration.client.time.sleep')
+@patch('aida_widget_integration.client.get_settings', return_value=frappe._dict(max_retries=2, connection_timeout=20))
+@patch('aida_widget_integration.client.get_session')
+class TestUpstreamRetries(unittest.TestCase):
+    
+    def setUp(self):
+        self.url = f"http://{frappe.generate_hash(length=8)}.invalid/chat"
+        self.upstream = client.get_upstream(self.url)
+        self.addCleanup(circuit_breaker.record_success, self.upstream)
+    
+    def test_connect_error_is_retried(self, mock_get_session, mock_get_settings, mock_sleep):
+        """Test that a failed connect is retried with backoff and then succeeds"""
+        response = MagicMock(status_code=200)
+        mock_get_session.return_value.request.side_effect = [requests.exceptions.ConnectTimeout(), response]
+        
+        self.assertIs(client.post(self.url, json={}), response)
+        self.assertEqual(mock_get_session.return_value.request.call_count, 2)
+        self.assertEqual(mock_get_session.return_value.request.call_args[1]['timeout'], (5, 20))
+        mock_sleep.assert_called_once()
+    
+    def test_read_timeout_on_post_is_not_retried(self, mock_get_session, mock_get_settings, mock_sleep):
+        """Test that a chat request that may have reached the server is not resent"""
+        mock_get_session.return_value.request.side_effect = requests.exceptions.ReadTimeout()
+        
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.post(self.url, json={})
+        mock_get_session.return_value.request.assert_called_once()
+    
+    def test_gateway_timeout_on_post_is_not_retried(self, mock_get_session, mock_get_settings, mock_sleep):
+        """Test that a chat request is only resent on a 503, not on a 504 that may have run it"""
+        mock_get_session.return_value.request.return_value = MagicMock(status_code=504)
+        self.assertEqual(client.post(self.url, json={}).status_code, 504)
+        mock_get_session.return_value.request.assert_called_once()
+        
+        mock_get_session.return_value.request.side_effect = [MagicMock(status_code=503), MagicMock(status_code=200)]
+        self.assertEqual(client.post(self.url, json={}).status_code, 200)
+    
+    def test_open_circuit_fails_fast(self, mock_get_session, mock_get_settings, mock_sleep):
+        """Test that repeated failures open the circuit and later calls skip the upstream"""
+        for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+            circuit_breaker.record_failure(self.upstream)
+        
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.url)
+        mock_get_session.return_value.request.assert_not_called()
+        self.assertEqual(circuit_breaker.get_state(self.upstream)['state'], 'open')
+    
+    def test_opted_out_calls_leave_circuit_alone(self, mock_get_session, mock_get_settings, mock_sleep):
+        """Test that failures of calls made without the circuit breaker don't open it"""
+        mock_get_session.return_value.request.side_effect = requests.exceptions.ConnectTimeout()
+        
+        for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                client.get(self.url, retries=0, use_circuit_breaker=False)
+        
+        self.assertEqual(circuit_breaker.get_state(self.upstream)['state'], 'closed')
+
+class TestUpstreamMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+    
+    @patch('aida_widget_integration.client.get_settings', return_value=frappe._dict(max_retries=0, connection_timeout=30))
+    @patch('aida_widget_integration.client.get_session')
+    def test_upstream_calls_are_measured(self, mock_get_session, mock_get_settings):
+        """Test that status codes, exceptions and latency buckets are recorded per endpoint"""
+        mock_get_session.return_value.request.side_effect = [
+            MagicMock(status_code=200),
+            requests.exceptions.ReadTimeout('slow')
+        ]
+        
+        client.get('http://aida.test/session_status/abc123', use_circuit_breaker=False)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.post('http://aida.test/chat', use_circuit_breaker=False)
+        
+        text = metrics.render()
+        self.assertIn('aida_upstream_requests_total{endpoint="/session_status",method="GET",status="200"} 1', text)
+        self.assertIn('aida_upstream_exceptions_total{endpoint="/chat",method="POST",exception="ReadTimeout"} 1', text)
+        self.assertIn('aida_upstream_request_duration_seconds_bucket{endpoint="/chat",method="POST",le="+Inf"} 1', text)
+        self.assertIn('aida_upstream_in_flight_requests{endpoint="/chat"} 0', text)
+        self.assertNotIn('abc123', text)
+
+class TestBenchmark(unittest.TestCase):
+    
+    def test_summarize_uses_nearest_rank(self):
+        """Test latency percentiles of the benchmark report"""
+        summary = benchmark.summarize([i / 1000 for i in range(1, 101)])
+        
+        self.assertEqual((summary['p50'], summary['p99'], summary['max']), (50.0, 99.0, 100.0))
+    
+    def test_run_against_mock_server(self):
+        """Test that every scenario runs through the proxy without errors and reports overhead"""
+        report = benchmark.run(concurrency=2, requests_per_scenario=6, warmup=1, upstream_latency_ms=0)
+        
+        self.assertEqual([result['scenario'] for result in report['results']], list(benchmark.SCENARIOS))
+        for result in report['results']:
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['upstream']['errors'], 0)
+            self.assertIn('p99', result['overhead_ms'])
+
+class TestMockAidaServer(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = mock_aida_server.start_server(latency='uniform:0:5', seed=7)
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_latency_is_reproducible_with_seed(self):
+        """Test that the same seed draws the same latencies"""
+        draw = mock_aida_server.parse_latency('lognormal:200:0.5')
+        first = [draw(random.Random(1)) for _ in range(3)]
+        second = [draw(random.Random(1)) for _ in range(3)]
+        
+        self.assertEqual(first, second)
+        self.assertRaises(ValueError, mock_aida_server.parse_latency, 'gamma:1:2')
+    
+    def test_injected_error_is_retried(self):
+        """Test that the client retries an injected upstream failure and gets the next answer"""
+        self.server.error_status = 503
+        self.server.inject('/chat', 'error')
+        
+        with patch('aida_widget_integration.client.get_backoff', return_value=0), \
+                settings.override_settings(max_retries=1):
+            response = client.post(f"{self.server.url}/chat", json={'user_input': 'Hi'}, use_circuit_breaker=False)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['response'].startswith('Echo: Hi'))
+        self.assertEqual(self.server.get_stats()['calls']['/chat'], 2)
+    
+    def test_streams_sse_when_asked(self):
+        """Test that the mock server streams chunks the proxy can parse"""
+        self.server.token_delay = 0
+        self.server.answer_words = 3
+        response = requests.post(f"{self.server.url}/chat", json={'user_input': 'Hi', 'stream': True}, stream=True)
+        
+        chunks = list(streaming.iter_text_chunks(response))
+        
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        self.assertEqual(''.join(streaming.parse_chunk(chunk)[0] for chunk in chunks), 'Echo: Hi lorem')
+        self.assertEqual(chunks[-1], '[DONE]')
+
+class TestUpstreamCompression(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = mock_aida_server.start_server(answer_words=400)
+        self.upstream = client.get_upstream(self.server.url)
+        self.addCleanup(compression.forget, self.upstream)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def post(self, user_input):
+        return client.post(f"{self.server.url}/chat", json={'user_input': user_input}, use_circuit_breaker=False)
+    
+    def test_large_bodies_are_compressed_once_negotiated(self):
+        """Test that bodies over the threshold go out compressed after the server advertised an encoding"""
+        self.post('Hi')
+        response = self.post('x' * 5000)
+        
+        self.assertTrue(response.json()['response'].startswith('Echo: xxx'))
+        self.assertEqual(response.headers['Content-Encoding'], compression.ENCODINGS[0])
+        self.assertEqual(self.server.get_stats()['request_encodings'], {'identity': 1, compression.ENCODINGS[0]: 1})
+        
+        text = metrics.render()
+        sent = f'aida_upstream_body_bytes_total{{endpoint="/chat",method="POST",direction="request",encoding="{compression.ENCODINGS[0]}"}}'
+        uncompressed = f'aida_upstream_body_uncompressed_bytes_total{{endpoint="/chat",method="POST",direction="request",encoding="{compression.ENCODINGS[0]}"}}'
+        values = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+        self.assertLess(int(values[sent]), 200)
+        self.assertGreater(int(values[uncompressed]), 5000)
+    
+    def test_small_bodies_are_sent_as_is(self):
+        """Test that bodies under the threshold are never compressed"""
+        self.post('Hi')
+        self.post('Hello')
+        
+        self.assertEqual(self.server.get_stats()['request_encodings'], {'identity': 2})
+    
+    def test_streamed_responses_are_not_compressed(self):
+        """Test that streamed requests ask for an uncompressed response"""
+        kwargs = {'json': {'user_input': 'Hi'}, 'stream': True}
+        compression.prepare(self.upstream, kwargs)
+        self.assertEqual(kwargs['headers']['Accept-Encoding'], 'identity')
+        
+        kwargs = {'json': {'user_input': 'Hi'}}
+        compression.prepare(self.upstream, kwargs)
+        self.assertEqual(kwargs['headers']['Accept-Encoding'], compression.get_accept_encoding())
+    
+    def test_rejected_encoding_is_resent_uncompressed(self):
+        """Test that a 415 for a compressed body makes the client drop the encoding and resend"""
+        self.post('Hi')
+        self.server.compression = False
+        response = self.post('x' * 5000)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(compression.choose_encoding(self.upstream))
+        self.assertEqual(self.server.get_stats()['request_encodings'], {'identity': 2, compression.ENCODINGS[0]: 1})
+
+class TestUpstreamHealth(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = mock_aida_server.start_server()
+        self.upstream = client.get_upstream(self.server.url)
+        frappe.cache().delete_value(health.HEALTH_KEY.format(self.upstream))
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    @patch('frappe.publish_realtime')
+    def test_probe_records_status_changes(self, mock_publish):
+        """Test that probes store health and last error, and broadcast only status changes"""
+        with settings.override_settings(api_server_url=self.server.url):
+            self.assertEqual(health.probe_all()[0]['status'], 'up')
+            health.probe_all()
+            self.server.inject('/health', 'error')
+            
+            state = health.probe_all()[0]
+        
+        self.assertEqual(state['status'], 'down')
+        self.assertIn('500', state['last_error'])
+        self.assertTrue(health.is_down(self.upstream))
+        self.assertEqual([call.args[1]['status'] for call in mock_publish.call_args_list], ['up', 'down'])
+    
+    @patch('aida_widget_integration.api.health.is_down', return_value=True)
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_fails_fast_while_down(self, mock_get_session, mock_is_down):
+        """Test that chat answers at once without calling the upstream when it is known to be down"""
+        result = chat_with_aida(message='Hello', session_id=frappe.generate_hash(length=8), bypass_cache=True)
+        
+        self.assertTrue(result['error'])
+        self.assertTrue(result['unavailable'])
+        mock_get_session.assert_not_called()
+
+class TestUpstreamBalancer(unittest.TestCase):
+    
+    def setUp(self):
+        self.servers = [mock_aida_server.start_server(), mock_aida_server.start_server()]
+        self.urls = [server.url for server in self.servers]
+        self.overrides = settings.override_settings(api_server_url=self.urls[0], api_server_urls=self.urls[1])
+        self.overrides.__enter__()
+        cache = frappe.cache()
+        cache.delete(cache.make_key(balancer.INFLIGHT_KEY), cache.make_key(balancer.LATENCY_KEY))
+    
+    def tearDown(self):
+        self.overrides.__exit__(None, None, None)
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+    
+    def test_least_loaded_server_wins(self):
+        """Test that servers are scored by in-flight calls times average latency"""
+        cache = frappe.cache()
+        cache.hincrbyfloat(cache.make_key(balancer.LATENCY_KEY), client.get_upstream(self.urls[0]), 50)
+        cache.hincrbyfloat(cache.make_key(balancer.LATENCY_KEY), client.get_upstream(self.urls[1]), 80)
+        
+        self.assertEqual(balancer.choose(self.urls), self.urls[0])
+        
+        cache.hincrby(cache.make_key(balancer.INFLIGHT_KEY), client.get_upstream(self.urls[0]), 2)
+        
+        self.assertEqual(balancer.choose(self.urls), self.urls[1])
+        servers = balancer.get_stats()['servers']
+        self.assertEqual([server['in_flight'] for server in servers], [2, 0])
+        self.assertEqual([server['latency_ms'] for server in servers], [50.0, 80.0])
+    
+    def test_session_sticks_to_its_server(self):
+        """Test that a pinned session is routed to its server even when another scores better"""
+        cache = frappe.cache()
+        cache.hincrbyfloat(cache.make_key(balancer.LATENCY_KEY), client.get_upstream(self.urls[0]), 10)
+        session_id = frappe.generate_hash(length=8)
+        
+        response = balancer.post('/init_session', json={})
+        balancer.pin(session_id, self.urls[1])
+        
+        self.assertIn(response.aida_server, self.urls)
+        self.assertEqual(balancer.choose(self.urls, session_id), self.urls[1])
+    
+    def test_fails_over_when_server_refuses_connections(self):
+        """Test that a request moves on to the next server when its pinned server is gone"""
+        session_id = frappe.generate_hash(length=8)
+        balancer.pin(session_id, self.urls[0])
+        self.servers[0].shutdown()
+        self.servers[0].server_close()
+        
+        with patch('aida_widget_integration.client.get_session', return_value=requests.Session()):
+            response = balancer.post('/chat', session_id=session_id, json={'user_input': 'Hi', 'session_id': session_id})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.aida_server, self.urls[1])
+        self.assertEqual(self.servers[1].get_stats()['calls']['/chat'], 1)
+
+class TestRateLimit(unittest.TestCase):
+    
+    def setUp(self):
+        self.user = f"{frappe.generate_hash(length=8)}@example.com"
+        self.overrides = settings.override_settings(rate_limit_enabled=1, user_rate_limit=2, site_rate_limit=0)
+        self.overrides.__enter__()
+    
+    def tearDown(self):
+        self.overrides.__exit__(None, None, None)
+    
+    def test_rejects_beyond_burst_with_retry_after(self):
+        """Test that a user gets a minute's worth of messages, then a retry hint"""
+        with patch('frappe.session', frappe._dict(user=self.user)):
+            self.assertIsNone(rate_limit.check())
+            self.assertIsNone(rate_limit.check())
+            rejected = rate_limit.check()
+        
+        self.assertTrue(rejected['rate_limited'])
+        self.assertEqual(rejected['retry_after'], 30)
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_is_rejected_without_upstream_call(self, mock_get_session):
+        """Test that chat_with_aida turns away a user over the limit before doing any work"""
+        with patch('frappe.session', frappe._dict(user=self.user)), \
+                patch('aida_widget_integration.rate_limit.time.time', return_value=1000.0):
+            rate_limit.check(cost=2)
+            result = chat_with_aida(message='Hello', session_id=frappe.generate_hash(length=8))
+        
+        self.assertTrue(result['rate_limited'])
+        mock_get_session.assert_not_called()
+
+class TestBulkhead(unittest.TestCase):
+    
+    def setUp(self):
+        cache = frappe.cache()
+        cache.delete(cache.make_key(bulkhead.SLOTS_KEY), cache.make_key(bulkhead.STATS_KEY))
+        self.overrides = settings.override_settings(upstream_concurrency_limit=1, upstream_queue_timeout=50)
+        self.overrides.__enter__()
+    
+    def tearDown(self):
+        self.overrides.__exit__(None, None, None)
+    
+    def test_sheds_calls_beyond_limit(self):
+        """Test that a call finding every slot taken waits briefly, then is shed"""
+        with bulkhead.slot():
+            with self.assertRaises(bulkhead.BulkheadFullError):
+                with bulkhead.slot():
+                    pass
+            in_use = bulkhead.get_stats()['in_use']
+        
+        stats = bulkhead.get_stats()
+        self.assertEqual(in_use, 1)
+        self.assertEqual((stats['in_use'], stats['acquired'], stats['queued'], stats['shed']), (0, 1, 1, 1))
+    
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a slot left behind by a killed worker frees up once its lease runs out"""
+        cache = frappe.cache()
+        cache.zadd(cache.make_key(bulkhead.SLOTS_KEY), {'dead-worker': time.time() - 1})
+        
+        with bulkhead.slot():
+            self.assertEqual(bulkhead.get_stats()['in_use'], 1)
+    
+    @patch('aida_widget_integration.bulkhead.RENEW_INTERVAL', 0)
+    def test_renewed_lease_outlives_initial_lease(self):
+        """Test that a held slot reporting progress keeps its slot past the lease it was given"""
+        cache = frappe.cache()
+        slots_key = cache.make_key(bulkhead.SLOTS_KEY)
+        
+        with patch('aida_widget_integration.bulkhead.get_lease', return_value=1), bulkhead.slot() as renew:
+            (token, expires_at), = cache.zrange(slots_key, 0, -1, withscores=True)
+            time.sleep(0.01)
+            renew()
+            self.assertGreater(cache.zscore(slots_key, token), expires_at)
+            
+            # A slot that was reclaimed meanwhile isn't taken back
+            cache.zrem(slots_key, token)
+            renew()
+            self.assertEqual(cache.zcard(slots_key), 0)
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_answers_busy_when_full(self, mock_get_session):
+        """Test that a shed chat returns a busy error without calling the upstream"""
+        with bulkhead.slot():
+            result = chat_with_aida(message='Hello', session_id=frappe.generate_hash(length=8), bypass_cache=True)
+        
+        self.assertTrue(result['busy'])
+        self.assertEqual(result['retry_after'], 5)
+        mock_get_session.assert_not_called()
+
+class TestSessionPrewarm(unittest.TestCase):
+    
+    def setUp(self):
+        self.user = f"{frappe.generate_hash(length=8)}@example.com"
+    
+    def test_user_hash_matches_widget(self):
+        """Test that the server derives the same user hash as generateUserHash in the widget"""
+        self.assertEqual(prewarm.get_user_hash('admin@example.com', 'https://erp.example.com'), 'mnmwb9')
+    
+    @patch('frappe.enqueue')
+    def test_login_warms_session_only_with_stored_credentials(self, mock_enqueue):
+        """Test that logging in queues a session init for users with stored credentials"""
+        with patch('frappe.db.exists', return_value=None, create=True):
+            prewarm.on_session_creation(frappe._dict(user=self.user))
+        mock_enqueue.assert_not_called()
+        
+        with patch('frappe.db.exists', return_value=self.user, create=True):
+            prewarm.on_session_creation(frappe._dict(user=self.user))
+        
+        mock_enqueue.assert_called_once()
+        self.assertEqual(mock_enqueue.call_args.kwargs['user'], self.user)
+    
+    @patch('aida_widget_integration.api.initialize_session')
+    def test_warm_session_uses_widget_hash(self, mock_initialize):
+        """Test that warming a session sends the user hash the widget stored with the credentials"""
+        mock_initialize.return_value = {'success': True, 'session_id': 'warm-session', 'session_token': 'token'}
+        credentials = MagicMock(erpnext_url='', username='', user_hash='widget-hash')
+        
+        with patch('frappe.db.exists', return_value=self.user, create=True), \
+                patch('frappe.get_doc', return_value=credentials, create=True):
+            self.assertEqual(prewarm.warm_session(self.user)['session_id'], 'warm-session')
+        
+        self.assertEqual(mock_initialize.call_args.kwargs['user_hash'], 'widget-hash')
+        self.assertEqual(prewarm.get_user_session(self.user)['session_token'], 'token')
+    
+    @patch('frappe.delete_doc', create=True)
+    def test_forget_credentials_deletes_stored_record(self, mock_delete_doc):
+        """Test that forgetting credentials deletes the user's record, and only if there is one"""
+        with patch('frappe.db.exists', return_value=None, create=True):
+            prewarm.forget_credentials(self.user)
+        mock_delete_doc.assert_not_called()
+        
+        with patch('frappe.db.exists', return_value=self.user, create=True):
+            prewarm.forget_credentials(self.user)
+        mock_delete_doc.assert_called_once_with(prewarm.CREDENTIALS_DOCTYPE, self.user, ignore_permissions=True)
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_chat_uses_prewarmed_session(self, mock_get_session):
+        """Test that a chat without a session ID goes straight to /chat in the user's warm session"""
+        mock_get_session.return_value.request.return_value = MagicMock(
+            status_code=200,
+            json=MagicMock(return_value={'response': 'Hi', 'session_id': 'warm-session'})
+        )
+        prewarm.set_user_session(self.user, 'warm-session')
+        
+        with patch('frappe.session', frappe._dict(user=self.user)):
+            result = chat_with_aida(message='Hello', bypass_cache=True)
+        
+        self.assertEqual(result['session_id'], 'warm-session')
+        mock_get_session.return_value.request.assert_called_once()
+        _method, url = mock_get_session.return_value.request.call_args.args
+        self.assertTrue(url.endswith('/chat'))
+        self.assertEqual(mock_get_session.return_value.request.call_args.kwargs['json']['session_id'], 'warm-session')
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_prewarmed_session_sends_upstream_token(self, mock_get_session):
+        """Test that a chat in the warm session carries the AIDA server's token once the stored token checks out"""
+        mock_get_session.return_value.request.return_value = MagicMock(
+            status_code=200,
+            json=MagicMock(return_value={'response': 'Hi', 'session_id': 'warm-session'})
+        )
+        
+        with patch('frappe.session', frappe._dict(user=self.user)):
+            token, _ = sessions.issue_token('warm-session', 'upstream-token')
+            prewarm.set_user_session(self.user, 'warm-session', token)
+            chat_with_aida(message='Hello', bypass_cache=True)
+        
+        self.assertEqual(mock_get_session.return_value.request.call_args.kwargs['json']['session_token'], 'upstream-token')
+
+class TestSessionToken(unittest.TestCase):
+    
+    def setUp(self):
+        self.user = f"{frappe.generate_hash(length=8)}@example.com"
+        self.session = patch('frappe.session', frappe._dict(user=self.user))
+        self.session.start()
+    
+    def tearDown(self):
+        self.session.stop()
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_init_session_exchanges_credentials_for_token(self, mock_get_session):
+        """Test that chat turns after initialize_session carry the token, not the credentials"""
+        mock_request = mock_get_session.return_value.request
+        mock_request.side_effect = [
+            MagicMock(status_code=200, json=MagicMock(return_value={'session_id': 'bound', 'session_token': 'upstream-token'})),
+            MagicMock(status_code=200, json=MagicMock(return_value={'response': 'Hi', 'session_id': 'bound'}))
+        ]
+        
+        session = initialize_session(username='test_user', password='test_password')
+        self.assertTrue(session['success'])
+        self.assertTrue(session['session_token'])
+        
+        result = chat_with_aida(message='Hello', session_id='bound', session_token=session['session_token'], bypass_cache=True)
+        
+        self.assertEqual(result['response'], 'Hi')
+        payload = mock_request.call_args.kwargs['json']
+        self.assertEqual(payload['session_token'], 'upstream-token')
+        self.assertNotIn('erp_credentials', payload)
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_unknown_or_foreign_token_is_expired(self, mock_get_session):
+        """Test that a lapsed token, or one issued to another user, is rejected without an upstream call"""
+        token, _ = sessions.issue_token('bound')
+        
+        self.assertTrue(chat_with_aida(message='Hello', session_token='lapsed', bypass_cache=True)['token_expired'])
+        with patch('frappe.session', frappe._dict(user='other@example.com')):
+            self.assertTrue(chat_with_aida(message='Hello', session_token=token, bypass_cache=True)['token_expired'])
+        
+        mock_get_session.return_value.request.assert_not_called()
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_session_id_alone_gets_no_upstream_token(self, mock_get_session):
+        """Test that naming another user's session without its token doesn't send that session's upstream token"""
+        mock_get_session.return_value.request.return_value = MagicMock(
+            status_code=200,
+            json=MagicMock(return_value={'response': 'Hi', 'session_id': 'bound'})
+        )
+        sessions.issue_token('bound', 'upstream-token')
+        
+        for user in (self.user, 'Guest'):
+            with patch('frappe.session', frappe._dict(user=user)):
+                chat_with_aida(message='Hello', session_id='bound', bypass_cache=True)
+            self.assertNotIn('session_token', mock_get_session.return_value.request.call_args.kwargs['json'])
+
+class TestRequestCoalescing(unittest.TestCase):
+    
+    def setUp(self):
+        self.key = coalesce.make_key('test@example.com', frappe.generate_hash(length=8), 'Hello')
+    
+    def test_message_is_normalized(self):
+        """Test that whitespace and case differences map to the same key"""
+        self.assertEqual(
+            coalesce.make_key('a@example.com', 's1', '  How do I   create an invoice? '),
+            coalesce.make_key('a@example.com', 's1', 'how do i create an INVOICE?')
+        )
+        self.assertNotEqual(
+            coalesce.make_key('a@example.com', 's1', 'Hello'),
+            coalesce.make_key('b@example.com', 's1', 'Hello')
+        )
+    
+    def test_duplicate_waits_for_in_flight_result(self):
+        """Test that a duplicate arriving mid-flight gets the leader's result"""
+        calls = []
+        
+        def leader():
+            calls.append('leader')
+            # A duplicate arrives while the upstream call is in flight
+            duplicate = coalesce.run_once(self.key, lambda: calls.append('duplicate') or {}, timeout=5)
+            self.assertEqual(duplicate, {'response': 'from leader'})
+            return {'response': 'from leader'}
+        
+        with patch('aida_widget_integration.coalesce.time.sleep'), \
+                patch('aida_widget_integration.coalesce._get_result', side_effect=[None, None, {'response': 'from leader'}]):
+            coalesce.run_once(self.key, leader, timeout=5)
+        
+        self.assertEqual(calls, ['leader'])
+    
+    def test_duplicate_sleeps_between_polls(self):
+        """Test that a duplicate waits at the poll interval for the leader instead of spinning"""
+        cache = frappe.cache()
+        cache.set(cache.make_key(coalesce.LOCK_KEY.format(self.key)), 'leader', ex=5)
+        
+        def leader_finishes(seconds):
+            cache.set(cache.make_key(coalesce.RESULT_KEY.format(self.key)), json.dumps({'response': 'from leader'}), ex=5)
+        
+        with patch('aida_widget_integration.coalesce.time.sleep', side_effect=leader_finishes) as mock_sleep:
+            result = coalesce.run_once(self.key, MagicMock(return_value={'response': 'own call'}), timeout=1)
+        
+        self.assertEqual(result, {'response': 'from leader'})
+        mock_sleep.assert_called_once_with(coalesce.POLL_INTERVAL)
+    
+    def test_idempotent_retry_reuses_result(self):
+        """Test that a retry with the same idempotency key after completion is not resent"""
+        mock_fn = MagicMock(return_value={'response': 'Hi'})
+        
+        coalesce.run_once(self.key, mock_fn, timeout=5, idempotent=True)
+        result = coalesce.run_once(self.key, mock_fn, timeout=5, idempotent=True)
+        
+        self.assertEqual(result, {'response': 'Hi'})
+        mock_fn.assert_called_once()
+
+class TestResponseCache(unittest.TestCase):
+    
+    def setUp(self):
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        patcher = patch('aida_widget_integration.response_cache.get_settings', return_value=frappe._dict(
+            response_cache_enabled=1,
+            response_cache_ttl=60,
+            response_cache_max_entries=2,
+            response_cache_max_memory=1
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_hits_are_counted(self):
+        """Test that cached responses are served without their session and hits are counted"""
+        key = response_cache.make_key('How do I create a sales invoice?', scope='roles:test')
+        response_cache.cache_response(key, {'response': 'Go to Sales Invoice', 'session_id': 's1'})
+        
+        self.assertEqual(response_cache.get_cached_response(key), {'response': 'Go to Sales Invoice'})
+        response_cache.get_cached_response(key)
+        
+        stats = response_cache.get_stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['top_entries'][0], {'key': key, 'hits': 2})
+    
+    def test_least_recently_used_is_evicted(self):
+        """Test that the entry cap evicts the least recently used response"""
+        keys = [response_cache.make_key(f"question {i}", scope='roles:test') for i in range(3)]
+        response_cache.cache_response(keys[0], {'response': 'a'})
+        response_cache.cache_response(keys[1], {'response': 'b'})
+        response_cache.get_cached_response(keys[0])
+        response_cache.cache_response(keys[2], {'response': 'c'})
+        
+        self.assertIsNotNone(response_cache.get_cached_response(keys[0]))
+        self.assertIsNone(response_cache.get_cached_response(keys[1]))
+        self.assertIsNotNone(response_cache.get_cached_response(keys[2]))
+        self.assertEqual(response_cache.get_stats()['entries'], 2)
+    
+    @patch('aida_widget_integration.api._send_chat')
+    @patch('aida_widget_integration.response_cache.get_scope', return_value='roles:test')
+    def test_bypass_flag_skips_cache(self, mock_get_scope, mock_send_chat):
+        """Test that live queries bypass the cache"""
+        mock_send_chat.return_value = {'response': 'Live answer'}
+        response_cache.cache_response(response_cache.make_key('Leave balance?', 's2'), {'response': 'Cached answer'})
+        
+        cached = chat_with_aida(message='Leave balance?', session_id='s2')
+        live = chat_with_aida(message='Leave balance?', session_id='s2', bypass_cache=1)
+        
+        self.assertEqual(cached, {'response': 'Cached answer', 'session_id': 's2', 'cached': True})
+        self.assertEqual(live['response'], 'Live answer')
+        mock_send_chat.assert_called_once()
+    
+    @patch('aida_widget_integration.api._send_chat')
+    @patch('aida_widget_integration.response_cache.get_scope', return_value='roles:test')
+    def test_other_sessions_and_guests_are_not_served_from_cache(self, mock_get_scope, mock_send_chat):
+        """Test that an answer cached in one conversation isn't served in another, nor to guests"""
+        mock_send_chat.return_value = {'response': 'Live answer'}
+        response_cache.cache_response(response_cache.make_key('And last month?', 's1'), {'response': 'Cached answer'})
+        
+        self.assertEqual(chat_with_aida(message='And last month?', session_id='s3')['response'], 'Live answer')
+        with patch('frappe.session', frappe._dict(user='Guest')):
+            chat_with_aida(message='And last month?', session_id='s1')
+        
+        self.assertEqual(mock_send_chat.call_count, 2)
+
+class TestConversationLog(unittest.TestCase):
+    
+    def setUp(self):
+        cache = frappe.cache()
+        self.buffer_key = cache.make_key(conversation_log.BUFFER_KEY)
+        self.user_buffer_key = cache.make_key(conversation_log.USER_BUFFER_KEY.format('test@example.com'))
+        cache.delete(self.buffer_key, self.user_buffer_key)
+        self.addCleanup(cache.delete, self.buffer_key, self.user_buffer_key)
+        patcher = patch('aida_widget_integration.conversation_log.get_settings',
+                        return_value=frappe._dict(conversation_logging=1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    @patch('frappe.db.bulk_insert')
+    def test_turns_are_buffered_then_bulk_inserted(self, mock_bulk_insert):
+        """Test that chat turns only hit Redis until the flush writes them in one insert"""
+        conversation_log.log_turn('Hi', {'response': 'Hello!', 'session_id': 's1'}, duration_ms=120)
+        conversation_log.log_turn('Oops', {'error': True, 'message': 'Request timed out.'}, session_id='s1')
+        mock_bulk_insert.assert_not_called()
+        
+        with patch('frappe.db.commit'):
+            self.assertEqual(conversation_log.flush(), 2)
+        
+        mock_bulk_insert.assert_called_once()
+        doctype, fields, rows = mock_bulk_insert.call_args[0]
+        self.assertEqual(doctype, 'AIDA Conversation Log')
+        rows = [dict(zip(fields, row, strict=True)) for row in rows]
+        self.assertEqual((rows[0]['message'], rows[0]['response'], rows[0]['status']), ('Hi', 'Hello!', 'Success'))
+        self.assertEqual((rows[1]['session_id'], rows[1]['status']), ('s1', 'Error'))
+        self.assertEqual(frappe.cache().llen(self.buffer_key), 0)
+    
+    @patch('frappe.db.bulk_insert', side_effect=Exception('database is down'))
+    def test_failed_flush_keeps_rows(self, mock_bulk_insert):
+        """Test that rows stay buffered when the insert fails"""
+        conversation_log.log_turn('first', {'response': 'a'})
+        conversation_log.log_turn('second', {'response': 'b'})
+        
+        with patch('frappe.db.rollback'):
+            self.assertEqual(conversation_log.flush(), 0)
+        
+        self.assertEqual([entry['message'] for entry in conversation_log.get_buffered_entries()], ['first', 'second'])
+
+    def test_history_pages_merge_buffered_turns(self):
+        """Test that the first history page includes unflushed turns and hands back a cursor"""
+        with patch('frappe.session', frappe._dict(user='test@example.com')):
+            conversation_log.log_turn('newest', {'response': 'buffered'})
+
+        rows = [
+            frappe._dict(name=f'log{i}', creation=f'2024-01-01 10:00:{59 - i:02d}', timestamp=f'2024-01-01 10:00:{59 - i:02d}',
+                         session_id='s1', status='Success', message=f'stored {i}', response='ok')
+            for i in range(conversation_log.HISTORY_PAGE_SIZE + 1)
+        ]
+        query = MagicMock()
+        for method in ('from_', 'select', 'where', 'orderby', 'limit'):
+            getattr(query, method).return_value = query
+        query.run.return_value = rows
+
+        with patch('frappe.qb', query):
+            page = conversation_log.get_history('test@example.com')
+
+        self.assertEqual(page['turns'][0]['message'], 'newest')
+        self.assertEqual(len(page['turns']), conversation_log.HISTORY_PAGE_SIZE)
+        last = rows[conversation_log.HISTORY_PAGE_SIZE - 2]
+        self.assertEqual(page['turns'][-1]['message'], last.message)
+        self.assertEqual(conversation_log.decode_cursor(page['next_cursor'])[1], last.name)
+    
+    @patch('frappe.db.bulk_insert')
+    def test_user_buffer_holds_one_page_until_flushed(self, mock_bulk_insert):
+        """Test that history reads only the user's latest buffered turns, which a flush removes"""
+        with patch('frappe.session', frappe._dict(user='test@example.com')):
+            for i in range(conversation_log.HISTORY_PAGE_SIZE + 5):
+                conversation_log.log_turn(f'turn {i}', {'response': 'ok'})
+        with patch('frappe.session', frappe._dict(user='other@example.com')):
+            conversation_log.log_turn('not mine', {'response': 'ok'})
+        self.addCleanup(frappe.cache().delete, frappe.cache().make_key(conversation_log.USER_BUFFER_KEY.format('other@example.com')))
+        
+        buffered = conversation_log.get_buffered_entries('test@example.com')
+        self.assertEqual(len(buffered), conversation_log.HISTORY_PAGE_SIZE)
+        self.assertEqual(buffered[-1]['message'], f'turn {conversation_log.HISTORY_PAGE_SIZE + 4}')
+        
+        with patch('frappe.db.commit'):
+            conversation_log.flush()
+        self.assertEqual(conversation_log.get_buffered_entries('test@example.com'), [])
+
+class TestAssets(unittest.TestCase):
+    
+    def test_precompress_writes_gzip_copies_once(self):
+        """Test that built assets get gzip copies and up to date copies are not rewritten"""
+        import gzip
+        import os
+        import tempfile
+        
+        with tempfile.TemporaryDirectory() as dist_path:
+            os.makedirs(os.path.join(dist_path, 'js'))
+            bundle = os.path.join(dist_path, 'js', 'aida_chat_widget.bundle.ABC123.js')
+            with open(bundle, 'w') as f:
+                f.write('console.log("aida");' * 100)
+            with open(os.path.join(dist_path, 'js', 'tiny.bundle.js'), 'w') as f:
+                f.write('1')
+            
+            written = assets.precompress(dist_path)
+            
+            self.assertIn(bundle + '.gz', written)
+            self.assertNotIn(os.path.join(dist_path, 'js', 'tiny.bundle.js.gz'), written)
+            with gzip.open(bundle + '.gz', 'rt') as f:
+                self.assertEqual(f.read(), 'console.log("aida");' * 100)
+            self.assertEqual(assets.precompress(dist_path), [])
+
+class TestPassthrough(unittest.TestCase):
+    
+    def setUp(self):
+        self.session_id = f"test_session_{frappe.generate_hash(length=8)}"
+        self.raw = json.dumps({'response': 'Hello!', 'session_id': self.session_id}).encode()
+    
+    @patch('aida_widget_integration.client.get_session')
+    def test_reply_bytes_are_forwarded_in_envelope(self, mock_get_session):
+        """Test that a passthrough chat answers with the upstream bytes wrapped as Frappe's message"""
+        mock_get_session.return_value.request.return_value = MagicMock(
+            status_code=200,
+            content=self.raw,
+            raw=MagicMock(tell=MagicMock(return_value=len(self.raw)))
+        )
+        
+        result = chat_with_aida(message='Hello', session_id=self.session_id, passthrough=1, bypass_cache=True)
+        
+        self.assertEqual(result.mimetype, 'application/json')
+        self.assertEqual(result.get_data(), b'{"message":' + self.raw + b'}')
+        self.assertEqual(json.loads(result.get_data())['message']['response'], 'Hello!')
+    
+    def test_coalesced_results_round_trip(self):
+        """Test that raw objects decode like plain dicts and encode back to the same JSON"""
+        decoded = codec.loads_object(self.raw)
+        
+        self.assertEqual(decoded.raw, self.raw)
+        self.assertEqual(codec.loads(codec.dumps(decoded)), json.loads(self.raw))
+        self.assertEqual(codec.loads_object(b'[1]'), [1])
+    
+    def test_encoding_benchmark_reports_both_paths(self):
+        """Test that the encoding benchmark times re-encoding and passthrough for every answer size"""
+        report = benchmark.run_encoding(answer_words=(10, 100), iterations=3)
+        
+        self.assertEqual([result['answer_words'] for result in report['results']], [10, 100])
+        for result in report['results']:
+            self.assertGreater(result['reencode_us'], 0)
+            self.assertGreater(result['passthrough_us'], 0)
+
+class TestStreaming(unittest.TestCase):
+    
+    def make_response(self, content_type, lines):
+        response = MagicMock()
+        response.headers = {'Content-Type': content_type}
+        response.iter_lines.return_value = iter(lines)
+        return response
+    
+    def test_sse_events_are_unwrapped(self):
+        """Test that server-sent events yield their data payloads"""
+        response = self.make_response('text/event-stream', [
+            'data: {"delta": "Hel"}', '',
+            ': keep-alive', '',
+            'data: {"delta": "lo", "session_id": "abc"}', '',
+            'data: [DONE]', ''
+        ])
+        
+        chunks = [streaming.parse_chunk(chunk) for chunk in streaming.iter_text_chunks(response)]
+        
+        self.assertEqual(chunks[0], ('Hel', {}, False))
+        self.assertEqual(chunks[1], ('lo', {'session_id': 'abc'}, False))
+        self.assertTrue(chunks[2][2])
+    
+    @patch('frappe.publish_realtime')
+    def test_plain_text_keeps_spacing_and_line_breaks(self, mock_publish):
+        """Test that only the field space is removed from SSE data and line streams keep their newlines"""
+        sse = self.make_response('text/event-stream', ['data: Hello', '', 'data:  world', ''])
+        lines = self.make_response('text/plain', ['First line', '', 'Second line'])
+        
+        self.assertEqual(streaming.relay_stream(sse, 'stream-1', user='test@example.com')['response'], 'Hello world')
+        self.assertEqual(streaming.relay_stream(lines, 'stream-2', user='test@example.com')['response'], 'First line\n\nSecond line')
+    
+    @patch('frappe.publish_realtime')
+    def test_relay_stream_publishes_and_assembles(self, mock_publish):
+        """Test that streamed text is published to the widget and returned whole"""
+        response = self.make_response('text/event-stream', [
+            'data: {"delta": "Hello"}', '',
+            'data: {"delta": " there", "session_id": "abc"}', '',
+            'data: {"done": true}', '',
+            'data: never read', ''
+        ])
+        
+        result = streaming.relay_stream(response, 'stream-1', user='test@example.com')
+        
+        self.assertEqual(result['response'], 'Hello there')
+        self.assertEqual(result['session_id'], 'abc')
+        self.assertNotIn('done', result)
+        response.close.assert_called_once()
+        first_event = mock_publish.call_args_list[0]
+        self.assertEqual(first_event[0][1]['delta'], 'Hello')
+        self.assertTrue(mock_publish.call_args_list[-1][0][1]['done'])
+
 class TestWidgetJavaScript(unittest.TestCase):
     """Test JavaScript widget functionality (conceptual tests)"""
     
@@ -0,0 +1,41 @@
+import frappe
+import redis
+
+
+def get_site_context():
+    """
+    Capture what a worker thread needs to act on the current site as the current user
+    """
+    return frappe._dict(
+        site=frappe.local.site,
+        sites_path=frappe.local.sites_path,
+        user=frappe.session.user
+    )
+
+
+def hgetall(key):
+    """
+    Read a Redis hash by its full key, as written with raw commands like ``hincrby``
+
+    Frappe's ``hgetall`` would prefix the key again and unpickle the values.
+    Field names and values are returned as text.
+    """
+    values = redis.Redis.hgetall(frappe.cache(), key)
+    return {field.decode(): value.decode() for field, value in values.items()}
+
+
+def run_in_site_context(context, fn, *args, **kwargs):
+    """
+    Call ``fn`` in a worker thread with its own Frappe context
+
+    Frappe's request state is thread-local, so each thread has to initialise
+    the site and connect (lazily) to the database before using the API.
+    ``context`` comes from ``get_site_context`` on the calling thread.
+    """
+    frappe.init(site=context.site, sites_path=context.sites_path)
+    try:
+        frappe.connect()
+        frappe.set_user(context.user)
+        return fn(*args, **kwargs)
+    finally:
+        frappe.destroy()
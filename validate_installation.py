@@ -47,8 +47,10 @@ def check_directory_structure():
         ('api.py', os.path.join(app_path, 'api.py')),
         ('install.py', os.path.join(app_path, 'install.py')),
         ('modules.txt', os.path.join(app_path, 'modules.txt')),
-        ('Widget CSS', os.path.join(app_path, 'public', 'css', 'aida_chat_widget.css')),
-        ('Widget JS', os.path.join(app_path, 'public', 'js', 'aida_chat_widget.js')),
+        ('Widget CSS', os.path.join(app_path, 'public', 'css', 'aida_chat_widget.bundle.css')),
+        ('Widget JS', os.path.join(app_path, 'public', 'js', 'aida_chat_widget.bundle.js')),
+        ('Loader CSS', os.path.join(app_path, 'public', 'css', 'aida_chat_loader.bundle.css')),
+        ('Loader JS', os.path.join(app_path, 'public', 'js', 'aida_chat_loader.bundle.js')),
         ('DocType JSON', os.path.join(app_path, 'aida_widget_integration', 'doctype', 'aida_widget_settings', 'aida_widget_settings.json')),
         ('DocType Python', os.path.join(app_path, 'aida_widget_integration', 'doctype', 'aida_widget_settings', 'aida_widget_settings.py')),
     ]
@@ -73,8 +75,9 @@ def validate_hooks_configuration():
         
         # Check for required configurations
         checks = [
-            ('App includes CSS', 'app_include_css' in hooks_content and 'aida_chat_widget.css' in hooks_content),
-            ('App includes JS', 'app_include_js' in hooks_content and 'aida_chat_widget.js' in hooks_content),
+            ('App includes CSS', 'app_include_css' in hooks_content and 'aida_chat_loader.bundle.css' in hooks_content),
+            ('App includes JS', 'app_include_js' in hooks_content and 'aida_chat_loader.bundle.js' in hooks_content),
+            ('Boot session hook', 'boot_session' in hooks_content),
             ('After install hook', 'after_install' in hooks_content),
             ('Before uninstall hook', 'before_uninstall' in hooks_content),
         ]
@@ -223,7 +226,7 @@ def validate_javascript_syntax():
     
     try:
         base_path = os.path.dirname(os.path.abspath(__file__))
-        js_path = os.path.join(base_path, 'aida_widget_integration', 'public', 'js', 'aida_chat_widget.js')
+        js_path = os.path.join(base_path, 'aida_widget_integration', 'public', 'js', 'aida_chat_widget.bundle.js')
         
         with open(js_path, 'r', encoding='utf-8') as f:
             js_content = f.read()